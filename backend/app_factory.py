@@ -1,10 +1,16 @@
 """Application factory for the Have I Been Sniped backend."""
 
-from flask import Flask, jsonify, request
+import hashlib
+import json
+
+from flask import Flask, Response, jsonify, request, stream_with_context
 from flask_cors import CORS
 
+from cache import TTLCache
 from demo_data import DemoRiotClient
 from live_client import LiveClient, disconnected_status
+from retention import RetentionJob
+from scan_jobs import ScanJobManager, ScanQueueFullError
 from scan_service import ScanService
 
 
@@ -20,6 +26,8 @@ DEFAULT_CORS_ORIGINS = [
     "http://localhost:5173",
     "http://127.0.0.1:5173",
 ]
+DEFAULT_PAGE_SIZE = 20
+MAX_PAGE_SIZE = 100
 SCAN_ENDPOINT = {
     "method": "POST",
     "path": "/api/scan",
@@ -36,6 +44,82 @@ def api_is_configured(config: dict) -> bool:
     return bool(api_key and api_key != "RGAPI-YOUR-API-KEY-HERE")  # pragma: allowlist secret
 
 
+def format_sse(event: str, data) -> str:
+    """Encode one Server-Sent Events frame."""
+    return f"event: {event}\ndata: {json.dumps(data, separators=(',', ':'))}\n\n"
+
+
+def read_scan_request():
+    """Return (game_name, tag_line, region) from the JSON body, or None if incomplete."""
+    payload = request.get_json(silent=True)
+    if not isinstance(payload, dict):
+        payload = {}
+
+    game_name = payload.get("gameName")
+    tag_line = payload.get("tagLine")
+    region = payload.get("region")
+
+    if not game_name or not tag_line or not region:
+        return None
+    return game_name, tag_line, region
+
+
+def read_flag_arg(name: str) -> bool:
+    """Return whether a boolean query flag such as ``?explain=1`` is set."""
+    return request.args.get(name, "").lower() in {"1", "true", "yes"}
+
+
+def read_page_args():
+    """Return (limit, cursor) from the query string, clamping limit to MAX_PAGE_SIZE."""
+    limit = request.args.get("limit", default=DEFAULT_PAGE_SIZE, type=int) or DEFAULT_PAGE_SIZE
+    return max(1, min(limit, MAX_PAGE_SIZE)), request.args.get("cursor") or None
+
+
+def cached_json_response(app, key, build_payload):
+    """Serve build_payload() as JSON with an ETag, reusing it while storage is unchanged.
+
+    Entries are keyed by ``key`` and remember the storage data_version they
+    were built from; a write bumps the version and the next request rebuilds.
+    Returns None when build_payload() does.
+    """
+    storage = app.extensions.get("storage")
+    response_cache = app.extensions.get("response_cache")
+    data_version = getattr(storage, "data_version", None)
+    if data_version is None:
+        response_cache = None
+
+    cached = response_cache.get(key) if response_cache is not None else None
+    if cached is None or cached[0] != data_version:
+        payload = build_payload()
+        if payload is None:
+            return None
+        body = jsonify(payload).get_data()
+        cached = (data_version, body, hashlib.blake2b(body, digest_size=16).hexdigest())
+        if response_cache is not None:
+            response_cache.set(key, cached)
+
+    _data_version, body, etag = cached
+    response = app.response_class(body, mimetype="application/json")
+    response.set_etag(etag)
+    response.headers["Cache-Control"] = "no-cache"
+    return response.make_conditional(request)
+
+
+def close_app(app) -> None:
+    """Release background workers and pooled storage connections."""
+    scan_jobs = app.extensions.get("scan_jobs")
+    if scan_jobs is not None:
+        scan_jobs.shutdown(wait=False)
+
+    retention_job = app.extensions.get("retention_job")
+    if retention_job is not None:
+        retention_job.shutdown()
+
+    close_storage = getattr(app.extensions.get("storage"), "close", None)
+    if callable(close_storage):
+        close_storage()
+
+
 def create_app(
     config: dict,
     riot_client=None,
@@ -43,6 +127,8 @@ def create_app(
     scan_service=None,
     live_client=None,
     demo_scan_service=None,
+    scan_jobs=None,
+    retention_job=None,
 ):
     """Create a configured Flask application instance."""
     app = Flask(__name__)
@@ -60,6 +146,27 @@ def create_app(
     if demo_scan_service is None and app.config.get("DEMO_MODE"):
         demo_scan_service = ScanService(storage=storage, riot_client=DemoRiotClient())
     app.extensions["demo_scan_service"] = demo_scan_service
+    if scan_jobs is None and scan_service is not None:
+        scan_jobs = ScanJobManager(
+            scan_service,
+            max_workers=app.config.get("SCAN_JOB_WORKERS", 2),
+            max_pending=app.config.get("SCAN_JOB_QUEUE_SIZE", 16),
+        )
+    app.extensions["scan_jobs"] = scan_jobs
+    if retention_job is None and storage is not None and app.config.get("RETENTION_DAYS"):
+        retention_job = RetentionJob(
+            storage,
+            app.config["RETENTION_DAYS"],
+            interval_seconds=app.config.get("RETENTION_INTERVAL_HOURS", 24) * 3600,
+        )
+        retention_job.start()
+    app.extensions["retention_job"] = retention_job
+    # Writes invalidate through storage.data_version; the TTL only bounds how
+    # long the time-based 7/30-day windows in a cached payload can drift.
+    memory_cache_ttl = app.config.get("MEMORY_CACHE_TTL", 60)
+    app.extensions["response_cache"] = (
+        TTLCache(max_entries=256, default_ttl=memory_cache_ttl) if memory_cache_ttl else None
+    )
 
     CORS(
         app,
@@ -71,25 +178,32 @@ def create_app(
 
     @app.route("/api/scan", methods=["POST"])
     def manual_scan():
-        payload = request.get_json(silent=True)
-        if not isinstance(payload, dict):
-            payload = {}
-
-        game_name = payload.get("gameName")
-        tag_line = payload.get("tagLine")
-        region = payload.get("region")
-
-        if not game_name or not tag_line or not region:
+        scan_request = read_scan_request()
+        if scan_request is None:
             return jsonify({"error": "Missing gameName, tagLine, or region"}), 400
+        game_name, tag_line, region = scan_request
 
         if app.extensions.get("scan_service") is None:
             return jsonify({"error": "Riot API is not configured"}), 503
 
+        explain = read_flag_arg("explain")
+        if read_flag_arg("async"):
+            try:
+                job = app.extensions["scan_jobs"].submit(game_name, tag_line, region, explain=explain)
+            except ScanQueueFullError as error:
+                return jsonify({"error": str(error)}), 429
+
+            status_url = f"/api/scans/jobs/{job['id']}"
+            response = jsonify({"jobId": job["id"], "status": job["status"], "statusUrl": status_url})
+            response.headers["Location"] = status_url
+            return response, 202
+
         try:
             result = app.extensions["scan_service"].run_manual_scan(
                 game_name,
                 tag_line,
                 region,
+                explain=explain,
             )
         except ValueError as error:
             return jsonify({"error": str(error)}), 404
@@ -99,6 +213,36 @@ def create_app(
 
         return jsonify(result), 200
 
+    @app.route("/api/scans/jobs/<job_id>", methods=["GET"])
+    def scan_job_status(job_id: str):
+        scan_jobs = app.extensions.get("scan_jobs")
+        job = scan_jobs.get(job_id) if scan_jobs is not None else None
+        if job is None:
+            return jsonify({"error": "Scan job not found"}), 404
+        return jsonify(job), 200
+
+    @app.route("/api/scan/stream", methods=["POST"])
+    def stream_scan():
+        scan_request = read_scan_request()
+        if scan_request is None:
+            return jsonify({"error": "Missing gameName, tagLine, or region"}), 400
+
+        scan_service = app.extensions.get("scan_service")
+        if scan_service is None:
+            return jsonify({"error": "Riot API is not configured"}), 503
+
+        explain = read_flag_arg("explain")
+
+        def generate():
+            for event, data in scan_service.stream_manual_scan(*scan_request, explain=explain):
+                yield format_sse(event, data)
+
+        return Response(
+            stream_with_context(generate()),
+            mimetype="text/event-stream",
+            headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+        )
+
     @app.route("/api/demo/scan", methods=["POST"])
     def demo_scan():
         if not app.config.get("DEMO_MODE"):
@@ -182,18 +326,130 @@ def create_app(
         if storage is None:
             return jsonify({"error": "Storage unavailable"}), 500
 
-        overview = storage.load_memory_overview(tracked_profile_id)
-        if overview is None:
+        explain = read_flag_arg("explain")
+        response = cached_json_response(
+            app,
+            ("memory", tracked_profile_id, explain),
+            lambda: storage.load_memory_overview(tracked_profile_id, explain=explain),
+        )
+        if response is None:
+            return jsonify({"error": "Tracked profile not found"}), 404
+
+        return response
+
+    def tracked_profile_page(tracked_profile_id: int, load_page):
+        storage = app.extensions.get("storage")
+        if storage is None:
+            return jsonify({"error": "Storage unavailable"}), 500
+        if storage.get_tracked_profile(tracked_profile_id) is None:
+            return jsonify({"error": "Tracked profile not found"}), 404
+
+        limit, cursor = read_page_args()
+        try:
+            page = load_page(storage, limit, cursor)
+        except ValueError as error:
+            return jsonify({"error": str(error)}), 400
+        return jsonify(page), 200
+
+    @app.route("/api/tracked-profiles/<int:tracked_profile_id>/repeat-players", methods=["GET"])
+    def repeat_players_page(tracked_profile_id: int):
+        explain = read_flag_arg("explain")
+        return tracked_profile_page(
+            tracked_profile_id,
+            lambda storage, limit, cursor: storage.page_repeat_players(
+                tracked_profile_id,
+                limit,
+                cursor,
+                explain=explain,
+            ),
+        )
+
+    @app.route("/api/tracked-profiles/<int:tracked_profile_id>/players/<player_puuid>/timeline", methods=["GET"])
+    def score_timeline_page(tracked_profile_id: int, player_puuid: str):
+        return tracked_profile_page(
+            tracked_profile_id,
+            lambda storage, limit, cursor: storage.page_score_timeline(
+                tracked_profile_id,
+                player_puuid,
+                limit,
+                cursor,
+            ),
+        )
+
+    @app.route("/api/score-snapshots/rebuild", methods=["POST"])
+    def rebuild_score_snapshots():
+        storage = app.extensions.get("storage")
+        if storage is None:
+            return jsonify({"error": "Storage unavailable"}), 500
+
+        payload = request.get_json(silent=True)
+        tracked_profile_id = payload.get("trackedProfileId") if isinstance(payload, dict) else None
+        if tracked_profile_id is None:
+            return jsonify(storage.rebuild_score_snapshots()), 200
+        if isinstance(tracked_profile_id, bool) or not isinstance(tracked_profile_id, int):
+            return jsonify({"error": "trackedProfileId must be an integer"}), 400
+        if storage.get_tracked_profile(tracked_profile_id) is None:
+            return jsonify({"error": "Tracked profile not found"}), 404
+        return jsonify(storage.rebuild_score_snapshots([tracked_profile_id])), 200
+
+    @app.route("/api/tracked-profiles/<int:tracked_profile_id>/players/<player_puuid>/explain", methods=["GET"])
+    def explain_repeat_player(tracked_profile_id: int, player_puuid: str):
+        storage = app.extensions.get("storage")
+        if storage is None:
+            return jsonify({"error": "Storage unavailable"}), 500
+        if storage.get_tracked_profile(tracked_profile_id) is None:
+            return jsonify({"error": "Tracked profile not found"}), 404
+
+        player = storage.explain_repeat_player(tracked_profile_id, player_puuid)
+        if player is None:
+            return jsonify({"error": "Repeat player not found"}), 404
+        return jsonify(player), 200
+
+    @app.route("/api/tracked-profiles/<int:tracked_profile_id>/players/<player_puuid>/encounters", methods=["GET"])
+    def player_encounters_page(tracked_profile_id: int, player_puuid: str):
+        return tracked_profile_page(
+            tracked_profile_id,
+            lambda storage, limit, cursor: storage.page_player_encounters(
+                tracked_profile_id,
+                player_puuid,
+                limit,
+                cursor,
+            ),
+        )
+
+    @app.route("/api/tracked-profiles/<int:tracked_profile_id>/scans", methods=["GET"])
+    def scans_page(tracked_profile_id: int):
+        return tracked_profile_page(
+            tracked_profile_id,
+            lambda storage, limit, cursor: storage.page_scans(tracked_profile_id, limit, cursor),
+        )
+
+    @app.route("/api/tracked-profiles/<int:tracked_profile_id>/groups", methods=["GET"])
+    def player_groups(tracked_profile_id: int):
+        storage = app.extensions.get("storage")
+        if storage is None:
+            return jsonify({"error": "Storage unavailable"}), 500
+        if storage.get_tracked_profile(tracked_profile_id) is None:
             return jsonify({"error": "Tracked profile not found"}), 404
 
-        return jsonify(overview), 200
+        limit, _cursor = read_page_args()
+        return cached_json_response(
+            app,
+            ("groups", tracked_profile_id, limit),
+            lambda: storage.load_player_groups(tracked_profile_id, limit),
+        )
 
     @app.route("/api/memory/summary", methods=["GET"])
     def memory_summary():
         storage = app.extensions.get("storage")
         if storage is None:
             return jsonify({"error": "Storage unavailable"}), 500
-        return jsonify(storage.get_memory_summary()), 200
+        explain = read_flag_arg("explain")
+        return cached_json_response(
+            app,
+            ("memory-summary", explain),
+            lambda: storage.get_memory_summary(explain=explain),
+        )
 
     @app.route("/api/tracked-profiles/<int:tracked_profile_id>/players/<player_puuid>/note", methods=["PUT"])
     def update_watch_note(tracked_profile_id: int, player_puuid: str):
@@ -0,0 +1,65 @@
+"""Bounded in-process TTL + LRU cache."""
+
+from __future__ import annotations
+
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Hashable, Optional
+
+
+class TTLCache:
+    """Thread-safe LRU cache whose entries also expire after a per-entry TTL."""
+
+    def __init__(
+        self,
+        max_entries: int = 2048,
+        default_ttl: float = 300,
+        clock: Callable[[], float] = time.monotonic,
+    ):
+        self.max_entries = max(1, int(max_entries))
+        self.default_ttl = default_ttl
+        self._clock = clock
+        self._lock = threading.Lock()
+        self._entries: OrderedDict[Hashable, tuple[float, Any]] = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, key: Hashable, default: Any = None) -> Any:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[0] > self._clock():
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return entry[1]
+            if entry is not None:
+                del self._entries[key]
+            self.misses += 1
+            return default
+
+    def set(self, key: Hashable, value: Any, ttl: Optional[float] = None) -> None:
+        expires_at = self._clock() + (self.default_ttl if ttl is None else ttl)
+        with self._lock:
+            self._entries[key] = (expires_at, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "size": len(self._entries),
+                "maxEntries": self.max_entries,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+            }
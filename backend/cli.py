@@ -14,6 +14,7 @@ sys.path.append(os.path.dirname(os.path.abspath(__file__)))
 
 from demo_data import DemoRiotClient
 from riot_client import RiotAPIClient
+from utils import DEFAULT_RUNTIME_CONFIG
 from rich.console import Console
 from rich.table import Table
 from rich.panel import Panel
@@ -52,7 +53,18 @@ def get_riot_client(config: Dict) -> Optional[RiotAPIClient]:
     api_key = config.get('riot_api_key')
     if not api_key or api_key == 'RGAPI-YOUR-API-KEY-HERE':  # pragma: allowlist secret
         return None
-    return RiotAPIClient(api_key)
+
+    # Same tuning keys as the web server (see utils.load_runtime_config).
+    return RiotAPIClient(
+        api_key,
+        max_workers=config.get('match_fetch_workers', DEFAULT_RUNTIME_CONFIG['MATCH_FETCH_WORKERS']),
+        rate_limit_per_second=config.get(
+            'rate_limit_per_second', DEFAULT_RUNTIME_CONFIG['RATE_LIMIT_PER_SECOND']
+        ),
+        cache_enabled=bool(config.get('cache_enabled', DEFAULT_RUNTIME_CONFIG['CACHE_ENABLED'])),
+        cache_ttl=config.get('cache_ttl', DEFAULT_RUNTIME_CONFIG['CACHE_TTL']),
+        cache_max_entries=config.get('cache_max_entries', DEFAULT_RUNTIME_CONFIG['CACHE_MAX_ENTRIES']),
+    )
 
 def print_header():
     console.clear()
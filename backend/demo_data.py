@@ -114,10 +114,17 @@ class DemoRiotClient:
             "participants": [dict(player) for player in DEMO_PARTICIPANTS],
         }
 
-    def analyze_match_history(self, user_puuid: str, lobby_puuids: list[str], region: str, match_count: int = 100) -> dict:
+    def analyze_match_history(
+        self,
+        user_puuid: str,
+        lobby_puuids: list[str],
+        region: str,
+        match_count: int = 100,
+        progress_callback=None,
+    ) -> dict:
         if user_puuid != DEMO_PUUID:
             return {}
-        return {
+        history = {
             puuid: {
                 **history,
                 "matches": history["matches"][:match_count],
@@ -125,6 +132,10 @@ class DemoRiotClient:
             for puuid, history in DEMO_HISTORY.items()
             if puuid in lobby_puuids
         }
+        if progress_callback is not None:
+            total = sum(len(value["matches"]) for value in history.values())
+            progress_callback(total, total, history)
+        return history
 
 
 class DemoLiveClient:
@@ -1,8 +1,9 @@
 """Flask backend entrypoint for Have I Been Sniped."""
 
+import atexit
 import os
 
-from app_factory import create_app
+from app_factory import close_app, create_app
 from demo_data import DemoLiveClient, DemoRiotClient
 from live_client import LiveClient
 from riot_client import RiotAPIClient
@@ -12,13 +13,22 @@ from utils import load_runtime_config
 
 def build_storage(config):
     """Build the runtime storage dependency."""
-    return Storage(config["DATABASE_PATH"])
+    return Storage(config["DATABASE_PATH"], scoring_mode=config.get("SCORING_MODE", "windowed"))
 
 
-def build_riot_client(config):
+def build_riot_client(config, storage=None):
     """Build the Riot provider for the current runtime mode."""
     if config.get("API_CONFIGURED"):
-        return RiotAPIClient(config["RIOT_API_KEY"])
+        return RiotAPIClient(
+            config["RIOT_API_KEY"],
+            match_store=storage,
+            max_workers=config.get("MATCH_FETCH_WORKERS", 1),
+            rate_limit_per_second=config.get("RATE_LIMIT_PER_SECOND"),
+            incremental=bool(config.get("INCREMENTAL_MATCH_HISTORY", True)),
+            cache_enabled=bool(config.get("CACHE_ENABLED", True)),
+            cache_ttl=config.get("CACHE_TTL", 300),
+            cache_max_entries=config.get("CACHE_MAX_ENTRIES", 2048),
+        )
     if config.get("DEMO_MODE"):
         return None
     raise ValueError("Riot API is not configured and demo mode is disabled")
@@ -39,9 +49,10 @@ def get_bind_host() -> str:
 def main():
     config = load_runtime_config()
     storage = build_storage(config)
-    riot_client = build_riot_client(config)
+    riot_client = build_riot_client(config, storage=storage)
     live_client = build_live_client(config)
     app = create_app(config, riot_client=riot_client, storage=storage, live_client=live_client)
+    atexit.register(close_app, app)
 
     port = app.config.get("PORT", 5000)
     print(f"Starting server on port {port}...")
@@ -0,0 +1,161 @@
+"""Proactive Riot API rate limiting driven by rate-limit response headers."""
+
+from __future__ import annotations
+
+import threading
+import time
+from typing import Callable, Dict, Iterable, List, Mapping, Optional, Tuple
+
+
+# Development-key application limits; replaced by X-App-Rate-Limit once seen.
+DEFAULT_APP_LIMITS: Tuple[Tuple[int, int], ...] = ((20, 1), (100, 120))
+
+
+def parse_rate_limit_header(value: Optional[str]) -> List[Tuple[int, int]]:
+    """Parse a Riot ``"20:1,100:120"`` header into ``(count, seconds)`` pairs."""
+    pairs = []
+    for chunk in (value or "").split(","):
+        amount, _, seconds = chunk.strip().partition(":")
+        try:
+            pairs.append((int(amount), int(seconds)))
+        except ValueError:
+            continue
+    return pairs
+
+
+class RateWindow:
+    """One fixed Riot rate-limit window that starts with its first request."""
+
+    def __init__(self, limit: int, seconds: int):
+        self.limit = limit
+        self.seconds = seconds
+        self.count = 0
+        self.started_at: Optional[float] = None
+
+    def _roll(self, now: float) -> None:
+        if self.started_at is not None and now >= self.started_at + self.seconds:
+            self.count = 0
+            self.started_at = None
+
+    def wait_time(self, now: float) -> float:
+        self._roll(now)
+        if self.count < self.limit or self.started_at is None:
+            return 0.0
+        return self.started_at + self.seconds - now
+
+    def consume(self, now: float) -> None:
+        self._roll(now)
+        if self.started_at is None:
+            self.started_at = now
+        self.count += 1
+
+    def sync_count(self, count: int, now: float) -> None:
+        self._roll(now)
+        if self.started_at is None and count:
+            self.started_at = now
+        self.count = max(self.count, count)
+
+
+class RateLimiter:
+    """Thread-safe limiter tracking app and method windows per routing value.
+
+    Riot budgets app limits per routing value (``americas``, ``europe``,
+    ``na1``...) and method limits per routing value and endpoint, so each
+    gets its own set of windows. ``acquire`` blocks just long enough to keep
+    every applicable window under its limit.
+    """
+
+    def __init__(
+        self,
+        app_limits: Iterable[Tuple[int, int]] = DEFAULT_APP_LIMITS,
+        clock: Callable[[], float] = time.monotonic,
+        sleep: Callable[[float], None] = time.sleep,
+    ):
+        self.default_app_limits = tuple(app_limits)
+        self._clock = clock
+        self._sleep = sleep
+        self._lock = threading.Lock()
+        self._app_windows: Dict[str, Dict[int, RateWindow]] = {}
+        self._method_windows: Dict[Tuple[str, str], Dict[int, RateWindow]] = {}
+        self._blocked_until: Dict[Tuple[str, Optional[str]], float] = {}
+
+    def _windows_for(self, routing: str, method: str) -> List[RateWindow]:
+        app_windows = self._app_windows.setdefault(
+            routing,
+            {seconds: RateWindow(limit, seconds) for limit, seconds in self.default_app_limits},
+        )
+        method_windows = self._method_windows.get((routing, method), {})
+        return [*app_windows.values(), *method_windows.values()]
+
+    def acquire(self, routing: str, method: str) -> float:
+        """Reserve one request slot, sleeping as needed; returns seconds waited."""
+        waited = 0.0
+        while True:
+            with self._lock:
+                now = self._clock()
+                windows = self._windows_for(routing, method)
+                wait = max(
+                    [
+                        self._blocked_until.get((routing, None), 0.0) - now,
+                        self._blocked_until.get((routing, method), 0.0) - now,
+                        *(window.wait_time(now) for window in windows),
+                    ]
+                )
+                if wait <= 0:
+                    for window in windows:
+                        window.consume(now)
+                    return waited
+            self._sleep(wait)
+            waited += wait
+
+    def update(self, routing: str, method: str, headers: Mapping[str, str]) -> None:
+        """Learn limits and server-side counts from a Riot response."""
+        with self._lock:
+            now = self._clock()
+            self._apply_headers(
+                self._app_windows.setdefault(routing, {}),
+                headers.get("X-App-Rate-Limit"),
+                headers.get("X-App-Rate-Limit-Count"),
+                now,
+            )
+            self._apply_headers(
+                self._method_windows.setdefault((routing, method), {}),
+                headers.get("X-Method-Rate-Limit"),
+                headers.get("X-Method-Rate-Limit-Count"),
+                now,
+            )
+
+    def penalize(
+        self,
+        routing: str,
+        method: str,
+        retry_after: float,
+        limit_type: Optional[str] = None,
+    ) -> None:
+        """Block a routing value (or one method on it) after a 429."""
+        key = (routing, method) if limit_type == "method" else (routing, None)
+        with self._lock:
+            until = self._clock() + max(retry_after, 0.0)
+            self._blocked_until[key] = max(self._blocked_until.get(key, 0.0), until)
+
+    @staticmethod
+    def _apply_headers(
+        windows: Dict[int, RateWindow],
+        limit_header: Optional[str],
+        count_header: Optional[str],
+        now: float,
+    ) -> None:
+        limits = parse_rate_limit_header(limit_header)
+        if limits:
+            learned = {}
+            for limit, seconds in limits:
+                window = windows.get(seconds) or RateWindow(limit, seconds)
+                window.limit = limit
+                learned[seconds] = window
+            windows.clear()
+            windows.update(learned)
+
+        for count, seconds in parse_rate_limit_header(count_header):
+            window = windows.get(seconds)
+            if window is not None:
+                window.sync_count(count, now)
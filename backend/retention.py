@@ -0,0 +1,55 @@
+"""Periodic retention and compaction for the encounter memory database."""
+
+from __future__ import annotations
+
+import logging
+import threading
+
+
+logger = logging.getLogger(__name__)
+
+# Scoring looks back 30 days, so retention may never cut into that window.
+MIN_RETENTION_DAYS = 30
+
+
+class RetentionJob:
+    """Runs Storage.apply_retention on a daemon thread at a fixed interval."""
+
+    def __init__(self, storage, retention_days: int, interval_seconds: float = 24 * 3600):
+        self.storage = storage
+        self.retention_days = int(retention_days)
+        self.interval_seconds = max(60.0, float(interval_seconds))
+        self.last_report: dict | None = None
+        self._stop = threading.Event()
+        self._thread: threading.Thread | None = None
+
+    def start(self) -> None:
+        if self._thread is not None:
+            return
+        self._thread = threading.Thread(target=self._loop, name="retention", daemon=True)
+        self._thread.start()
+
+    def run_once(self) -> dict:
+        report = self.storage.apply_retention(self.retention_days)
+        self.last_report = report
+        logger.info(
+            "Retention archived %s encounters, pruned %s scan participants and %s cached matches; "
+            "reclaimed %s bytes",
+            report["encountersArchived"],
+            report["scanParticipantsPruned"],
+            report["matchDetailsPruned"],
+            report["reclaimedBytes"],
+        )
+        return report
+
+    def shutdown(self) -> None:
+        self._stop.set()
+
+    def _loop(self) -> None:
+        while True:
+            try:
+                self.run_once()
+            except Exception:
+                logger.exception("Retention run failed")
+            if self._stop.wait(self.interval_seconds):
+                return
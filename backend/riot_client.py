@@ -1,16 +1,30 @@
 """Riot Games API client."""
 
 import logging
-import time
-from typing import Any, Dict, List, Optional
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Any, Callable, Dict, Hashable, List, Optional
+from urllib.parse import urlsplit
 
 import requests
+from requests.adapters import HTTPAdapter
 
+from cache import TTLCache
+from rate_limiter import DEFAULT_APP_LIMITS, RateLimiter
 from utils import get_platform_endpoint, get_regional_endpoint
 
 
 logger = logging.getLogger(__name__)
 
+MAX_RATE_LIMIT_RETRIES = 3
+
+# Per-method TTLs in seconds; account lookups use the configured cache_ttl.
+# Match details are not listed because finished matches live in the match store.
+ENDPOINT_CACHE_TTLS = {
+    "spectator-v5.active-games": 15,
+    "match-v5.match-ids": 30,
+}
+
 
 def normalize_riot_id_fields(participant: Dict[str, Any]) -> Dict[str, str]:
     """Normalize Riot spectator identity fields into a stable game/tag pair."""
@@ -47,50 +61,147 @@ def normalize_riot_id_fields(participant: Dict[str, Any]) -> Dict[str, str]:
 class RiotAPIClient:
     """Client for interacting with Riot Games API"""
     
-    def __init__(self, api_key: str):
+    def __init__(
+        self,
+        api_key: str,
+        match_store=None,
+        max_workers: int = 1,
+        rate_limit_per_second: Optional[float] = None,
+        rate_limiter: Optional[RateLimiter] = None,
+        incremental: bool = False,
+        cache_enabled: bool = True,
+        cache_ttl: float = 300,
+        cache_max_entries: int = 2048,
+    ):
         self.api_key = api_key
+        self.match_store = match_store
+        self.incremental = incremental
+        self.rate_limit_per_second = rate_limit_per_second
+        self.max_workers = max(1, int(max_workers or 1))
+        if rate_limit_per_second:
+            # More workers than requests allowed per second only queue up on the limiter.
+            self.max_workers = max(1, min(self.max_workers, int(rate_limit_per_second)))
         self.session = requests.Session()
         self.session.headers.update({
             'X-Riot-Token': api_key,
             'Accept': 'application/json'
         })
-        self.cache = {}  # Simple in-memory cache for PUUIDs
-        
-    def _make_request(self, url: str, params: Optional[Dict] = None) -> Optional[Dict]:
-        """Make a Riot API request, returning JSON on 200 or None on errors."""
+        adapter = HTTPAdapter(pool_maxsize=max(10, self.max_workers))
+        self.session.mount('https://', adapter)
+        self.cache = TTLCache(cache_max_entries, default_ttl=cache_ttl) if cache_enabled else None
+        self.cache_ttls = {"account-v1.by-riot-id": cache_ttl, **ENDPOINT_CACHE_TTLS}
+        if rate_limiter is None:
+            app_limits = DEFAULT_APP_LIMITS
+            if rate_limit_per_second:
+                app_limits = ((int(rate_limit_per_second), 1), *DEFAULT_APP_LIMITS[1:])
+            rate_limiter = RateLimiter(app_limits)
+        self.rate_limiter = rate_limiter
+        self._in_flight_lock = threading.Lock()
+        self._in_flight: Dict[Hashable, Future] = {}
+
+    def _single_flight(self, key: Hashable, fetch: Callable[[], Any]) -> Any:
+        """Run fetch once per key; concurrent callers for the same key share its result."""
+        with self._in_flight_lock:
+            future = self._in_flight.get(key)
+            is_leader = future is None
+            if is_leader:
+                future = Future()
+                self._in_flight[key] = future
+
+        if not is_leader:
+            return future.result()
+
         try:
-            response = self.session.get(url, params=params, timeout=10)
+            result = fetch()
+        except BaseException as exc:
+            future.set_exception(exc)
+            raise
+        else:
+            future.set_result(result)
+            return result
+        finally:
+            with self._in_flight_lock:
+                self._in_flight.pop(key, None)
+
+    @staticmethod
+    def _routing_value(url: str) -> str:
+        return (urlsplit(url).hostname or "").split(".", 1)[0]
+
+    def _make_request(
+        self,
+        url: str,
+        params: Optional[Dict] = None,
+        method: Optional[str] = None,
+    ) -> Optional[Dict]:
+        """Make a Riot API request, returning JSON on 200 or None on errors.
+
+        Every request first waits on the rate limiter for its routing value and
+        method, and each response feeds the learned limits back into it.
+        Successful responses for cacheable methods are served from the TTL
+        cache, and concurrent calls for the same URL and params share one request.
+        """
+        key = (url, tuple(sorted((params or {}).items())))
+        ttl = self.cache_ttls.get(method) if self.cache is not None else None
+        if ttl:
+            cached = self.cache.get(key)
+            if cached is not None:
+                return cached
+
+        data = self._single_flight(key, lambda: self._send_request(url, params, method))
+        if ttl and data is not None:
+            self.cache.set(key, data, ttl)
+        return data
+
+    def cache_stats(self) -> Optional[Dict[str, int]]:
+        return self.cache.stats() if self.cache is not None else None
+
+    def _send_request(
+        self,
+        url: str,
+        params: Optional[Dict],
+        method: Optional[str],
+    ) -> Optional[Dict]:
+        routing = self._routing_value(url)
+        method = method or urlsplit(url).path
+
+        for _attempt in range(MAX_RATE_LIMIT_RETRIES + 1):
+            self.rate_limiter.acquire(routing, method)
+            try:
+                response = self.session.get(url, params=params, timeout=10)
+            except requests.exceptions.RequestException as exc:
+                logger.warning("Riot API request failed: %s", exc)
+                return None
+
+            self.rate_limiter.update(routing, method, response.headers)
 
             if response.status_code == 200:
                 return response.json()
             if response.status_code == 404:
                 return None
             if response.status_code == 429:
-                retry_after = int(response.headers.get('Retry-After', 1))
-                time.sleep(retry_after)
-                return self._make_request(url, params)
+                retry_after = float(response.headers.get('Retry-After', 1))
+                self.rate_limiter.penalize(
+                    routing,
+                    method,
+                    retry_after,
+                    response.headers.get('X-Rate-Limit-Type'),
+                )
+                continue
 
             logger.warning("Riot API error %s: %s", response.status_code, response.text)
             return None
 
-        except requests.exceptions.RequestException as exc:
-            logger.warning("Riot API request failed: %s", exc)
-            return None
+        logger.warning("Riot API rate limit retries exhausted for %s", url)
+        return None
     
     def get_puuid_by_riot_id(self, game_name: str, tag_line: str, region: str) -> Optional[str]:
         """Resolve a Riot ID (name#tag) to a PUUID via the Account API."""
-        cache_key = f"{game_name}#{tag_line}#{region}"
-        if cache_key in self.cache:
-            return self.cache[cache_key]
-
         regional = get_regional_endpoint(region)
         url = f"https://{regional}.api.riotgames.com/riot/account/v1/accounts/by-riot-id/{game_name}/{tag_line}"
         
-        data = self._make_request(url)
+        data = self._make_request(url, method="account-v1.by-riot-id")
         if data and 'puuid' in data:
-            puuid = data['puuid']
-            self.cache[cache_key] = puuid
-            return puuid
+            return data['puuid']
         
         return None
     
@@ -99,9 +210,15 @@ class RiotAPIClient:
         platform = get_platform_endpoint(region)
         url = f"https://{platform}.api.riotgames.com/lol/spectator/v5/active-games/by-summoner/{puuid}"
         
-        return self._make_request(url)
+        return self._make_request(url, method="spectator-v5.active-games")
     
-    def get_match_ids(self, puuid: str, region: str, count: int = 100) -> List[str]:
+    def get_match_ids(
+        self,
+        puuid: str,
+        region: str,
+        count: int = 100,
+        start_time: Optional[int] = None,
+    ) -> List[str]:
         """
         Get list of match IDs for a player
         
@@ -109,6 +226,7 @@ class RiotAPIClient:
             puuid: Player's PUUID
             region: Platform region
             count: Number of matches to fetch (max 100)
+            start_time: Only return matches started at or after this epoch second
             
         Returns:
             List of match IDs
@@ -116,14 +234,19 @@ class RiotAPIClient:
         regional = get_regional_endpoint(region)
         url = f"https://{regional}.api.riotgames.com/lol/match/v5/matches/by-puuid/{puuid}/ids"
         params = {'start': 0, 'count': min(count, 100)}
+        if start_time is not None:
+            params['startTime'] = int(start_time)
         
-        data = self._make_request(url, params)
+        data = self._make_request(url, params, method="match-v5.match-ids")
         return data if data else []
     
     def get_match_details(self, match_id: str, region: str) -> Optional[Dict]:
         """
         Get detailed information about a specific match
         
+        Finished matches never change, so when a match store is configured
+        the payload is read from it first and persisted after a fetch.
+        
         Args:
             match_id: Match ID
             region: Platform region
@@ -131,72 +254,224 @@ class RiotAPIClient:
         Returns:
             Match details or None
         """
+        if self.match_store is not None:
+            cached = self.match_store.get_match_details(match_id)
+            if cached is not None:
+                return cached
+
+        return self._fetch_match_details(match_id, region)
+
+    def _fetch_match_details(self, match_id: str, region: str) -> Optional[Dict]:
+        return self._single_flight(
+            ("match-details", match_id),
+            lambda: self._download_match_details(match_id, region),
+        )
+
+    def _download_match_details(self, match_id: str, region: str) -> Optional[Dict]:
         regional = get_regional_endpoint(region)
         url = f"https://{regional}.api.riotgames.com/lol/match/v5/matches/{match_id}"
-        
-        return self._make_request(url)
+
+        match_data = self._make_request(url, method="match-v5.match")
+        if self.match_store is not None and match_data and 'info' in match_data:
+            self.match_store.save_match_details(match_id, match_data)
+        return match_data
+
+    def _resolve_match_ids(self, puuid: str, region: str, match_count: int) -> List[str]:
+        """Return the newest match IDs, only asking Riot for matches since the last scan.
+
+        In incremental mode the previously processed IDs come from the match
+        store, so a scan downloads only games played after the stored cursor.
+        """
+        if not self.incremental or self.match_store is None:
+            return self.get_match_ids(puuid, region, match_count)
+
+        cursor = self.match_store.get_match_history_cursor(puuid)
+        if cursor is None:
+            return self.get_match_ids(puuid, region, match_count)
+
+        new_ids = self.get_match_ids(puuid, region, match_count, start_time=cursor // 1000)
+        known_ids = self.match_store.load_match_history_ids(puuid, match_count)
+        return list(dict.fromkeys([*new_ids, *known_ids]))[:match_count]
+
+    def _fetch_matches(
+        self,
+        match_ids: List[str],
+        region: str,
+        on_fetched: Optional[Callable[[str, Optional[Dict]], None]] = None,
+    ) -> List[Optional[Dict]]:
+        """Fetch match payloads in match_ids order using the bounded worker pool.
+
+        on_fetched is called on the calling thread for each match, in order,
+        as soon as that match and every match before it have arrived.
+        """
+        if self.max_workers > 1 and len(match_ids) > 1:
+            with ThreadPoolExecutor(
+                max_workers=min(self.max_workers, len(match_ids)),
+                thread_name_prefix="riot-match",
+            ) as executor:
+                fetched = executor.map(
+                    lambda match_id: self._fetch_match_details(match_id, region),
+                    match_ids,
+                )
+                return self._collect_matches(match_ids, fetched, on_fetched)
+        fetched = (self._fetch_match_details(match_id, region) for match_id in match_ids)
+        return self._collect_matches(match_ids, fetched, on_fetched)
+
+    @staticmethod
+    def _collect_matches(match_ids, fetched, on_fetched) -> List[Optional[Dict]]:
+        matches = []
+        for match_id, match_data in zip(match_ids, fetched):
+            matches.append(match_data)
+            if on_fetched is not None:
+                on_fetched(match_id, match_data)
+        return matches
+
+    @staticmethod
+    def _match_overlaps(user_puuid: str, lobby: set, match_id: str,
+                        match_data: Optional[Dict]) -> List[Dict[str, Any]]:
+        if not match_data or 'info' not in match_data:
+            return []
+
+        info = match_data['info']
+        participants = info.get('participants', [])
+
+        # Find the user in this match
+        user_participant = next((p for p in participants if p['puuid'] == user_puuid), None)
+        if not user_participant:
+            return []
+
+        return [
+            {
+                'matchId': match_id,
+                'gameCreation': info['gameCreation'],
+                'queueId': info.get('queueId'),
+                'userTeamId': user_participant['teamId'],
+                'userWin': user_participant['win'],
+                'userChampionId': user_participant['championId'],
+                'puuid': participant['puuid'],
+                'teamId': participant['teamId'],
+                'championId': participant['championId'],
+            }
+            for participant in participants
+            if participant['puuid'] in lobby
+        ]
+
+    def _find_indexed_overlaps(self, user_puuid: str, lobby_puuids: List[str],
+                               match_ids: List[str], region: str,
+                               report=None) -> List[Dict[str, Any]]:
+        """Ingest unseen matches into the store, then intersect the lobby locally."""
+        indexed_ids = self.match_store.indexed_match_ids(match_ids)
+        missing_ids = [match_id for match_id in match_ids if match_id not in indexed_ids]
+        on_fetched = None
+
+        if report is not None:
+            completed = len(match_ids) - len(missing_ids)
+            report(completed, self.match_store.find_match_overlaps(
+                user_puuid,
+                lobby_puuids,
+                [match_id for match_id in match_ids if match_id in indexed_ids],
+            ))
+            lobby = set(lobby_puuids)
+
+            def on_fetched(match_id, match_data):
+                nonlocal completed
+                completed += 1
+                report(completed, self._match_overlaps(user_puuid, lobby, match_id, match_data))
+
+        self._fetch_matches(missing_ids, region, on_fetched)
+        self.match_store.record_match_history(user_puuid, match_ids)
+        return self.match_store.find_match_overlaps(user_puuid, lobby_puuids, match_ids)
+
+    def _find_payload_overlaps(self, user_puuid: str, lobby_puuids: List[str],
+                               match_ids: List[str], region: str,
+                               report=None) -> List[Dict[str, Any]]:
+        lobby = set(lobby_puuids)
+        overlaps = []
+        completed = 0
+
+        def on_fetched(match_id, match_data):
+            nonlocal completed
+            completed += 1
+            match_overlaps = self._match_overlaps(user_puuid, lobby, match_id, match_data)
+            overlaps.extend(match_overlaps)
+            if report is not None:
+                report(completed, match_overlaps)
+
+        self._fetch_matches(match_ids, region, on_fetched)
+        return overlaps
+
+    @staticmethod
+    def _build_history(lobby_puuids: List[str], overlaps: List[Dict[str, Any]],
+                       match_ids: List[str]) -> Dict[str, Any]:
+        results = {puuid: {'matches': [], 'totalGames': 0, 'wins': 0, 'losses': 0}
+                   for puuid in lobby_puuids}
+
+        # Newest first; retried matches can sit out of order in match_ids.
+        match_order = {match_id: index for index, match_id in enumerate(match_ids)}
+        for overlap in sorted(overlaps, key=lambda overlap: (-overlap['gameCreation'],
+                                                             match_order[overlap['matchId']])):
+            user_won = bool(overlap['userWin'])
+            same_team = overlap['teamId'] == overlap['userTeamId']
+
+            player_results = results[overlap['puuid']]
+            player_results['matches'].append({
+                'matchId': overlap['matchId'],
+                'timestamp': overlap['gameCreation'],
+                'win': user_won,
+                'team': 'with' if same_team else 'against',
+                'playerChampId': overlap['userChampionId'],
+                'targetChampId': overlap['championId'],
+                'queueId': overlap['queueId'],
+            })
+            player_results['totalGames'] += 1
+
+            if user_won:
+                player_results['wins'] += 1
+            else:
+                player_results['losses'] += 1
+
+        # Filter out players with no shared matches
+        return {k: v for k, v in results.items() if v['totalGames'] > 0}
     
     def analyze_match_history(self, user_puuid: str, lobby_puuids: List[str], 
-                            region: str, match_count: int = 100) -> Dict[str, Any]:
+                            region: str, match_count: int = 100,
+                            progress_callback=None) -> Dict[str, Any]:
         """
         Analyze match history to find overlaps with lobby participants
         
+        With a match store the overlap is a query against its participant
+        index, so only matches missing from the index touch the network.
+        
         Args:
             user_puuid: The searching player's PUUID
             lobby_puuids: List of PUUIDs from current lobby
             region: Platform region
             match_count: Number of matches to analyze
+            progress_callback: Optional callable receiving (completed, total,
+                partial_history) as match details become available
             
         Returns:
             Dictionary mapping PUUIDs to their match history with the user
         """
         # Get user's match history
-        match_ids = self.get_match_ids(user_puuid, region, match_count)
-        
-        # Initialize results
-        results = {puuid: {'matches': [], 'totalGames': 0, 'wins': 0, 'losses': 0} 
-                   for puuid in lobby_puuids if puuid != user_puuid}
-        
-        # Analyze each match
-        for match_id in match_ids:
-            match_data = self.get_match_details(match_id, region)
-            
-            if not match_data or 'info' not in match_data:
-                continue
-            
-            participants = match_data['info'].get('participants', [])
-            
-            # Find the user in this match
-            user_participant = next((p for p in participants if p['puuid'] == user_puuid), None)
-            if not user_participant:
-                continue
-            
-            user_team = user_participant['teamId']
-            user_won = user_participant['win']
-            
-            # Check for lobby participants in this match
-            for participant in participants:
-                puuid = participant['puuid']
-                
-                if puuid in results:
-                    same_team = participant['teamId'] == user_team
-                    
-                    match_entry = {
-                        'matchId': match_id,
-                        'timestamp': match_data['info']['gameCreation'],
-                        'win': user_won,
-                        'team': 'with' if same_team else 'against',
-                        'playerChampId': user_participant['championId'],
-                        'targetChampId': participant['championId']
-                    }
-                    
-                    results[puuid]['matches'].append(match_entry)
-                    results[puuid]['totalGames'] += 1
-                    
-                    if user_won:
-                        results[puuid]['wins'] += 1
-                    else:
-                        results[puuid]['losses'] += 1
-        
-        # Filter out players with no shared matches
-        return {k: v for k, v in results.items() if v['totalGames'] > 0}
+        match_ids = self._resolve_match_ids(user_puuid, region, match_count)
+        lobby = [puuid for puuid in dict.fromkeys(lobby_puuids) if puuid != user_puuid]
+
+        report = None
+        if progress_callback is not None:
+            seen_overlaps = []
+
+            def report(completed, overlaps):
+                seen_overlaps.extend(overlaps)
+                progress_callback(
+                    completed,
+                    len(match_ids),
+                    self._build_history(lobby, seen_overlaps, match_ids),
+                )
+
+        if self.match_store is not None:
+            overlaps = self._find_indexed_overlaps(user_puuid, lobby, match_ids, region, report)
+        else:
+            overlaps = self._find_payload_overlaps(user_puuid, lobby, match_ids, region, report)
+
+        return self._build_history(lobby, overlaps, match_ids)
@@ -0,0 +1,130 @@
+"""Background scan jobs backed by a bounded worker pool."""
+
+from __future__ import annotations
+
+import logging
+import threading
+import uuid
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+
+
+logger = logging.getLogger(__name__)
+
+FINISHED_STATUSES = {"succeeded", "failed"}
+
+
+class ScanQueueFullError(RuntimeError):
+    """Raised when the job queue already holds the maximum number of pending scans."""
+
+
+def _now_iso() -> str:
+    return datetime.now(timezone.utc).isoformat()
+
+
+class ScanJobManager:
+    """Runs ScanService scans off the request thread and tracks their status."""
+
+    def __init__(self, scan_service, max_workers: int = 2, max_pending: int = 16, max_finished: int = 200):
+        self.scan_service = scan_service
+        self.max_pending = max(1, int(max_pending))
+        self.max_finished = max(1, int(max_finished))
+        self._executor = ThreadPoolExecutor(
+            max_workers=max(1, int(max_workers)),
+            thread_name_prefix="scan-job",
+        )
+        self._lock = threading.Lock()
+        self._jobs: OrderedDict[str, dict] = OrderedDict()
+
+    def submit(self, game_name, tag_line, region, *, source="manual", explain=False) -> dict:
+        with self._lock:
+            pending = sum(1 for job in self._jobs.values() if job["status"] not in FINISHED_STATUSES)
+            if pending >= self.max_pending:
+                raise ScanQueueFullError("Too many scans in progress")
+
+            job_id = uuid.uuid4().hex
+            self._jobs[job_id] = {
+                "id": job_id,
+                "status": "queued",
+                "request": {"gameName": game_name, "tagLine": tag_line, "region": region},
+                "createdAt": _now_iso(),
+                "startedAt": None,
+                "finishedAt": None,
+                "progress": {"completedMatches": 0, "totalMatches": None, "repeatPlayersFound": 0},
+                "result": None,
+                "error": None,
+            }
+            self._prune_finished()
+            snapshot = self._snapshot(job_id)
+
+        self._executor.submit(self._run, job_id, game_name, tag_line, region, source, explain)
+        return snapshot
+
+    def get(self, job_id: str) -> dict | None:
+        with self._lock:
+            if job_id not in self._jobs:
+                return None
+            return self._snapshot(job_id)
+
+    def shutdown(self, wait: bool = False) -> None:
+        self._executor.shutdown(wait=wait, cancel_futures=True)
+
+    def _run(self, job_id, game_name, tag_line, region, source, explain) -> None:
+        self._update(job_id, status="running", startedAt=_now_iso())
+
+        try:
+            result = self.scan_service.run_manual_scan(
+                game_name,
+                tag_line,
+                region,
+                source=source,
+                on_event=lambda name, data: self._record_event(job_id, name, data),
+                explain=explain,
+            )
+        except ValueError as error:
+            self._update(
+                job_id,
+                status="failed",
+                finishedAt=_now_iso(),
+                error={"message": str(error), "status": 404},
+            )
+        except Exception:
+            logger.exception("Scan job %s failed", job_id)
+            self._update(
+                job_id,
+                status="failed",
+                finishedAt=_now_iso(),
+                error={"message": "Internal server error", "status": 500},
+            )
+        else:
+            self._update(job_id, status="succeeded", finishedAt=_now_iso(), result=result)
+
+    def _record_event(self, job_id, name, data) -> None:
+        if name != "progress":
+            return
+        self._update(
+            job_id,
+            progress={
+                "completedMatches": data["completedMatches"],
+                "totalMatches": data["totalMatches"],
+                "repeatPlayersFound": len(data["repeatPlayers"]),
+            },
+        )
+
+    def _update(self, job_id, **fields) -> None:
+        with self._lock:
+            job = self._jobs.get(job_id)
+            if job is not None:
+                job.update(fields)
+
+    def _prune_finished(self) -> None:
+        finished_ids = [
+            job_id for job_id, job in self._jobs.items() if job["status"] in FINISHED_STATUSES
+        ]
+        for job_id in finished_ids[: max(0, len(finished_ids) - self.max_finished)]:
+            del self._jobs[job_id]
+
+    def _snapshot(self, job_id) -> dict:
+        job = self._jobs[job_id]
+        return {**job, "progress": dict(job["progress"])}
@@ -2,10 +2,19 @@
 
 from __future__ import annotations
 
+import logging
+import queue
+import threading
+import time
 from datetime import datetime, timezone
 
 from riot_client import normalize_riot_id_fields
-from scoring import score_repeat_player
+from scoring import explain_ranked_players, score_repeat_player
+
+
+logger = logging.getLogger(__name__)
+
+_STREAM_DONE = object()
 
 
 class ScanService:
@@ -15,7 +24,26 @@ class ScanService:
         self.storage = storage
         self.riot_client = riot_client
 
-    def run_manual_scan(self, game_name, tag_line, region, *, source="manual", match_count=100):
+    def run_manual_scan(
+        self,
+        game_name,
+        tag_line,
+        region,
+        *,
+        source="manual",
+        match_count=100,
+        on_event=None,
+        explain=False,
+    ):
+        """Run a scan and return its payload.
+
+        When on_event is given it is called as on_event(name, data) with a
+        "lobby" event once the live game is known, "progress" events while
+        match history is analysed, and a final "result" event. Risk reasons
+        are built for the top-ranked repeat players only, or for all of them
+        with ``explain``.
+        """
+        emit = on_event or (lambda _name, _data: None)
         tracked_puuid = self.riot_client.get_puuid_by_riot_id(game_name, tag_line, region)
         if not tracked_puuid:
             raise ValueError("Player not found")
@@ -45,12 +73,14 @@ class ScanService:
                 status="not_in_game",
                 encounter_count=0,
             )
-            return {
+            result = {
                 "trackedProfile": tracked_profile,
                 "scan": scan,
                 "currentGame": None,
                 "repeatPlayers": [],
             }
+            emit("result", result)
+            return result
 
         participants = self._normalize_participants(
             active_game.get("participants", []),
@@ -59,12 +89,30 @@ class ScanService:
             tracked_tag_line=tag_line,
             region=region,
         )
+        current_game = {
+            "gameId": active_game.get("gameId"),
+            "gameMode": active_game.get("gameMode"),
+            "gameStartTime": active_game.get("gameStartTime"),
+            "participants": participants,
+        }
+        emit("lobby", {"trackedProfile": tracked_profile, "currentGame": current_game})
+
         lobby_puuids = [participant["puuid"] for participant in participants]
+        history_kwargs = {"match_count": match_count}
+        if on_event is not None:
+            def report_progress(completed, total, partial_history):
+                emit("progress", {
+                    "completedMatches": completed,
+                    "totalMatches": total,
+                    "repeatPlayers": self._summarize_partial_history(participants, partial_history),
+                })
+
+            history_kwargs["progress_callback"] = report_progress
         history = self.riot_client.analyze_match_history(
             tracked_puuid,
             lobby_puuids,
             region,
-            match_count=match_count,
+            **history_kwargs,
         )
         encounter_count = sum(
             len(player_history.get("matches", [])) for player_history in history.values()
@@ -78,31 +126,61 @@ class ScanService:
             queue_type=active_game.get("gameMode"),
             status="ok",
             encounter_count=encounter_count,
+            players=[self._player_row(participant, region) for participant in participants],
+            participants=[self._participant_row(participant) for participant in participants],
+            encounters=self._encounter_rows(history),
         )
 
-        for participant in participants:
-            self._persist_participant(scan["id"], participant, region)
-
-        self._persist_encounters(tracked_profile_id, scan["id"], history)
         repeat_players = self._build_repeat_players(
             tracked_profile_id,
             participants,
             history,
+            explain=explain,
         )
 
-        current_game = {
-            "gameId": active_game.get("gameId"),
-            "gameMode": active_game.get("gameMode"),
-            "gameStartTime": active_game.get("gameStartTime"),
-            "participants": participants,
-        }
-
-        return {
+        result = {
             "trackedProfile": tracked_profile,
             "scan": scan,
             "currentGame": current_game,
             "repeatPlayers": repeat_players,
         }
+        emit("result", result)
+        return result
+
+    def stream_manual_scan(self, game_name, tag_line, region, *, source="manual", match_count=100, explain=False):
+        """Yield (event, data) pairs for a scan running on a background thread.
+
+        Failures are reported as a final "error" event carrying an HTTP-style
+        status, mirroring how the blocking endpoint maps them.
+        """
+        events = queue.Queue()
+
+        def run():
+            try:
+                self.run_manual_scan(
+                    game_name,
+                    tag_line,
+                    region,
+                    source=source,
+                    match_count=match_count,
+                    on_event=lambda name, data: events.put((name, data)),
+                    explain=explain,
+                )
+            except ValueError as error:
+                events.put(("error", {"error": str(error), "status": 404}))
+            except Exception:
+                logger.exception("Streaming scan failed")
+                events.put(("error", {"error": "Internal server error", "status": 500}))
+            finally:
+                events.put(_STREAM_DONE)
+
+        threading.Thread(target=run, name="scan-stream", daemon=True).start()
+
+        while True:
+            event = events.get()
+            if event is _STREAM_DONE:
+                return
+            yield event
 
     def _insert_scan(
         self,
@@ -113,8 +191,11 @@ class ScanService:
         queue_type,
         status,
         encounter_count,
+        players=(),
+        participants=(),
+        encounters=(),
     ):
-        scan_id = self.storage.insert_scan(
+        scan_id = self.storage.record_scan(
             tracked_profile_id=tracked_profile_id,
             source=source,
             region=region,
@@ -123,6 +204,9 @@ class ScanService:
             status=status,
             duration_seconds=0.0,
             encounter_count=encounter_count,
+            players=players,
+            participants=participants,
+            encounters=encounters,
         )
         return {
             "id": scan_id,
@@ -192,39 +276,65 @@ class ScanService:
 
         return normalized
 
-    def _persist_participant(self, scan_id, participant, region):
-        resolution_status = "tracked" if participant["relation"] == "self" else "resolved"
-        self.storage.upsert_player(
-            puuid=participant["puuid"],
-            game_name=participant["gameName"],
-            tag_line=participant["tagLine"],
-            region=region,
-            resolution_status=resolution_status,
-        )
-        self.storage.insert_scan_participant(
-            scan_id=scan_id,
-            player_puuid=participant["puuid"],
-            relation=participant["relation"],
-            champion_id=participant["championId"],
-            team_id=participant["teamId"],
-        )
+    @staticmethod
+    def _summarize_partial_history(participants, history):
+        participant_map = {
+            participant["puuid"]: participant
+            for participant in participants
+            if participant["relation"] != "self"
+        }
+        partial = [
+            {
+                "puuid": puuid,
+                "riotId": participant_map.get(puuid, {}).get("riotId"),
+                "relation": participant_map.get(puuid, {}).get("relation"),
+                "championId": participant_map.get(puuid, {}).get("championId"),
+                "matches": player_history.get("matches", []),
+                "totalGames": player_history.get("totalGames", 0),
+                "wins": player_history.get("wins", 0),
+                "losses": player_history.get("losses", 0),
+            }
+            for puuid, player_history in history.items()
+        ]
+        return sorted(partial, key=lambda player: (-player["totalGames"], player["puuid"]))
 
-    def _persist_encounters(self, tracked_profile_id, scan_id, history):
-        for player_puuid, player_history in history.items():
-            for match in player_history.get("matches", []):
-                self.storage.insert_encounter(
-                    tracked_profile_id=tracked_profile_id,
-                    player_puuid=player_puuid,
-                    scan_id=scan_id,
-                    match_id=match["matchId"],
-                    played_at=self._timestamp_to_iso(match.get("timestamp")),
-                    relation=self._normalize_encounter_relation(match.get("team")),
-                    champion_id=match.get("targetChampId"),
-                    queue_id=match.get("queueId"),
-                    won=1 if match.get("win") else 0,
-                )
+    @staticmethod
+    def _player_row(participant, region):
+        return {
+            "puuid": participant["puuid"],
+            "game_name": participant["gameName"],
+            "tag_line": participant["tagLine"],
+            "region": region,
+            "resolution_status": "tracked" if participant["relation"] == "self" else "resolved",
+        }
 
-    def _build_repeat_players(self, tracked_profile_id, participants, history):
+    @staticmethod
+    def _participant_row(participant):
+        return {
+            "player_puuid": participant["puuid"],
+            "relation": participant["relation"],
+            "champion_id": participant["championId"],
+            "team_id": participant["teamId"],
+        }
+
+    def _encounter_rows(self, history):
+        return [
+            {
+                "player_puuid": player_puuid,
+                "match_id": match["matchId"],
+                "played_at": self._timestamp_to_iso(played_at_ms),
+                "played_at_ms": played_at_ms,
+                "relation": self._normalize_encounter_relation(match.get("team")),
+                "champion_id": match.get("targetChampId"),
+                "queue_id": match.get("queueId"),
+                "won": 1 if match.get("win") else 0,
+            }
+            for player_puuid, player_history in history.items()
+            for match in player_history.get("matches", [])
+            for played_at_ms in [self._timestamp_ms(match.get("timestamp"))]
+        ]
+
+    def _build_repeat_players(self, tracked_profile_id, participants, history, explain=False):
         participant_map = {
             participant["puuid"]: participant
             for participant in participants
@@ -234,6 +344,7 @@ class ScanService:
             return []
 
         repeat_players = []
+        stats = {}
 
         for player in self.storage.load_repeat_players(
             tracked_profile_id,
@@ -242,7 +353,7 @@ class ScanService:
             current_participant = participant_map.get(player["puuid"], {})
             player_history = history.get(player["puuid"], {})
             total_games = player["stats"]["total_encounters"]
-            wins = sum(1 for encounter in player["encounters"] if encounter["won"])
+            wins = player["wins"]
             repeat_players.append(
                 {
                     "puuid": player["puuid"],
@@ -257,21 +368,36 @@ class ScanService:
                     "totalGames": total_games,
                     "wins": wins,
                     "losses": total_games - wins,
-                    "risk": score_repeat_player(player["stats"]),
+                    "risk": score_repeat_player(
+                        player["stats"],
+                        include_reasons=False,
+                        mode=self.storage.scoring_mode,
+                    ),
                     "note": player.get("note"),
                     "watchNote": player.get("note"),
                 }
             )
+            stats[player["puuid"]] = player["stats"]
 
-        return sorted(
+        repeat_players.sort(key=lambda player: (-player["risk"]["score"], -player["totalGames"]))
+        explain_ranked_players(
             repeat_players,
-            key=lambda player: (-player["risk"]["score"], -player["totalGames"]),
+            [stats[player["puuid"]] for player in repeat_players],
+            explain,
+            self.storage.scoring_mode,
         )
+        return repeat_players
 
     @staticmethod
     def _normalize_encounter_relation(team_value):
         return "ally" if team_value == "with" else "enemy"
 
+    @staticmethod
+    def _timestamp_ms(timestamp_ms):
+        if not timestamp_ms:
+            return int(time.time() * 1000)
+        return int(timestamp_ms)
+
     @staticmethod
     def _timestamp_to_iso(timestamp_ms):
         if not timestamp_ms:
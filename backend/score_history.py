@@ -0,0 +1,155 @@
+"""As-of replay of repeat-player scores across a profile's past scans."""
+
+from __future__ import annotations
+
+from collections import Counter, deque
+from typing import Iterable, Iterator
+
+from scoring import DAY_MS, decay_factor, decayed_count, score_repeat_players
+
+
+# Order of the values returned by _PlayerHistory.stats.
+_COLUMNS = (
+    "total_encounters",
+    "encounters_last_30d",
+    "distinct_days_last_30d",
+    "encounters_last_7d",
+    "recent_encounters",
+    "consecutive_scan_hits",
+    "enemy_ratio",
+    "ally_ratio",
+)
+
+
+class _PlayerHistory:
+    """Running per-player counters as of the replay clock."""
+
+    __slots__ = (
+        "total",
+        "enemy",
+        "ally",
+        "last_30d",
+        "last_7d",
+        "days_30d",
+        "recent",
+        "recent_at_ms",
+        "last_hit_index",
+        "streak",
+    )
+
+    def __init__(self):
+        self.total = 0
+        self.enemy = 0
+        self.ally = 0
+        self.last_30d: deque[int] = deque()
+        self.last_7d: deque[int] = deque()
+        self.days_30d: Counter = Counter()
+        self.recent = 0.0
+        self.recent_at_ms: int | None = None
+        self.last_hit_index: int | None = None
+        self.streak = 0
+
+    def add_encounter(self, played_at_ms: int, relation: str) -> None:
+        self.total += 1
+        self.enemy += relation == "enemy"
+        self.ally += relation == "ally"
+        self.last_30d.append(played_at_ms)
+        self.last_7d.append(played_at_ms)
+        self.days_30d[played_at_ms // DAY_MS] += 1
+        if self.recent_at_ms is None:
+            self.recent = 1.0
+        else:
+            self.recent = self.recent * decay_factor(played_at_ms - self.recent_at_ms) + 1.0
+        self.recent_at_ms = played_at_ms
+
+    def stats(self, now_ms: int) -> tuple:
+        """Current scoring stats, in _COLUMNS order."""
+        return (
+            self.total,
+            len(self.last_30d),
+            len(self.days_30d),
+            len(self.last_7d),
+            decayed_count(self.recent, self.recent_at_ms, now_ms),
+            self.streak,
+            self.enemy / self.total,
+            self.ally / self.total,
+        )
+
+    def slide_windows(self, now_ms: int) -> None:
+        """Drop encounters that fell out of the 30- and 7-day windows at ``now_ms``."""
+        last_30d_ms = now_ms - 30 * DAY_MS
+        while self.last_30d and self.last_30d[0] < last_30d_ms:
+            day = self.last_30d.popleft() // DAY_MS
+            self.days_30d[day] -= 1
+            if not self.days_30d[day]:
+                del self.days_30d[day]
+        last_7d_ms = now_ms - 7 * DAY_MS
+        while self.last_7d and self.last_7d[0] < last_7d_ms:
+            self.last_7d.popleft()
+
+
+def replay_profile_scores(
+    scans: Iterable,
+    participants: Iterable,
+    encounters: Iterable,
+    mode: str = "windowed",
+) -> Iterator[dict]:
+    """Yield one score snapshot per repeat player per scan, oldest scan first.
+
+    ``scans`` yields (scan_id, scanned_at_ms) by ascending id, ``participants``
+    yields (scan_id, player_puuid) by ascending scan_id and ``encounters``
+    yields (player_puuid, played_at_ms, relation) by ascending played_at_ms.
+    One pass over each stream: an encounter is folded into its player's
+    counters once the replay clock reaches it, and each player's windows only
+    ever slide forward, so the work is linear in the rows read. A snapshot
+    scores the player as the live scoring would have at the scan's time.
+    """
+    players: dict[str, _PlayerHistory] = {}
+    encounters = iter(encounters)
+    participants = iter(participants)
+    next_encounter = next(encounters, None)
+    next_participant = next(participants, None)
+    clock_ms = None
+    snapshots = []
+    columns = {name: [] for name in _COLUMNS}
+
+    for scan_index, (scan_id, scanned_at_ms) in enumerate(scans):
+        # Scans are replayed in id order; the clock never runs backwards.
+        clock_ms = scanned_at_ms if clock_ms is None else max(clock_ms, scanned_at_ms)
+        while next_encounter is not None and next_encounter[1] <= clock_ms:
+            player_puuid, played_at_ms, relation = next_encounter
+            players.setdefault(player_puuid, _PlayerHistory()).add_encounter(played_at_ms, relation)
+            next_encounter = next(encounters, None)
+
+        while next_participant is not None and next_participant[0] < scan_id:
+            next_participant = next(participants, None)
+        while next_participant is not None and next_participant[0] == scan_id:
+            history = players.setdefault(next_participant[1], _PlayerHistory())
+            history.streak = history.streak + 1 if history.last_hit_index == scan_index - 1 else 1
+            history.last_hit_index = scan_index
+            if history.total:
+                history.slide_windows(clock_ms)
+                snapshots.append((scan_id, scanned_at_ms, next_participant[1]))
+                for name, value in zip(_COLUMNS, history.stats(clock_ms)):
+                    columns[name].append(value)
+            next_participant = next(participants, None)
+
+    if not snapshots:
+        return
+
+    # Scored in one batch once the sweep is done.
+    risk = score_repeat_players(columns, mode)
+    for (scan_id, scanned_at_ms, player_puuid), total, score, tier in zip(
+        snapshots,
+        columns["total_encounters"],
+        risk["score"],
+        risk["tier"],
+    ):
+        yield {
+            "scan_id": scan_id,
+            "scanned_at_ms": scanned_at_ms,
+            "player_puuid": player_puuid,
+            "total_encounters": total,
+            "score": score,
+            "tier": tier,
+        }
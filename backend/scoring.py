@@ -18,36 +18,146 @@ def _tier_for_score(score: int) -> str:
     raise ValueError(f"No tier configured for score {score}")
 
 
-def score_repeat_player(stats: dict) -> dict:
-    score = 0
-    score += min(stats["total_encounters"], 5) * 8
-    score += min(stats["encounters_last_30d"], 4) * 6
-    score += min(stats["distinct_days_last_30d"], 4) * 5
-    score += min(stats["consecutive_scan_hits"], 3) * 8
-
-    enemy_bonus = max(stats["enemy_ratio"] - 0.5, 0) / 0.5 * 15
-    ally_penalty = max(stats["ally_ratio"] - 0.6, 0) / 0.4 * 12
+# "windowed" reads recency from 7- and 30-day counts over encounter rows;
+# "decayed" reads it from the stored exponentially decayed encounter counter.
+SCORING_MODES = ("windowed", "decayed")
+
+DAY_MS = 86_400_000
+
+# An encounter weighs 1 in the decayed counter when it happens and half as
+# much after every half-life.
+ENCOUNTER_HALF_LIFE_MS = 7 * DAY_MS
+
+
+def decay_factor(elapsed_ms) -> float:
+    """Weight left of one encounter after ``elapsed_ms``."""
+    return 0.5 ** (max(elapsed_ms, 0) / ENCOUNTER_HALF_LIFE_MS)
+
+
+def decayed_count(value, updated_at_ms, now_ms: int) -> float:
+    """Evaluate a decayed counter stored as (value, updated_at_ms) at ``now_ms``."""
+    if updated_at_ms is None:
+        return 0.0
+    return value * decay_factor(now_ms - updated_at_ms)
+
+
+# Ranked lists build reasons for this many leading players unless the caller
+# asks for every player to be explained; the rest carry an empty list.
+EXPLAINED_PLAYER_LIMIT = 5
+
+
+# Column order of the stats consumed by score_repeat_players, per mode.
+STATS_COLUMNS = (
+    "total_encounters",
+    "encounters_last_30d",
+    "distinct_days_last_30d",
+    "encounters_last_7d",
+    "consecutive_scan_hits",
+    "enemy_ratio",
+    "ally_ratio",
+)
+DECAYED_STATS_COLUMNS = (
+    "total_encounters",
+    "recent_encounters",
+    "consecutive_scan_hits",
+    "enemy_ratio",
+    "ally_ratio",
+)
+
+
+def _score(
+    total_encounters,
+    encounters_last_30d,
+    distinct_days_last_30d,
+    encounters_last_7d,
+    consecutive_scan_hits,
+    enemy_ratio,
+    ally_ratio,
+) -> int:
+    recency = min(encounters_last_30d, 4) * 6 + min(distinct_days_last_30d, 4) * 5
+    if encounters_last_7d >= 3:
+        recency += 10
+    return _finish_score(total_encounters, consecutive_scan_hits, enemy_ratio, ally_ratio, recency)
+
+
+def _score_decayed(total_encounters, recent_encounters, consecutive_scan_hits, enemy_ratio, ally_ratio) -> int:
+    # Worth as much as the windowed counts at their caps; 2.5 is about what
+    # three encounters within a few days leave behind.
+    recency = round(min(recent_encounters, 4) * 11)
+    if recent_encounters >= 2.5:
+        recency += 10
+    return _finish_score(total_encounters, consecutive_scan_hits, enemy_ratio, ally_ratio, recency)
+
+
+def _finish_score(total_encounters, consecutive_scan_hits, enemy_ratio, ally_ratio, recency) -> int:
+    score = recency
+    score += min(total_encounters, 5) * 8
+    score += min(consecutive_scan_hits, 3) * 8
+
+    enemy_bonus = max(enemy_ratio - 0.5, 0) / 0.5 * 15
+    ally_penalty = max(ally_ratio - 0.6, 0) / 0.4 * 12
 
     score += round(enemy_bonus)
     score -= round(ally_penalty)
 
-    if stats["encounters_last_7d"] >= 3:
-        score += 10
-    if stats["total_encounters"] < 2:
+    if total_encounters < 2:
         score = min(score, 35)
-    if stats["ally_ratio"] >= 0.75 and stats["enemy_ratio"] <= 0.25:
+    if ally_ratio >= 0.75 and enemy_ratio <= 0.25:
         score = min(score, 49)
 
-    score = max(0, min(score, 100))
+    return max(0, min(score, 100))
+
+
+def _scorer(mode: str):
+    if mode == "windowed":
+        return _score, STATS_COLUMNS
+    if mode == "decayed":
+        return _score_decayed, DECAYED_STATS_COLUMNS
+    raise ValueError(f"Unknown scoring mode {mode!r}")
+
+
+def score_repeat_player(stats: dict, include_reasons: bool = True, mode: str = "windowed") -> dict:
+    score_fn, names = _scorer(mode)
+    score = score_fn(*(stats[name] for name in names))
 
     return {
         "score": score,
         "tier": _tier_for_score(score),
-        "reasons": build_reasons(stats, score),
+        "reasons": build_reasons(stats, score, mode) if include_reasons else [],
     }
 
 
-def build_reasons(stats: dict, score: int) -> list[str]:
+def explain_ranked_players(
+    players: list[dict],
+    stats: list[dict],
+    explain: bool = False,
+    mode: str = "windowed",
+) -> None:
+    """Fill in risk reasons for already-ranked players, in place.
+
+    ``stats`` holds each player's scoring stats in the same order. Only the
+    first EXPLAINED_PLAYER_LIMIT players are explained unless ``explain``.
+    """
+    limit = None if explain else EXPLAINED_PLAYER_LIMIT
+    for player, player_stats in zip(players[:limit], stats[:limit]):
+        player["risk"]["reasons"] = build_reasons(player_stats, player["risk"]["score"], mode)
+
+
+def score_repeat_players(columns: dict, mode: str = "windowed") -> dict:
+    """Score many players at once from columnar stats.
+
+    ``columns`` maps every stats name the mode reads (STATS_COLUMNS or
+    DECAYED_STATS_COLUMNS) to a sequence holding one value per player.
+    Returns ``{"score": [...], "tier": [...]}`` equal, row for row, to what
+    score_repeat_player gives, without building reasons.
+    """
+    score_fn, names = _scorer(mode)
+    scores = list(map(score_fn, *(columns[name] for name in names)))
+    tiers = [_tier_for_score(value) for value in range(101)]
+    return {"score": scores, "tier": [tiers[score] for score in scores]}
+
+
+def build_reasons(stats: dict, score: int, mode: str = "windowed") -> list[str]:
     reasons = []
 
     if stats["total_encounters"] >= 3:
@@ -55,7 +165,12 @@ def build_reasons(stats: dict, score: int) -> list[str]:
     elif stats["total_encounters"] == 1:
         reasons.append("only one recorded encounter so far")
 
-    if stats["distinct_days_last_30d"] >= 3:
+    if mode == "decayed":
+        if stats["recent_encounters"] >= 2.5:
+            reasons.append(
+                f"recent encounters still weigh {stats['recent_encounters']:.1f} after decay"
+            )
+    elif stats["distinct_days_last_30d"] >= 3:
         reasons.append(
             f"seen across {stats['distinct_days_last_30d']} distinct days in the last 30 days"
         )
@@ -65,7 +180,7 @@ def build_reasons(stats: dict, score: int) -> list[str]:
             f"appeared in {stats['consecutive_scan_hits']} consecutive scans"
         )
 
-    if stats["encounters_last_7d"] >= 3:
+    if mode == "windowed" and stats["encounters_last_7d"] >= 3:
         reasons.append("3 or more encounters landed in the last 7 days")
 
     if stats["enemy_ratio"] > 0.5:
@@ -82,3 +197,27 @@ def build_reasons(stats: dict, score: int) -> list[str]:
         reasons.append(f"overall score settled at {score} from a limited encounter history")
 
     return reasons
+
+
+def score_player_group(member_scores, shared_matches: int, enemy_matches: int) -> dict:
+    """Combined risk of players who keep landing on the same side of a match together.
+
+    The group is as risky as its riskiest member, plus a bonus for every
+    shared match after the first and one for a mostly enemy-side group.
+    """
+    top_member_score = max(member_scores)
+    score = top_member_score + min(shared_matches - 1, 4) * 5
+    if enemy_matches * 2 > shared_matches:
+        score += 10
+    score = max(0, min(score, 100))
+
+    reasons = [f"shared a side in {shared_matches} matches"]
+    if enemy_matches:
+        reasons.append(f"{enemy_matches} of those matches were on the enemy side")
+    reasons.append(f"riskiest member scores {top_member_score} alone")
+
+    return {
+        "score": score,
+        "tier": _tier_for_score(score),
+        "reasons": reasons,
+    }
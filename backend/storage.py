@@ -2,14 +2,44 @@
 
 from __future__ import annotations
 
+import base64
+import heapq
+import json
+import logging
+import math
+import queue
 import sqlite3
+import threading
+import time
 from collections import defaultdict
+from concurrent.futures import Future
+from contextlib import contextmanager
 from datetime import datetime, timedelta, timezone
 from pathlib import Path
-from typing import Iterable
+from typing import Callable, Iterable, Iterator
+
+from retention import MIN_RETENTION_DAYS
+from score_history import replay_profile_scores
+from scoring import (
+    DAY_MS,
+    ENCOUNTER_HALF_LIFE_MS,
+    SCORING_MODES,
+    decay_factor,
+    decayed_count,
+    explain_ranked_players,
+    score_player_group,
+    score_repeat_player,
+    score_repeat_players,
+)
+
 
-from scoring import score_repeat_player
+logger = logging.getLogger(__name__)
 
+MIGRATION_BATCH_SIZE = 5000
+RETENTION_BATCH_SIZE = 1000
+# Most write requests queued while one transaction is open that the writer
+# thread folds into the next commit.
+WRITE_BATCH_SIZE = 64
 
 SCHEMA_STATEMENTS: Iterable[str] = (
     """
@@ -96,44 +126,1237 @@ SCHEMA_STATEMENTS: Iterable[str] = (
         FOREIGN KEY (player_puuid) REFERENCES players (puuid) ON DELETE CASCADE
     )
     """,
+    """
+    CREATE TABLE IF NOT EXISTS match_details (
+        match_id TEXT PRIMARY KEY,
+        game_creation INTEGER,
+        game_end_timestamp INTEGER,
+        payload TEXT NOT NULL,
+        fetched_at TEXT NOT NULL DEFAULT CURRENT_TIMESTAMP
+    )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS player_match_history (
+        puuid TEXT NOT NULL,
+        match_id TEXT NOT NULL,
+        game_creation INTEGER,
+        game_end_timestamp INTEGER,
+        created_at TEXT NOT NULL DEFAULT CURRENT_TIMESTAMP,
+        PRIMARY KEY (puuid, match_id)
+    )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS match_participants (
+        match_id TEXT NOT NULL,
+        puuid TEXT NOT NULL,
+        team_id INTEGER,
+        win INTEGER,
+        champion_id INTEGER,
+        queue_id INTEGER,
+        game_creation INTEGER,
+        PRIMARY KEY (match_id, puuid),
+        FOREIGN KEY (match_id) REFERENCES match_details (match_id) ON DELETE CASCADE
+    )
+    """,
+    """
+    CREATE INDEX IF NOT EXISTS idx_match_participants_puuid
+    ON match_participants (puuid, match_id)
+    """,
 )
 
 
-def _summarize_repeat_player(player: dict) -> dict:
-    """Shape a repeat-player record for memory-overview responses."""
+def encode_cursor(values) -> str:
+    """Encode keyset values as an opaque, URL-safe page cursor."""
+    raw = json.dumps(list(values), separators=(",", ":")).encode("utf-8")
+    return base64.urlsafe_b64encode(raw).decode("ascii").rstrip("=")
+
+
+def decode_cursor(cursor: str, types) -> list:
+    """Decode a cursor produced by encode_cursor; raises ValueError if malformed.
+
+    ``types`` gives the accepted type (or tuple of types) of each value, so a
+    well-formed cursor carrying the wrong values never reaches SQLite.
+    """
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        values = json.loads(raw)
+    except (ValueError, TypeError) as error:
+        raise ValueError("Invalid cursor") from error
+    if not isinstance(values, list) or len(values) != len(types):
+        raise ValueError("Invalid cursor")
+    for value, expected in zip(values, types):
+        if isinstance(value, bool) or not isinstance(value, expected):
+            raise ValueError("Invalid cursor")
+    return values
+
+
+def _summarize_repeat_player(player: dict, mode: str = "windowed") -> dict:
+    """Shape a repeat-player record for memory-overview responses.
+
+    Reasons are left empty; explain_ranked_players fills them in once the
+    players are ranked.
+    """
     return {
         "puuid": player["puuid"],
         "gameName": player["gameName"],
         "tagLine": player["tagLine"],
         "region": player["region"],
         "totalGames": player["stats"]["total_encounters"],
-        "risk": score_repeat_player(player["stats"]),
+        "risk": score_repeat_player(player["stats"], include_reasons=False, mode=mode),
         "note": player.get("note"),
         "watchNote": player.get("note"),
     }
 
 
+READ_PATH_INDEXES: Iterable[str] = (
+    """
+    CREATE INDEX IF NOT EXISTS idx_encounters_profile_player_played
+    ON encounters (tracked_profile_id, player_puuid, played_at)
+    """,
+    """
+    CREATE INDEX IF NOT EXISTS idx_scans_profile
+    ON scans (tracked_profile_id, id, encounter_count, created_at)
+    """,
+    """
+    CREATE INDEX IF NOT EXISTS idx_tracked_profiles_riot_id
+    ON tracked_profiles (lower(game_name), lower(tag_line))
+    """,
+    """
+    CREATE INDEX IF NOT EXISTS idx_tracked_profiles_updated
+    ON tracked_profiles (updated_at, id)
+    """,
+    """
+    CREATE INDEX IF NOT EXISTS idx_player_match_history_recent
+    ON player_match_history (puuid, game_creation, match_id)
+    """,
+)
+
+
+# Lifetime per-player counters kept current by triggers, so every write path
+# (single inserts, executemany batches, upserts that flip a relation) updates
+# them inside the same transaction as the encounter row itself.
+PLAYER_ENCOUNTER_STATS_SCHEMA: Iterable[str] = (
+    """
+    CREATE TABLE IF NOT EXISTS player_encounter_stats (
+        tracked_profile_id INTEGER NOT NULL,
+        player_puuid TEXT NOT NULL,
+        total_encounters INTEGER NOT NULL DEFAULT 0,
+        enemy_encounters INTEGER NOT NULL DEFAULT 0,
+        ally_encounters INTEGER NOT NULL DEFAULT 0,
+        wins INTEGER NOT NULL DEFAULT 0,
+        last_played_at TEXT,
+        last_scan_hit_id INTEGER,
+        scan_hit_streak INTEGER NOT NULL DEFAULT 0,
+        PRIMARY KEY (tracked_profile_id, player_puuid),
+        FOREIGN KEY (tracked_profile_id) REFERENCES tracked_profiles (id) ON DELETE CASCADE,
+        FOREIGN KEY (player_puuid) REFERENCES players (puuid) ON DELETE CASCADE
+    )
+    """,
+    """
+    CREATE INDEX IF NOT EXISTS idx_encounters_profile_played
+    ON encounters (tracked_profile_id, played_at, player_puuid)
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS trg_encounters_stats_insert
+    AFTER INSERT ON encounters
+    BEGIN
+        INSERT INTO player_encounter_stats (
+            tracked_profile_id,
+            player_puuid,
+            total_encounters,
+            enemy_encounters,
+            ally_encounters,
+            wins,
+            last_played_at
+        )
+        VALUES (
+            NEW.tracked_profile_id,
+            NEW.player_puuid,
+            1,
+            NEW.relation = 'enemy',
+            NEW.relation = 'ally',
+            NEW.won != 0,
+            NEW.played_at
+        )
+        ON CONFLICT(tracked_profile_id, player_puuid) DO UPDATE SET
+            total_encounters = total_encounters + 1,
+            enemy_encounters = enemy_encounters + excluded.enemy_encounters,
+            ally_encounters = ally_encounters + excluded.ally_encounters,
+            wins = wins + excluded.wins,
+            last_played_at = MAX(COALESCE(last_played_at, ''), excluded.last_played_at);
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS trg_encounters_stats_update
+    AFTER UPDATE OF relation, won, played_at ON encounters
+    BEGIN
+        UPDATE player_encounter_stats
+        SET
+            enemy_encounters = enemy_encounters - (OLD.relation = 'enemy') + (NEW.relation = 'enemy'),
+            ally_encounters = ally_encounters - (OLD.relation = 'ally') + (NEW.relation = 'ally'),
+            wins = wins - (OLD.won != 0) + (NEW.won != 0),
+            last_played_at = (
+                SELECT MAX(played_at)
+                FROM encounters
+                WHERE tracked_profile_id = NEW.tracked_profile_id
+                  AND player_puuid = NEW.player_puuid
+            )
+        WHERE tracked_profile_id = NEW.tracked_profile_id
+          AND player_puuid = NEW.player_puuid;
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS trg_encounters_stats_delete
+    AFTER DELETE ON encounters
+    BEGIN
+        UPDATE player_encounter_stats
+        SET
+            total_encounters = total_encounters - 1,
+            enemy_encounters = enemy_encounters - (OLD.relation = 'enemy'),
+            ally_encounters = ally_encounters - (OLD.relation = 'ally'),
+            wins = wins - (OLD.won != 0),
+            last_played_at = (
+                SELECT MAX(played_at)
+                FROM encounters
+                WHERE tracked_profile_id = OLD.tracked_profile_id
+                  AND player_puuid = OLD.player_puuid
+            )
+        WHERE tracked_profile_id = OLD.tracked_profile_id
+          AND player_puuid = OLD.player_puuid;
+    END
+    """,
+    # A scan hit extends the streak only when the player's previous hit was the
+    # profile's previous scan; replays of an older scan leave the streak alone.
+    """
+    CREATE TRIGGER IF NOT EXISTS trg_scan_participants_stats_insert
+    AFTER INSERT ON scan_participants
+    BEGIN
+        INSERT INTO player_encounter_stats (
+            tracked_profile_id,
+            player_puuid,
+            last_scan_hit_id,
+            scan_hit_streak
+        )
+        SELECT s.tracked_profile_id, NEW.player_puuid, NEW.scan_id, 1
+        FROM scans s
+        WHERE s.id = NEW.scan_id
+        ON CONFLICT(tracked_profile_id, player_puuid) DO UPDATE SET
+            scan_hit_streak = CASE
+                WHEN last_scan_hit_id IS NULL THEN 1
+                WHEN excluded.last_scan_hit_id <= last_scan_hit_id THEN scan_hit_streak
+                WHEN last_scan_hit_id = (
+                    SELECT MAX(id)
+                    FROM scans
+                    WHERE tracked_profile_id = excluded.tracked_profile_id
+                      AND id < excluded.last_scan_hit_id
+                ) THEN scan_hit_streak + 1
+                ELSE 1
+            END,
+            last_scan_hit_id = MAX(COALESCE(last_scan_hit_id, 0), excluded.last_scan_hit_id);
+    END
+    """,
+)
+
+
+# Stored repeat-player scores are recomputed once a profile is marked dirty by
+# a write, or once they are this old (the 7/30-day windows keep moving).
+SCORE_REFRESH_MS = 5 * 60 * 1000
+EPOCH = datetime(1970, 1, 1, tzinfo=timezone.utc)
+
+
+# Stored scores back score-ordered keyset pages. Any write that can move a
+# score marks the profile dirty; refresh_repeat_player_scores clears it.
+SCORE_PAGINATION_SCHEMA: Iterable[str] = (
+    """
+    CREATE TABLE IF NOT EXISTS profile_score_state (
+        tracked_profile_id INTEGER PRIMARY KEY,
+        dirty INTEGER NOT NULL DEFAULT 1,
+        scored_at_ms INTEGER,
+        FOREIGN KEY (tracked_profile_id) REFERENCES tracked_profiles (id) ON DELETE CASCADE
+    )
+    """,
+    """
+    CREATE INDEX IF NOT EXISTS idx_player_encounter_stats_score
+    ON player_encounter_stats (tracked_profile_id, score DESC, player_puuid)
+    """,
+    """
+    CREATE INDEX IF NOT EXISTS idx_encounters_profile_player_played_ms
+    ON encounters (tracked_profile_id, player_puuid, played_at_ms)
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS trg_stats_scores_dirty_insert
+    AFTER INSERT ON player_encounter_stats
+    BEGIN
+        INSERT INTO profile_score_state (tracked_profile_id, dirty)
+        VALUES (NEW.tracked_profile_id, 1)
+        ON CONFLICT(tracked_profile_id) DO UPDATE SET dirty = 1;
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS trg_stats_scores_dirty_update
+    AFTER UPDATE OF
+        total_encounters,
+        enemy_encounters,
+        ally_encounters,
+        last_played_at,
+        last_scan_hit_id,
+        scan_hit_streak
+    ON player_encounter_stats
+    BEGIN
+        INSERT INTO profile_score_state (tracked_profile_id, dirty)
+        VALUES (NEW.tracked_profile_id, 1)
+        ON CONFLICT(tracked_profile_id) DO UPDATE SET dirty = 1;
+    END
+    """,
+    # A new scan ends the streak of every player who is not in it.
+    """
+    CREATE TRIGGER IF NOT EXISTS trg_scans_scores_dirty_insert
+    AFTER INSERT ON scans
+    BEGIN
+        INSERT INTO profile_score_state (tracked_profile_id, dirty)
+        VALUES (NEW.tracked_profile_id, 1)
+        ON CONFLICT(tracked_profile_id) DO UPDATE SET dirty = 1;
+    END
+    """,
+)
+
+
+RETENTION_SCHEMA: Iterable[str] = (
+    """
+    CREATE INDEX IF NOT EXISTS idx_match_details_game_creation
+    ON match_details (game_creation)
+    """,
+    """
+    CREATE INDEX IF NOT EXISTS idx_player_match_history_game_creation
+    ON player_match_history (game_creation)
+    """,
+)
+
+
+# Matches whose encounters retention rolled into player_encounter_stats, one
+# row per (profile, match) rather than per encounter. Re-scanning such a match
+# must not count an already-counted player again; see _insert_encounters.
+ARCHIVED_MATCHES_SCHEMA: Iterable[str] = (
+    """
+    CREATE TABLE IF NOT EXISTS archived_matches (
+        tracked_profile_id INTEGER NOT NULL,
+        match_id TEXT NOT NULL,
+        PRIMARY KEY (tracked_profile_id, match_id),
+        FOREIGN KEY (tracked_profile_id) REFERENCES tracked_profiles (id) ON DELETE CASCADE
+    ) WITHOUT ROWID
+    """,
+)
+
+
+# Let the cross-profile memory summary read its top players, tier counts and
+# stale profiles straight from stored scores instead of rescoring everyone.
+SUMMARY_SCORE_SCHEMA: Iterable[str] = (
+    """
+    CREATE INDEX IF NOT EXISTS idx_player_encounter_stats_global_score
+    ON player_encounter_stats (score DESC, total_encounters DESC)
+    """,
+    """
+    CREATE INDEX IF NOT EXISTS idx_player_encounter_stats_tier
+    ON player_encounter_stats (tier)
+    """,
+    """
+    CREATE INDEX IF NOT EXISTS idx_profile_score_state_dirty
+    ON profile_score_state (dirty)
+    """,
+    """
+    CREATE INDEX IF NOT EXISTS idx_profile_score_state_scored_at
+    ON profile_score_state (scored_at_ms)
+    """,
+    """
+    INSERT OR IGNORE INTO profile_score_state (tracked_profile_id, dirty)
+    SELECT DISTINCT tracked_profile_id, 1
+    FROM player_encounter_stats
+    """,
+)
+
+
+# What each repeat player scored at each past scan, as rebuilt by
+# rebuild_score_snapshots. Keyed for one player's timeline in scan order.
+SCORE_SNAPSHOT_SCHEMA: Iterable[str] = (
+    """
+    CREATE TABLE IF NOT EXISTS score_snapshots (
+        tracked_profile_id INTEGER NOT NULL,
+        player_puuid TEXT NOT NULL,
+        scan_id INTEGER NOT NULL,
+        scanned_at_ms INTEGER NOT NULL,
+        total_encounters INTEGER NOT NULL,
+        score INTEGER NOT NULL,
+        tier TEXT NOT NULL,
+        PRIMARY KEY (tracked_profile_id, player_puuid, scan_id),
+        FOREIGN KEY (tracked_profile_id) REFERENCES tracked_profiles (id) ON DELETE CASCADE,
+        FOREIGN KEY (scan_id) REFERENCES scans (id) ON DELETE CASCADE
+    ) WITHOUT ROWID
+    """,
+    """
+    CREATE INDEX IF NOT EXISTS idx_score_snapshots_scan
+    ON score_snapshots (scan_id)
+    """,
+)
+
+
+# Per-millisecond rate of the decayed encounter counter, so exp(-rate * t)
+# halves every scoring.ENCOUNTER_HALF_LIFE_MS.
+DECAY_PER_MS = math.log(2) / ENCOUNTER_HALF_LIFE_MS
+
+
+def _decay_sql(elapsed_ms: str) -> str:
+    return f"exp(-{DECAY_PER_MS!r} * ({elapsed_ms}))"
+
+
+# Exponentially decayed encounter count per player, kept as (value, as-of ms).
+# Each encounter moves it in O(1): a newer one decays the value up to its own
+# time and adds 1, an older one adds its already-decayed weight. Reads decay
+# the value to "now" with scoring.decayed_count, so no encounter row is read.
+# The upsert keeps the insert trigger independent of trigger firing order.
+DECAYED_ENCOUNTERS_SCHEMA: Iterable[str] = (
+    f"""
+    CREATE TRIGGER IF NOT EXISTS trg_encounters_recent_insert
+    AFTER INSERT ON encounters
+    WHEN NEW.played_at_ms IS NOT NULL
+    BEGIN
+        INSERT INTO player_encounter_stats (
+            tracked_profile_id,
+            player_puuid,
+            recent_encounters,
+            recent_encounters_at_ms
+        )
+        VALUES (NEW.tracked_profile_id, NEW.player_puuid, 1.0, NEW.played_at_ms)
+        ON CONFLICT(tracked_profile_id, player_puuid) DO UPDATE SET
+            recent_encounters = CASE
+                WHEN recent_encounters_at_ms IS NULL THEN 1.0
+                WHEN NEW.played_at_ms >= recent_encounters_at_ms
+                    THEN recent_encounters * {_decay_sql("NEW.played_at_ms - recent_encounters_at_ms")} + 1.0
+                ELSE recent_encounters + {_decay_sql("recent_encounters_at_ms - NEW.played_at_ms")}
+            END,
+            recent_encounters_at_ms = MAX(COALESCE(recent_encounters_at_ms, 0), NEW.played_at_ms);
+    END
+    """,
+    f"""
+    CREATE TRIGGER IF NOT EXISTS trg_encounters_recent_update
+    AFTER UPDATE OF played_at_ms ON encounters
+    WHEN OLD.played_at_ms IS NOT NULL
+      AND NEW.played_at_ms IS NOT NULL
+      AND OLD.played_at_ms != NEW.played_at_ms
+    BEGIN
+        UPDATE player_encounter_stats
+        SET
+            recent_encounters =
+                MAX(recent_encounters - {_decay_sql("recent_encounters_at_ms - OLD.played_at_ms")}, 0.0)
+                * {_decay_sql("MAX(recent_encounters_at_ms, NEW.played_at_ms) - recent_encounters_at_ms")}
+                + {_decay_sql("MAX(recent_encounters_at_ms, NEW.played_at_ms) - NEW.played_at_ms")},
+            recent_encounters_at_ms = MAX(recent_encounters_at_ms, NEW.played_at_ms)
+        WHERE tracked_profile_id = NEW.tracked_profile_id
+          AND player_puuid = NEW.player_puuid
+          AND recent_encounters_at_ms IS NOT NULL;
+    END
+    """,
+    f"""
+    CREATE TRIGGER IF NOT EXISTS trg_encounters_recent_delete
+    AFTER DELETE ON encounters
+    WHEN OLD.played_at_ms IS NOT NULL
+    BEGIN
+        UPDATE player_encounter_stats
+        SET recent_encounters = MAX(
+            recent_encounters - {_decay_sql("recent_encounters_at_ms - OLD.played_at_ms")},
+            0.0
+        )
+        WHERE tracked_profile_id = OLD.tracked_profile_id
+          AND player_puuid = OLD.player_puuid
+          AND recent_encounters_at_ms IS NOT NULL;
+    END
+    """,
+)
+
+
+def _matchmate_pairs_sql(relation: str, extra_columns: str = "") -> str:
+    """Select each (player_a, player_b) pair NEW forms with a same-side matchmate, sorted."""
+    return f"""
+        SELECT MIN(NEW.player_puuid, e.player_puuid), MAX(NEW.player_puuid, e.player_puuid){extra_columns}
+        FROM encounters e
+        WHERE e.tracked_profile_id = NEW.tracked_profile_id
+          AND e.match_id = NEW.match_id
+          AND e.relation = {relation}
+          AND e.player_puuid != NEW.player_puuid"""
+
+
+def _matchmate_triads_sql(relation: str, extra_columns: str = "") -> str:
+    """Select each (player_a, player_b, player_c) triad NEW forms with two same-side matchmates, sorted."""
+    return f"""
+        SELECT
+            MIN(NEW.player_puuid, x.player_puuid),
+            CASE
+                WHEN NEW.player_puuid < x.player_puuid THEN x.player_puuid
+                WHEN NEW.player_puuid < y.player_puuid THEN NEW.player_puuid
+                ELSE y.player_puuid
+            END,
+            MAX(NEW.player_puuid, y.player_puuid){extra_columns}
+        FROM encounters x
+        JOIN encounters y
+          ON y.tracked_profile_id = x.tracked_profile_id
+         AND y.match_id = x.match_id
+         AND y.relation = x.relation
+         AND y.player_puuid > x.player_puuid
+        WHERE x.tracked_profile_id = NEW.tracked_profile_id
+          AND x.match_id = NEW.match_id
+          AND x.relation = {relation}
+          AND x.player_puuid != NEW.player_puuid
+          AND y.player_puuid != NEW.player_puuid"""
+
+
+_GROUP_COUNT_COLUMNS = ", NEW.tracked_profile_id, 1, NEW.relation = 'enemy', NEW.played_at_ms"
+_GROUP_COUNT_UPSERT = """
+        DO UPDATE SET
+            shared_matches = shared_matches + 1,
+            enemy_matches = enemy_matches + excluded.enemy_matches,
+            last_played_at_ms = MAX(COALESCE(last_played_at_ms, 0), COALESCE(excluded.last_played_at_ms, 0))"""
+
+
+# Sparse co-occurrence counts: one row per pair or triad of encountered
+# players who were on the same side of a match, with members stored in sorted
+# order. A new encounter only looks up its own match's other rows (at most
+# four on either side), so every scan updates the counts in place and reads
+# never pair players up. Like player_encounter_stats these are lifetime
+# counts: retention archiving deletes encounter rows but not their groups.
+PLAYER_GROUP_SCHEMA: Iterable[str] = (
+    """
+    CREATE INDEX IF NOT EXISTS idx_encounters_profile_match
+    ON encounters (tracked_profile_id, match_id, relation, player_puuid)
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS player_pair_stats (
+        tracked_profile_id INTEGER NOT NULL,
+        player_a TEXT NOT NULL,
+        player_b TEXT NOT NULL,
+        shared_matches INTEGER NOT NULL DEFAULT 0,
+        enemy_matches INTEGER NOT NULL DEFAULT 0,
+        last_played_at_ms INTEGER,
+        PRIMARY KEY (tracked_profile_id, player_a, player_b),
+        FOREIGN KEY (tracked_profile_id) REFERENCES tracked_profiles (id) ON DELETE CASCADE,
+        FOREIGN KEY (player_a) REFERENCES players (puuid) ON DELETE CASCADE,
+        FOREIGN KEY (player_b) REFERENCES players (puuid) ON DELETE CASCADE
+    ) WITHOUT ROWID
+    """,
+    """
+    CREATE INDEX IF NOT EXISTS idx_player_pair_stats_shared
+    ON player_pair_stats (tracked_profile_id, shared_matches, last_played_at_ms)
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS player_triad_stats (
+        tracked_profile_id INTEGER NOT NULL,
+        player_a TEXT NOT NULL,
+        player_b TEXT NOT NULL,
+        player_c TEXT NOT NULL,
+        shared_matches INTEGER NOT NULL DEFAULT 0,
+        enemy_matches INTEGER NOT NULL DEFAULT 0,
+        last_played_at_ms INTEGER,
+        PRIMARY KEY (tracked_profile_id, player_a, player_b, player_c),
+        FOREIGN KEY (tracked_profile_id) REFERENCES tracked_profiles (id) ON DELETE CASCADE,
+        FOREIGN KEY (player_a) REFERENCES players (puuid) ON DELETE CASCADE,
+        FOREIGN KEY (player_b) REFERENCES players (puuid) ON DELETE CASCADE,
+        FOREIGN KEY (player_c) REFERENCES players (puuid) ON DELETE CASCADE
+    ) WITHOUT ROWID
+    """,
+    """
+    CREATE INDEX IF NOT EXISTS idx_player_triad_stats_shared
+    ON player_triad_stats (tracked_profile_id, shared_matches, last_played_at_ms)
+    """,
+    f"""
+    CREATE TRIGGER IF NOT EXISTS trg_encounters_groups_insert
+    AFTER INSERT ON encounters
+    BEGIN
+        INSERT INTO player_pair_stats (
+            player_a,
+            player_b,
+            tracked_profile_id,
+            shared_matches,
+            enemy_matches,
+            last_played_at_ms
+        ){_matchmate_pairs_sql("NEW.relation", _GROUP_COUNT_COLUMNS)}
+        ON CONFLICT(tracked_profile_id, player_a, player_b){_GROUP_COUNT_UPSERT};
+
+        INSERT INTO player_triad_stats (
+            player_a,
+            player_b,
+            player_c,
+            tracked_profile_id,
+            shared_matches,
+            enemy_matches,
+            last_played_at_ms
+        ){_matchmate_triads_sql("NEW.relation", _GROUP_COUNT_COLUMNS)}
+        ON CONFLICT(tracked_profile_id, player_a, player_b, player_c){_GROUP_COUNT_UPSERT};
+    END
+    """,
+    # An upsert that flips sides leaves its old matchmates' groups and joins
+    # the new side's.
+    f"""
+    CREATE TRIGGER IF NOT EXISTS trg_encounters_groups_update
+    AFTER UPDATE OF relation ON encounters
+    WHEN OLD.relation != NEW.relation
+    BEGIN
+        UPDATE player_pair_stats
+        SET
+            shared_matches = shared_matches - 1,
+            enemy_matches = enemy_matches - (OLD.relation = 'enemy')
+        WHERE tracked_profile_id = NEW.tracked_profile_id
+          AND (player_a, player_b) IN ({_matchmate_pairs_sql("OLD.relation")});
+
+        UPDATE player_triad_stats
+        SET
+            shared_matches = shared_matches - 1,
+            enemy_matches = enemy_matches - (OLD.relation = 'enemy')
+        WHERE tracked_profile_id = NEW.tracked_profile_id
+          AND (player_a, player_b, player_c) IN ({_matchmate_triads_sql("OLD.relation")});
+
+        DELETE FROM player_pair_stats
+        WHERE tracked_profile_id = NEW.tracked_profile_id AND shared_matches <= 0;
+        DELETE FROM player_triad_stats
+        WHERE tracked_profile_id = NEW.tracked_profile_id AND shared_matches <= 0;
+
+        INSERT INTO player_pair_stats (
+            player_a,
+            player_b,
+            tracked_profile_id,
+            shared_matches,
+            enemy_matches,
+            last_played_at_ms
+        ){_matchmate_pairs_sql("NEW.relation", _GROUP_COUNT_COLUMNS)}
+        ON CONFLICT(tracked_profile_id, player_a, player_b){_GROUP_COUNT_UPSERT};
+
+        INSERT INTO player_triad_stats (
+            player_a,
+            player_b,
+            player_c,
+            tracked_profile_id,
+            shared_matches,
+            enemy_matches,
+            last_played_at_ms
+        ){_matchmate_triads_sql("NEW.relation", _GROUP_COUNT_COLUMNS)}
+        ON CONFLICT(tracked_profile_id, player_a, player_b, player_c){_GROUP_COUNT_UPSERT};
+    END
+    """,
+)
+
+# The memory summary rescores this many players beyond its top-K, since a
+# stored score may have moved (the windows slide) since it was computed.
+SUMMARY_CANDIDATE_OVERFETCH = 2
+
+# Groups need to share at least this many matches to count as recurring.
+MIN_GROUP_SHARED_MATCHES = 2
+
+
+CONNECTION_PRAGMAS: Iterable[str] = (
+    "PRAGMA foreign_keys = ON",
+    "PRAGMA synchronous = NORMAL",
+    "PRAGMA busy_timeout = 5000",
+    "PRAGMA temp_store = MEMORY",
+    "PRAGMA cache_size = -16384",
+    "PRAGMA mmap_size = 268435456",
+)
+
+
+_STOP_WRITER = object()
+
+
+class _WriteRequest:
+    """One queued call to run on the writer thread."""
+
+    __slots__ = ("operation", "args", "future", "bumps_data_version", "in_transaction")
+
+    def __init__(self, operation, args, bumps_data_version: bool, in_transaction: bool):
+        self.operation = operation
+        self.args = args
+        self.future: Future = Future()
+        self.bumps_data_version = bumps_data_version
+        self.in_transaction = in_transaction
+
+
 class Storage:
-    """Small SQLite wrapper for local scan memory."""
+    """Small SQLite wrapper for local scan memory.
 
-    def __init__(self, database_path):
+    Reads run on pooled ``query_only`` connections. Every write goes through
+    a single writer thread that owns the only writable connection and commits
+    whatever has queued up as one transaction, so concurrent scans never race
+    each other for the SQLite write lock.
+    """
+
+    def __init__(
+        self,
+        database_path,
+        pool_size: int = 8,
+        migration_batch_size: int = MIGRATION_BATCH_SIZE,
+        on_migration_progress: Callable[[str, int, int], None] | None = None,
+        write_batch_size: int = WRITE_BATCH_SIZE,
+        scoring_mode: str = "windowed",
+    ):
+        if scoring_mode not in SCORING_MODES:
+            raise ValueError(f"Unknown scoring mode {scoring_mode!r}")
+        self.scoring_mode = scoring_mode
         self.database_path = Path(database_path)
         self.database_path.parent.mkdir(parents=True, exist_ok=True)
+        self.migration_batch_size = max(1, int(migration_batch_size))
+        self._on_migration_progress = on_migration_progress
+        self._data_version = 0
+        self._data_version_lock = threading.Lock()
+        self._pool: queue.LifoQueue[sqlite3.Connection] = queue.LifoQueue(maxsize=max(1, pool_size))
+        self.write_batch_size = max(1, int(write_batch_size))
+        self._write_queue: queue.SimpleQueue = queue.SimpleQueue()
+        self._writer_lock = threading.Lock()
+        self._writer_thread: threading.Thread | None = None
+        self._writer_connection: sqlite3.Connection | None = None
+        self._writer_ident: int | None = None
+        self._other_mode_scores_checked = False
         self._initialize_schema()
 
-    def _connect(self) -> sqlite3.Connection:
-        connection = sqlite3.connect(self.database_path)
+    def _open_connection(self, read_only: bool = True) -> sqlite3.Connection:
+        connection = sqlite3.connect(self.database_path, check_same_thread=False)
         connection.row_factory = sqlite3.Row
-        connection.execute("PRAGMA foreign_keys = ON")
+        try:
+            connection.execute("SELECT exp(0)")
+        except sqlite3.OperationalError:
+            # SQLite built without its math functions; the decay triggers need exp().
+            connection.create_function("exp", 1, math.exp, deterministic=True)
+        # Only takes effect while the file is still empty, and switching to WAL
+        # writes the header; older files switch on their first retention run.
+        connection.execute("PRAGMA auto_vacuum = INCREMENTAL")
+        connection.execute("PRAGMA journal_mode = WAL")
+        for pragma in CONNECTION_PRAGMAS:
+            connection.execute(pragma)
+        if read_only:
+            connection.execute("PRAGMA query_only = ON")
         return connection
 
+    @contextmanager
+    def _connect(self) -> Iterator[sqlite3.Connection]:
+        """Check out a pooled read-only connection; end its read transaction on exit."""
+        try:
+            connection = self._pool.get_nowait()
+        except queue.Empty:
+            connection = self._open_connection()
+
+        try:
+            yield connection
+            connection.commit()
+        except BaseException:
+            connection.rollback()
+            raise
+        finally:
+            try:
+                self._pool.put_nowait(connection)
+            except queue.Full:
+                connection.close()
+
+    def _run_write(self, operation, *args, bumps_data_version: bool = True, in_transaction: bool = True):
+        """Run ``operation(connection, *args)`` on the writer thread and return its result.
+
+        Requests that queue up while a transaction is open are committed
+        together in the next one, each inside its own savepoint so a failing
+        request only rolls back itself. A write method called from inside an
+        operation is already on the writer thread and runs inline.
+        ``in_transaction=False`` runs the operation alone, outside any
+        transaction (VACUUM needs that).
+        """
+        if threading.get_ident() == self._writer_ident:
+            return operation(self._writer_connection, *args)
+
+        request = _WriteRequest(operation, args, bumps_data_version, in_transaction)
+        with self._writer_lock:
+            if self._writer_thread is None:
+                # Each writer thread drains its own queue, so a stopped or
+                # failed writer can never swallow requests meant for the next.
+                self._write_queue = queue.SimpleQueue()
+                self._writer_thread = threading.Thread(
+                    target=self._writer_loop,
+                    args=(self._write_queue,),
+                    name="storage-writer",
+                    daemon=True,
+                )
+                self._writer_thread.start()
+            self._write_queue.put(request)
+        return request.future.result()
+
+    def _writer_loop(self, requests: queue.SimpleQueue) -> None:
+        connection = None
+        batch: list[_WriteRequest] = []
+        pending = None
+        try:
+            connection = self._open_connection(read_only=False)
+            self._writer_connection = connection
+            self._writer_ident = threading.get_ident()
+            while True:
+                request = pending if pending is not None else requests.get()
+                pending = None
+                if request is _STOP_WRITER:
+                    return
+
+                batch = [request]
+                while request.in_transaction and len(batch) < self.write_batch_size:
+                    try:
+                        queued = requests.get_nowait()
+                    except queue.Empty:
+                        break
+                    if queued is _STOP_WRITER or not queued.in_transaction:
+                        pending = queued
+                        break
+                    batch.append(queued)
+                self._commit_write_batch(connection, batch)
+                batch = []
+        except BaseException as error:
+            logger.exception("Storage writer thread failed")
+            self._fail_writer(requests, [*batch, pending], error)
+        finally:
+            if self._writer_ident == threading.get_ident():
+                self._writer_connection = None
+                self._writer_ident = None
+            if connection is not None:
+                connection.close()
+
+    def _fail_writer(self, requests: queue.SimpleQueue, in_flight, error: BaseException) -> None:
+        """Detach a dead writer thread and fail every request still waiting on it."""
+        with self._writer_lock:
+            if self._writer_thread is threading.current_thread():
+                self._writer_thread = None
+        # Nothing can be queued here any more, so this drains it for good.
+        while True:
+            try:
+                in_flight.append(requests.get_nowait())
+            except queue.Empty:
+                break
+        for request in in_flight:
+            if isinstance(request, _WriteRequest) and not request.future.done():
+                request.future.set_exception(error)
+
+    def _commit_write_batch(self, connection: sqlite3.Connection, batch) -> None:
+        outcomes = []
+        try:
+            if batch[0].in_transaction:
+                connection.execute("BEGIN IMMEDIATE")
+            for request in batch:
+                outcomes.append(self._run_write_request(connection, request))
+            connection.commit()
+        except Exception as error:
+            if connection.in_transaction:
+                connection.rollback()
+            for request in batch:
+                request.future.set_exception(error)
+            return
+
+        if any(request.bumps_data_version and error is None for request, (_result, error) in zip(batch, outcomes)):
+            with self._data_version_lock:
+                self._data_version += 1
+        for request, (result, error) in zip(batch, outcomes):
+            if error is None:
+                request.future.set_result(result)
+            else:
+                request.future.set_exception(error)
+
+    @staticmethod
+    def _run_write_request(connection: sqlite3.Connection, request: _WriteRequest):
+        if not request.in_transaction:
+            try:
+                return request.operation(connection, *request.args), None
+            except Exception as error:
+                return None, error
+
+        connection.execute("SAVEPOINT write_request")
+        try:
+            result = request.operation(connection, *request.args)
+        except Exception as error:
+            connection.execute("ROLLBACK TO write_request")
+            connection.execute("RELEASE write_request")
+            return None, error
+        connection.execute("RELEASE write_request")
+        return result, None
+
+    @property
+    def data_version(self) -> int:
+        """Counter bumped after every committed write to encounter memory.
+
+        Readers snapshot it before querying, so anything derived from a read
+        can be reused for as long as the counter has not moved.
+        """
+        return self._data_version
+
+    def close(self) -> None:
+        """Stop the writer thread once queued writes finish, then close idle pooled connections."""
+        with self._writer_lock:
+            writer_thread, self._writer_thread = self._writer_thread, None
+            if writer_thread is not None:
+                self._write_queue.put(_STOP_WRITER)
+        if writer_thread is not None:
+            writer_thread.join()
+
+        while True:
+            try:
+                connection = self._pool.get_nowait()
+            except queue.Empty:
+                return
+            connection.close()
+
+    @property
+    def schema_version(self) -> int:
+        return self._migrations()[-1][0]
+
     def _initialize_schema(self) -> None:
         with self._connect() as connection:
-            for statement in SCHEMA_STATEMENTS:
-                connection.execute(statement)
-            self._migrate_scans_table(connection)
+            current_version = connection.execute("PRAGMA user_version").fetchone()[0]
+        if current_version >= self.schema_version:
+            return
+
+        # Runs before the writer thread exists, so it gets its own connection.
+        connection = self._open_connection(read_only=False)
+        try:
+            self._apply_migrations(connection, current_version)
+        finally:
+            connection.close()
+
+    def _invalidate_other_mode_scores(self) -> None:
+        """Mark profiles dirty whose stored scores another scoring mode computed.
+
+        Runs once per Storage, before the first cross-profile refresh; single
+        profiles compare their stored mode in refresh_repeat_player_scores.
+        """
+        if self._other_mode_scores_checked:
+            return
+        self._other_mode_scores_checked = True
+        with self._connect() as connection:
+            stale = connection.execute(
+                "SELECT 1 FROM profile_score_state WHERE dirty = 0 AND scoring_mode IS NOT ? LIMIT 1",
+                (self.scoring_mode,),
+            ).fetchone()
+        if stale is None:
+            return
+        self._run_write(
+            lambda connection: connection.execute(
+                "UPDATE profile_score_state SET dirty = 1 WHERE scoring_mode IS NOT ?",
+                (self.scoring_mode,),
+            ),
+            bumps_data_version=False,
+        )
+
+    def _migrations(self):
+        """Numbered schema migrations, applied in order and tracked in PRAGMA user_version.
+
+        Each step commits its own version bump, and the long-running ones
+        commit per batch, so an interrupted upgrade resumes where it stopped.
+        """
+        return (
+            (1, self._migration_0001_base_schema),
+            (2, self._migration_0002_player_encounter_stats),
+            (3, self._migration_0003_recent_encounters_index),
+            (4, self._migration_0004_encounter_epoch_ms),
+            (5, self._migration_0005_keyset_pagination),
+            (6, self._migration_0006_retention),
+            (7, self._migration_0007_summary_score_indexes),
+            (8, self._migration_0008_archived_matches),
+            (9, self._migration_0009_decayed_encounters),
+            (10, self._migration_0010_score_snapshots),
+            (11, self._migration_0011_player_groups),
+        )
+
+    def _apply_migrations(self, connection: sqlite3.Connection, current_version: int) -> None:
+        for version, migrate in self._migrations():
+            if version <= current_version:
+                continue
+            logger.info("Applying storage migration %s to %s", version, self.database_path)
+            migrate(connection)
+            connection.execute(f"PRAGMA user_version = {int(version)}")
+            connection.commit()
+
+    def _report_migration_progress(self, step: str, done: int, total: int) -> None:
+        logger.info("Storage migration %s: %s/%s rows", step, done, total)
+        if self._on_migration_progress is not None:
+            self._on_migration_progress(step, done, total)
+
+    def _migration_0001_base_schema(self, connection: sqlite3.Connection) -> None:
+        for statement in SCHEMA_STATEMENTS:
+            connection.execute(statement)
+        self._migrate_scans_table(connection)
+        self._backfill_match_participants(connection)
+        for statement in READ_PATH_INDEXES:
+            connection.execute(statement)
+
+    @staticmethod
+    def _migration_0002_player_encounter_stats(connection: sqlite3.Connection) -> None:
+        for statement in PLAYER_ENCOUNTER_STATS_SCHEMA:
+            connection.execute(statement)
+
+        connection.execute("DELETE FROM player_encounter_stats")
+        connection.execute(
+            """
+            INSERT INTO player_encounter_stats (
+                tracked_profile_id,
+                player_puuid,
+                total_encounters,
+                enemy_encounters,
+                ally_encounters,
+                wins,
+                last_played_at
+            )
+            SELECT
+                tracked_profile_id,
+                player_puuid,
+                COUNT(*),
+                SUM(relation = 'enemy'),
+                SUM(relation = 'ally'),
+                SUM(won != 0),
+                MAX(played_at)
+            FROM encounters
+            GROUP BY tracked_profile_id, player_puuid
+            """
+        )
+
+        scan_ids = defaultdict(list)
+        for row in connection.execute("SELECT id, tracked_profile_id FROM scans ORDER BY id"):
+            scan_ids[row["tracked_profile_id"]].append(int(row["id"]))
+        scan_hits = defaultdict(set)
+        for row in connection.execute(
+            """
+            SELECT s.tracked_profile_id, sp.player_puuid, sp.scan_id
+            FROM scan_participants sp
+            JOIN scans s ON s.id = sp.scan_id
+            """
+        ):
+            scan_hits[(row["tracked_profile_id"], row["player_puuid"])].add(int(row["scan_id"]))
+
+        streaks = []
+        for (tracked_profile_id, player_puuid), hit_scan_ids in scan_hits.items():
+            last_hit_id = max(hit_scan_ids)
+            earlier_scan_ids = [
+                scan_id for scan_id in reversed(scan_ids[tracked_profile_id]) if scan_id <= last_hit_id
+            ]
+            streaks.append(
+                {
+                    "tracked_profile_id": tracked_profile_id,
+                    "player_puuid": player_puuid,
+                    "last_scan_hit_id": last_hit_id,
+                    "scan_hit_streak": Storage._count_consecutive_scan_hits(earlier_scan_ids, hit_scan_ids),
+                }
+            )
+        connection.executemany(
+            """
+            INSERT INTO player_encounter_stats (
+                tracked_profile_id,
+                player_puuid,
+                last_scan_hit_id,
+                scan_hit_streak
+            )
+            VALUES (:tracked_profile_id, :player_puuid, :last_scan_hit_id, :scan_hit_streak)
+            ON CONFLICT(tracked_profile_id, player_puuid) DO UPDATE SET
+                last_scan_hit_id = excluded.last_scan_hit_id,
+                scan_hit_streak = excluded.scan_hit_streak
+            """,
+            streaks,
+        )
+
+    @staticmethod
+    def _migration_0003_recent_encounters_index(connection: sqlite3.Connection) -> None:
+        connection.execute(
+            """
+            CREATE INDEX IF NOT EXISTS idx_encounters_played
+            ON encounters (played_at, tracked_profile_id, player_puuid)
+            """
+        )
+
+    def _migration_0004_encounter_epoch_ms(self, connection: sqlite3.Connection) -> None:
+        columns = {row["name"] for row in connection.execute("PRAGMA table_info(encounters)")}
+        if "played_at_ms" not in columns:
+            connection.execute("ALTER TABLE encounters ADD COLUMN played_at_ms INTEGER")
+
+        total = connection.execute("SELECT COUNT(*) FROM encounters WHERE played_at_ms IS NULL").fetchone()[0]
+        done = 0
+        last_id = 0
+        while done < total:
+            rows = connection.execute(
+                """
+                SELECT id, played_at
+                FROM encounters
+                WHERE id > ? AND played_at_ms IS NULL
+                ORDER BY id
+                LIMIT ?
+                """,
+                (last_id, self.migration_batch_size),
+            ).fetchall()
+            if not rows:
+                break
+            connection.executemany(
+                "UPDATE encounters SET played_at_ms = ? WHERE id = ?",
+                [
+                    (self._epoch_ms(self._parse_timestamp(row["played_at"])), row["id"])
+                    for row in rows
+                ],
+            )
+            connection.commit()
+            last_id = rows[-1]["id"]
+            done += len(rows)
+            self._report_migration_progress("encounters.played_at_ms", done, total)
+
+        # The text-keyed window indexes are superseded by the epoch-ms ones.
+        connection.execute("DROP INDEX IF EXISTS idx_encounters_profile_played")
+        connection.execute("DROP INDEX IF EXISTS idx_encounters_played")
+        connection.execute(
+            """
+            CREATE INDEX IF NOT EXISTS idx_encounters_profile_played_ms
+            ON encounters (tracked_profile_id, played_at_ms, player_puuid)
+            """
+        )
+        connection.execute(
+            """
+            CREATE INDEX IF NOT EXISTS idx_encounters_played_ms
+            ON encounters (played_at_ms, tracked_profile_id, player_puuid)
+            """
+        )
+
+    @staticmethod
+    def _migration_0005_keyset_pagination(connection: sqlite3.Connection) -> None:
+        columns = {row["name"] for row in connection.execute("PRAGMA table_info(player_encounter_stats)")}
+        if "score" not in columns:
+            connection.execute("ALTER TABLE player_encounter_stats ADD COLUMN score INTEGER")
+        if "tier" not in columns:
+            connection.execute("ALTER TABLE player_encounter_stats ADD COLUMN tier TEXT")
+        for statement in SCORE_PAGINATION_SCHEMA:
+            connection.execute(statement)
+        connection.execute("DROP INDEX IF EXISTS idx_encounters_profile_player_played")
+
+    @staticmethod
+    def _migration_0006_retention(connection: sqlite3.Connection) -> None:
+        for statement in RETENTION_SCHEMA:
+            connection.execute(statement)
+
+    @staticmethod
+    def _migration_0007_summary_score_indexes(connection: sqlite3.Connection) -> None:
+        for statement in SUMMARY_SCORE_SCHEMA:
+            connection.execute(statement)
+
+    @staticmethod
+    def _migration_0008_archived_matches(connection: sqlite3.Connection) -> None:
+        for statement in ARCHIVED_MATCHES_SCHEMA:
+            connection.execute(statement)
+
+    @staticmethod
+    def _migration_0009_decayed_encounters(connection: sqlite3.Connection) -> None:
+        columns = {row["name"] for row in connection.execute("PRAGMA table_info(player_encounter_stats)")}
+        if "recent_encounters" not in columns:
+            connection.execute(
+                "ALTER TABLE player_encounter_stats ADD COLUMN recent_encounters REAL NOT NULL DEFAULT 0"
+            )
+        if "recent_encounters_at_ms" not in columns:
+            connection.execute("ALTER TABLE player_encounter_stats ADD COLUMN recent_encounters_at_ms INTEGER")
+        # Stored scores are only current for the mode that computed them.
+        state_columns = {row["name"] for row in connection.execute("PRAGMA table_info(profile_score_state)")}
+        if "scoring_mode" not in state_columns:
+            connection.execute("ALTER TABLE profile_score_state ADD COLUMN scoring_mode TEXT")
+        for statement in DECAYED_ENCOUNTERS_SCHEMA:
+            connection.execute(statement)
+
+        # Replay the recurrence over stored encounters; rows already archived
+        # by retention are at least 30 days old and weigh next to nothing.
+        counters = {}
+        for row in connection.execute(
+            """
+            SELECT tracked_profile_id, player_puuid, played_at_ms
+            FROM encounters
+            WHERE played_at_ms IS NOT NULL
+            ORDER BY tracked_profile_id, player_puuid, played_at_ms
+            """
+        ):
+            key = (row["tracked_profile_id"], row["player_puuid"])
+            value, updated_at_ms = counters.get(key, (0.0, row["played_at_ms"]))
+            counters[key] = (value * decay_factor(row["played_at_ms"] - updated_at_ms) + 1.0, row["played_at_ms"])
+        connection.executemany(
+            """
+            UPDATE player_encounter_stats
+            SET recent_encounters = ?, recent_encounters_at_ms = ?
+            WHERE tracked_profile_id = ? AND player_puuid = ?
+            """,
+            [(value, updated_at_ms, *key) for key, (value, updated_at_ms) in counters.items()],
+        )
+
+    @staticmethod
+    def _migration_0010_score_snapshots(connection: sqlite3.Connection) -> None:
+        for statement in SCORE_SNAPSHOT_SCHEMA:
+            connection.execute(statement)
+
+    @staticmethod
+    def _migration_0011_player_groups(connection: sqlite3.Connection) -> None:
+        for statement in PLAYER_GROUP_SCHEMA:
+            connection.execute(statement)
+
+        # Count the groups in stored encounters once; the triggers take over
+        # from here. Encounters already archived by retention are not counted.
+        connection.execute("DELETE FROM player_pair_stats")
+        connection.execute("DELETE FROM player_triad_stats")
+        connection.execute(
+            """
+            INSERT INTO player_pair_stats (
+                tracked_profile_id,
+                player_a,
+                player_b,
+                shared_matches,
+                enemy_matches,
+                last_played_at_ms
+            )
+            SELECT
+                x.tracked_profile_id,
+                x.player_puuid,
+                y.player_puuid,
+                COUNT(*),
+                SUM(x.relation = 'enemy'),
+                MAX(x.played_at_ms)
+            FROM encounters x
+            JOIN encounters y
+              ON y.tracked_profile_id = x.tracked_profile_id
+             AND y.match_id = x.match_id
+             AND y.relation = x.relation
+             AND y.player_puuid > x.player_puuid
+            GROUP BY x.tracked_profile_id, x.player_puuid, y.player_puuid
+            """
+        )
+        connection.execute(
+            """
+            INSERT INTO player_triad_stats (
+                tracked_profile_id,
+                player_a,
+                player_b,
+                player_c,
+                shared_matches,
+                enemy_matches,
+                last_played_at_ms
+            )
+            SELECT
+                x.tracked_profile_id,
+                x.player_puuid,
+                y.player_puuid,
+                z.player_puuid,
+                COUNT(*),
+                SUM(x.relation = 'enemy'),
+                MAX(x.played_at_ms)
+            FROM encounters x
+            JOIN encounters y
+              ON y.tracked_profile_id = x.tracked_profile_id
+             AND y.match_id = x.match_id
+             AND y.relation = x.relation
+             AND y.player_puuid > x.player_puuid
+            JOIN encounters z
+              ON z.tracked_profile_id = x.tracked_profile_id
+             AND z.match_id = x.match_id
+             AND z.relation = x.relation
+             AND z.player_puuid > y.player_puuid
+            GROUP BY x.tracked_profile_id, x.player_puuid, y.player_puuid, z.player_puuid
+            """
+        )
 
     def _migrate_scans_table(self, connection: sqlite3.Connection) -> None:
+        """Rebuild legacy scans (NOT NULL game_id/queue_type) in resumable batches.
+
+        Rows are copied into scans__new by ascending id with a commit per
+        batch, so a restart continues from the highest copied id. The final
+        drop and rename happen in one transaction.
+        """
         columns = {
             row["name"]: row
             for row in connection.execute("PRAGMA table_info(scans)").fetchall()
@@ -146,10 +1369,9 @@ class Storage:
         connection.commit()
         connection.execute("PRAGMA foreign_keys = OFF")
         try:
-            connection.execute("DROP TABLE IF EXISTS scans__new")
             connection.execute(
                 """
-                CREATE TABLE scans__new (
+                CREATE TABLE IF NOT EXISTS scans__new (
                     id INTEGER PRIMARY KEY AUTOINCREMENT,
                     tracked_profile_id INTEGER NOT NULL,
                     source TEXT NOT NULL,
@@ -164,50 +1386,107 @@ class Storage:
                 )
                 """
             )
-            connection.execute(
-                """
-                INSERT INTO scans__new (
-                    id,
-                    tracked_profile_id,
-                    source,
-                    region,
-                    game_id,
-                    queue_type,
-                    status,
-                    duration_seconds,
-                    encounter_count,
-                    created_at
+            total = connection.execute("SELECT COUNT(*) FROM scans").fetchone()[0]
+            done = connection.execute("SELECT COUNT(*) FROM scans__new").fetchone()[0]
+            while True:
+                cursor = connection.execute(
+                    """
+                    INSERT INTO scans__new (
+                        id,
+                        tracked_profile_id,
+                        source,
+                        region,
+                        game_id,
+                        queue_type,
+                        status,
+                        duration_seconds,
+                        encounter_count,
+                        created_at
+                    )
+                    SELECT
+                        id,
+                        tracked_profile_id,
+                        source,
+                        region,
+                        game_id,
+                        queue_type,
+                        status,
+                        duration_seconds,
+                        encounter_count,
+                        created_at
+                    FROM scans
+                    WHERE id > (SELECT COALESCE(MAX(id), 0) FROM scans__new)
+                    ORDER BY id
+                    LIMIT ?
+                    """,
+                    (self.migration_batch_size,),
                 )
-                SELECT
-                    id,
-                    tracked_profile_id,
-                    source,
-                    region,
-                    game_id,
-                    queue_type,
-                    status,
-                    duration_seconds,
-                    encounter_count,
-                    created_at
-                FROM scans
-                """
-            )
+                connection.commit()
+                if cursor.rowcount <= 0:
+                    break
+                done += cursor.rowcount
+                self._report_migration_progress("scans", done, total)
+
+            connection.execute("BEGIN")
             connection.execute("DROP TABLE scans")
             connection.execute("ALTER TABLE scans__new RENAME TO scans")
             connection.commit()
         finally:
             connection.execute("PRAGMA foreign_keys = ON")
 
-    def _select_id(self, table: str, **filters) -> int:
-        where_clause = " AND ".join(f"{column} = ?" for column in filters)
-        values = tuple(filters.values())
+    def _backfill_match_participants(self, connection: sqlite3.Connection) -> None:
+        rows = connection.execute(
+            """
+            SELECT md.match_id, md.payload
+            FROM match_details md
+            WHERE NOT EXISTS (
+                SELECT 1 FROM match_participants mp WHERE mp.match_id = md.match_id
+            )
+            """
+        ).fetchall()
+        for row in rows:
+            self._index_match_participants(connection, row["match_id"], json.loads(row["payload"]))
 
-        with self._connect() as connection:
-            row = connection.execute(
-                f"SELECT id FROM {table} WHERE {where_clause}",
-                values,
-            ).fetchone()
-        return int(row[0])
+    @staticmethod
+    def _index_match_participants(connection: sqlite3.Connection, match_id: str, payload: dict) -> None:
+        info = payload.get("info") or {}
+        connection.executemany(
+            """
+            INSERT INTO match_participants (
+                match_id,
+                puuid,
+                team_id,
+                win,
+                champion_id,
+                queue_id,
+                game_creation
+            )
+            VALUES (?, ?, ?, ?, ?, ?, ?)
+            ON CONFLICT(match_id, puuid) DO NOTHING
+            """,
+            [
+                (
+                    match_id,
+                    participant["puuid"],
+                    participant.get("teamId"),
+                    1 if participant.get("win") else 0,
+                    participant.get("championId"),
+                    info.get("queueId"),
+                    info.get("gameCreation"),
+                )
+                for participant in info.get("participants", [])
+                if participant.get("puuid")
+            ],
+        )
+
+    @staticmethod
+    def _select_id(connection: sqlite3.Connection, table: str, **filters) -> int | None:
+        where_clause = " AND ".join(f"{column} = ?" for column in filters)
+        row = connection.execute(
+            f"SELECT id FROM {table} WHERE {where_clause}",
+            tuple(filters.values()),
+        ).fetchone()
+        return int(row[0]) if row is not None else None
 
     def list_tables(self) -> list[str]:
         with self._connect() as connection:
@@ -222,20 +1501,23 @@ class Storage:
         return [row[0] for row in rows]
 
     def upsert_tracked_profile(self, puuid, game_name, tag_line, region) -> int:
-        with self._connect() as connection:
-            connection.execute(
-                """
-                INSERT INTO tracked_profiles (puuid, game_name, tag_line, region)
-                VALUES (?, ?, ?, ?)
-                ON CONFLICT(puuid) DO UPDATE SET
-                    game_name = excluded.game_name,
-                    tag_line = excluded.tag_line,
-                    region = excluded.region,
-                    updated_at = CURRENT_TIMESTAMP
-                """,
-                (puuid, game_name, tag_line, region),
-            )
-        return self._select_id("tracked_profiles", puuid=puuid)
+        return self._run_write(self._upsert_tracked_profile, puuid, game_name, tag_line, region)
+
+    @classmethod
+    def _upsert_tracked_profile(cls, connection: sqlite3.Connection, puuid, game_name, tag_line, region) -> int:
+        connection.execute(
+            """
+            INSERT INTO tracked_profiles (puuid, game_name, tag_line, region)
+            VALUES (?, ?, ?, ?)
+            ON CONFLICT(puuid) DO UPDATE SET
+                game_name = excluded.game_name,
+                tag_line = excluded.tag_line,
+                region = excluded.region,
+                updated_at = CURRENT_TIMESTAMP
+            """,
+            (puuid, game_name, tag_line, region),
+        )
+        return cls._select_id(connection, "tracked_profiles", puuid=puuid)
 
     def get_tracked_profile_by_riot_id(self, game_name, tag_line) -> dict | None:
         if not game_name or not tag_line:
@@ -323,21 +1605,39 @@ class Storage:
         return row is not None
 
     def upsert_player(self, puuid, game_name, tag_line, region, resolution_status) -> int:
-        with self._connect() as connection:
-            connection.execute(
-                """
-                INSERT INTO players (puuid, game_name, tag_line, region, resolution_status)
-                VALUES (?, ?, ?, ?, ?)
-                ON CONFLICT(puuid) DO UPDATE SET
-                    game_name = excluded.game_name,
-                    tag_line = excluded.tag_line,
-                    region = excluded.region,
-                    resolution_status = excluded.resolution_status,
-                    updated_at = CURRENT_TIMESTAMP
-                """,
-                (puuid, game_name, tag_line, region, resolution_status),
-            )
-        return self._select_id("players", puuid=puuid)
+        player = {
+            "puuid": puuid,
+            "game_name": game_name,
+            "tag_line": tag_line,
+            "region": region,
+            "resolution_status": resolution_status,
+        }
+
+        def write(connection):
+            self._upsert_players(connection, [player])
+            return self._select_id(connection, "players", puuid=puuid)
+
+        return self._run_write(write)
+
+    def upsert_players(self, players) -> None:
+        """Upsert many players in one transaction."""
+        self._run_write(self._upsert_players, list(players))
+
+    @staticmethod
+    def _upsert_players(connection: sqlite3.Connection, players) -> None:
+        connection.executemany(
+            """
+            INSERT INTO players (puuid, game_name, tag_line, region, resolution_status)
+            VALUES (:puuid, :game_name, :tag_line, :region, :resolution_status)
+            ON CONFLICT(puuid) DO UPDATE SET
+                game_name = excluded.game_name,
+                tag_line = excluded.tag_line,
+                region = excluded.region,
+                resolution_status = excluded.resolution_status,
+                updated_at = CURRENT_TIMESTAMP
+            """,
+            players,
+        )
 
     def insert_scan(
         self,
@@ -350,33 +1650,107 @@ class Storage:
         duration_seconds,
         encounter_count,
     ) -> int:
-        with self._connect() as connection:
-            cursor = connection.execute(
-                """
-                INSERT INTO scans (
-                    tracked_profile_id,
-                    source,
-                    region,
-                    game_id,
-                    queue_type,
-                    status,
-                    duration_seconds,
-                    encounter_count
-                )
-                VALUES (?, ?, ?, ?, ?, ?, ?, ?)
-                """,
-                (
-                    tracked_profile_id,
-                    source,
-                    region,
-                    game_id,
-                    queue_type,
-                    status,
-                    duration_seconds,
-                    encounter_count,
-                ),
+        return self._run_write(
+            self._insert_scan,
+            tracked_profile_id,
+            source,
+            region,
+            game_id,
+            queue_type,
+            status,
+            duration_seconds,
+            encounter_count,
+        )
+
+    def record_scan(
+        self,
+        tracked_profile_id,
+        source,
+        region,
+        game_id,
+        queue_type,
+        status,
+        duration_seconds,
+        encounter_count,
+        players=(),
+        participants=(),
+        encounters=(),
+    ) -> int:
+        """Persist a scan with its players, participants and encounters in one transaction.
+
+        participants and encounters omit scan_id (and encounters omit
+        tracked_profile_id); both are filled in from the new scan row.
+        """
+        players = list(players)
+        participants = list(participants)
+        encounters = list(encounters)
+
+        def write(connection):
+            scan_id = self._insert_scan(
+                connection,
+                tracked_profile_id,
+                source,
+                region,
+                game_id,
+                queue_type,
+                status,
+                duration_seconds,
+                encounter_count,
+            )
+            self._upsert_players(connection, players)
+            self._insert_scan_participants(
+                connection,
+                [{**participant, "scan_id": scan_id} for participant in participants],
+            )
+            self._insert_encounters(
+                connection,
+                [
+                    {**encounter, "tracked_profile_id": tracked_profile_id, "scan_id": scan_id}
+                    for encounter in encounters
+                ],
             )
-            return int(cursor.lastrowid)
+            return scan_id
+
+        return self._run_write(write)
+
+    @staticmethod
+    def _insert_scan(
+        connection: sqlite3.Connection,
+        tracked_profile_id,
+        source,
+        region,
+        game_id,
+        queue_type,
+        status,
+        duration_seconds,
+        encounter_count,
+    ) -> int:
+        cursor = connection.execute(
+            """
+            INSERT INTO scans (
+                tracked_profile_id,
+                source,
+                region,
+                game_id,
+                queue_type,
+                status,
+                duration_seconds,
+                encounter_count
+            )
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+            """,
+            (
+                tracked_profile_id,
+                source,
+                region,
+                game_id,
+                queue_type,
+                status,
+                duration_seconds,
+                encounter_count,
+            ),
+        )
+        return int(cursor.lastrowid)
 
     def insert_scan_participant(
         self,
@@ -386,28 +1760,42 @@ class Storage:
         champion_id=None,
         team_id=None,
     ) -> int:
-        with self._connect() as connection:
-            connection.execute(
-                """
-                INSERT INTO scan_participants (
-                    scan_id,
-                    player_puuid,
-                    relation,
-                    champion_id,
-                    team_id
-                )
-                VALUES (?, ?, ?, ?, ?)
-                ON CONFLICT(scan_id, player_puuid) DO UPDATE SET
-                    relation = excluded.relation,
-                    champion_id = excluded.champion_id,
-                    team_id = excluded.team_id
-                """,
-                (scan_id, player_puuid, relation, champion_id, team_id),
+        participant = {
+            "scan_id": scan_id,
+            "player_puuid": player_puuid,
+            "relation": relation,
+            "champion_id": champion_id,
+            "team_id": team_id,
+        }
+
+        def write(connection):
+            self._insert_scan_participants(connection, [participant])
+            return self._select_id(connection, "scan_participants", scan_id=scan_id, player_puuid=player_puuid)
+
+        return self._run_write(write)
+
+    def insert_scan_participants(self, participants) -> None:
+        """Upsert many scan participants in one transaction."""
+        self._run_write(self._insert_scan_participants, list(participants))
+
+    @staticmethod
+    def _insert_scan_participants(connection: sqlite3.Connection, participants) -> None:
+        connection.executemany(
+            """
+            INSERT INTO scan_participants (
+                scan_id,
+                player_puuid,
+                relation,
+                champion_id,
+                team_id
             )
-        return self._select_id(
-            "scan_participants",
-            scan_id=scan_id,
-            player_puuid=player_puuid,
+            VALUES (:scan_id, :player_puuid, :relation, :champion_id, :team_id)
+            ON CONFLICT(scan_id, player_puuid) DO UPDATE SET
+                relation = excluded.relation,
+                champion_id = excluded.champion_id,
+                team_id = excluded.team_id
+            """,
+            participants,
         )
 
     def insert_encounter(
@@ -421,53 +1809,105 @@ class Storage:
         champion_id,
         queue_id,
         won,
-    ) -> int:
-        with self._connect() as connection:
-            connection.execute(
-                """
-                INSERT INTO encounters (
-                    tracked_profile_id,
-                    player_puuid,
-                    scan_id,
-                    match_id,
-                    played_at,
-                    relation,
-                    champion_id,
-                    queue_id,
-                    won
-                )
-                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
-                ON CONFLICT(tracked_profile_id, player_puuid, match_id) DO UPDATE SET
-                    scan_id = excluded.scan_id,
-                    played_at = excluded.played_at,
-                    relation = excluded.relation,
-                    champion_id = excluded.champion_id,
-                    queue_id = excluded.queue_id,
-                    won = excluded.won
-                """,
-                (
-                    tracked_profile_id,
-                    player_puuid,
-                    scan_id,
-                    match_id,
-                    played_at,
-                    relation,
-                    champion_id,
-                    queue_id,
-                    won,
-                ),
+        played_at_ms=None,
+    ) -> int | None:
+        """Upsert one encounter and return its id, or None if it predates the retention watermark."""
+        encounter = {
+            "tracked_profile_id": tracked_profile_id,
+            "player_puuid": player_puuid,
+            "scan_id": scan_id,
+            "match_id": match_id,
+            "played_at": played_at,
+            "played_at_ms": played_at_ms,
+            "relation": relation,
+            "champion_id": champion_id,
+            "queue_id": queue_id,
+            "won": won,
+        }
+
+        def write(connection):
+            self._insert_encounters(connection, [encounter])
+            return self._select_id(
+                connection,
+                "encounters",
+                tracked_profile_id=tracked_profile_id,
+                player_puuid=player_puuid,
+                match_id=match_id,
             )
-        return self._select_id(
-            "encounters",
-            tracked_profile_id=tracked_profile_id,
-            player_puuid=player_puuid,
-            match_id=match_id,
+
+        return self._run_write(write)
+
+    def insert_encounters(self, encounters) -> None:
+        """Upsert many encounters in one transaction."""
+        self._run_write(self._insert_encounters, list(encounters))
+
+    @staticmethod
+    def _insert_encounters(connection: sqlite3.Connection, encounters) -> None:
+        """Upsert encounter rows, skipping ones retention already counted.
+
+        An encounter in an archived match is skipped only when its player has
+        lifetime counts for the profile; a player first met in that match
+        cannot have been counted in it, so the row is stored like any other.
+        """
+        encounters = [
+            {
+                **encounter,
+                "played_at_ms": encounter.get("played_at_ms")
+                or Storage._epoch_ms(Storage._parse_timestamp(encounter["played_at"])),
+            }
+            for encounter in encounters
+        ]
+        connection.executemany(
+            """
+            INSERT INTO encounters (
+                tracked_profile_id,
+                player_puuid,
+                scan_id,
+                match_id,
+                played_at,
+                played_at_ms,
+                relation,
+                champion_id,
+                queue_id,
+                won
+            )
+            SELECT
+                :tracked_profile_id,
+                :player_puuid,
+                :scan_id,
+                :match_id,
+                :played_at,
+                :played_at_ms,
+                :relation,
+                :champion_id,
+                :queue_id,
+                :won
+            WHERE NOT EXISTS (
+                SELECT 1
+                FROM archived_matches am
+                JOIN player_encounter_stats st
+                  ON st.tracked_profile_id = am.tracked_profile_id
+                 AND st.player_puuid = :player_puuid
+                WHERE am.tracked_profile_id = :tracked_profile_id
+                  AND am.match_id = :match_id
+                  AND st.total_encounters > 0
+            )
+            ON CONFLICT(tracked_profile_id, player_puuid, match_id) DO UPDATE SET
+                scan_id = excluded.scan_id,
+                played_at = excluded.played_at,
+                played_at_ms = excluded.played_at_ms,
+                relation = excluded.relation,
+                champion_id = excluded.champion_id,
+                queue_id = excluded.queue_id,
+                won = excluded.won
+            """,
+            encounters,
         )
 
     def upsert_watch_note(self, tracked_profile_id: int, player_puuid: str, note: str | None) -> str | None:
         normalized_note = (note or '').strip()
 
-        with self._connect() as connection:
+        def write(connection):
             if normalized_note:
                 connection.execute(
                     """
@@ -488,180 +1928,511 @@ class Storage:
                     (tracked_profile_id, player_puuid),
                 )
 
+        self._run_write(write)
         return normalized_note or None
 
     def get_watch_note(self, tracked_profile_id: int, player_puuid: str) -> str | None:
         with self._connect() as connection:
             row = connection.execute(
                 """
-                SELECT note
-                FROM watch_notes
+                SELECT note
+                FROM watch_notes
+                WHERE tracked_profile_id = ? AND player_puuid = ?
+                """,
+                (tracked_profile_id, player_puuid),
+            ).fetchone()
+        return row["note"] if row is not None else None
+
+    def load_recent_scans(self, tracked_profile_id: int, limit: int = 5) -> list[dict]:
+        return self._load_scans(tracked_profile_id, limit)
+
+    def page_scans(self, tracked_profile_id: int, limit: int = 20, cursor: str | None = None) -> dict:
+        """Return one page of a profile's scans, newest first."""
+        before_id = decode_cursor(cursor, (int,))[0] if cursor else None
+        scans = self._load_scans(tracked_profile_id, limit + 1, before_id)
+        return {
+            "items": scans[:limit],
+            "nextCursor": encode_cursor([scans[limit - 1]["id"]]) if len(scans) > limit else None,
+        }
+
+    def _load_scans(self, tracked_profile_id: int, limit: int, before_id: int | None = None) -> list[dict]:
+        cursor_filter = " AND id < ?" if before_id is not None else ""
+        params = [tracked_profile_id, *([before_id] if before_id is not None else []), limit]
+        with self._connect() as connection:
+            rows = connection.execute(
+                f"""
+                SELECT
+                    id,
+                    source,
+                    region,
+                    game_id,
+                    queue_type,
+                    status,
+                    duration_seconds,
+                    encounter_count,
+                    created_at
+                FROM scans
+                WHERE tracked_profile_id = ?{cursor_filter}
+                ORDER BY id DESC
+                LIMIT ?
+                """,
+                params,
+            ).fetchall()
+
+        return [
+            {
+                "id": int(row["id"]),
+                "source": row["source"],
+                "region": row["region"],
+                "gameId": row["game_id"],
+                "queueType": row["queue_type"],
+                "status": row["status"],
+                "durationSeconds": row["duration_seconds"],
+                "encounterCount": row["encounter_count"],
+                "createdAt": row["created_at"],
+            }
+            for row in rows
+        ]
+
+    def page_player_encounters(
+        self,
+        tracked_profile_id: int,
+        player_puuid: str,
+        limit: int = 20,
+        cursor: str | None = None,
+    ) -> dict:
+        """Return one page of a player's encounters with a profile, most recent first."""
+        cursor_filter = ""
+        params: list = [tracked_profile_id, player_puuid]
+        if cursor:
+            played_at_ms, encounter_id = decode_cursor(cursor, (int, int))
+            cursor_filter = " AND (played_at_ms < ? OR (played_at_ms = ? AND id < ?))"
+            params.extend([played_at_ms, played_at_ms, encounter_id])
+
+        with self._connect() as connection:
+            rows = connection.execute(
+                f"""
+                SELECT id, scan_id, match_id, played_at, played_at_ms, relation, champion_id, queue_id, won
+                FROM encounters
+                WHERE tracked_profile_id = ?
+                  AND player_puuid = ?{cursor_filter}
+                ORDER BY played_at_ms DESC, id DESC
+                LIMIT ?
+                """,
+                [*params, limit + 1],
+            ).fetchall()
+
+        items = [
+            {
+                "matchId": row["match_id"],
+                "scanId": row["scan_id"],
+                "playedAt": row["played_at"],
+                "relation": row["relation"],
+                "championId": row["champion_id"],
+                "queueId": row["queue_id"],
+                "won": bool(row["won"]),
+            }
+            for row in rows[:limit]
+        ]
+        next_cursor = None
+        if len(rows) > limit:
+            last_row = rows[limit - 1]
+            next_cursor = encode_cursor([last_row["played_at_ms"], last_row["id"]])
+        return {"items": items, "nextCursor": next_cursor}
+
+    def refresh_repeat_player_scores(self, tracked_profile_id: int, force: bool = False) -> bool:
+        """Recompute stored scores for a profile if a write, the clock or the scoring mode made them stale."""
+        now_ms = self._epoch_ms(datetime.now(timezone.utc))
+        with self._connect() as connection:
+            state = connection.execute(
+                """
+                SELECT dirty, scored_at_ms, scoring_mode
+                FROM profile_score_state
+                WHERE tracked_profile_id = ?
+                """,
+                (tracked_profile_id,),
+            ).fetchone()
+            if (
+                not force
+                and state is not None
+                and not state["dirty"]
+                and state["scoring_mode"] == self.scoring_mode
+                and state["scored_at_ms"] is not None
+                and now_ms - state["scored_at_ms"] < SCORE_REFRESH_MS
+            ):
+                return False
+
+        self._rescore_profiles([tracked_profile_id], now_ms)
+        return True
+
+    def refresh_stale_repeat_player_scores(self) -> list[int]:
+        """Recompute stored scores for every stale profile and return their ids."""
+        self._invalidate_other_mode_scores()
+        now_ms = self._epoch_ms(datetime.now(timezone.utc))
+        with self._connect() as connection:
+            tracked_profile_ids = [
+                int(row["tracked_profile_id"])
+                for row in connection.execute(
+                    """
+                    SELECT tracked_profile_id
+                    FROM profile_score_state
+                    WHERE dirty = 1 OR scored_at_ms IS NULL OR scored_at_ms <= ?
+                    """,
+                    (now_ms - SCORE_REFRESH_MS,),
+                )
+            ]
+        if tracked_profile_ids:
+            self._rescore_profiles(tracked_profile_ids, now_ms)
+        return tracked_profile_ids
+
+    def _rescore_profiles(self, tracked_profile_ids, now_ms: int) -> None:
+        """Score every repeat player of the given profiles with a fixed number of queries.
+
+        The dirty flags are cleared before scoring, so a write that lands
+        while scores are being computed marks its profile dirty again.
+        """
+        # Stored scores are derived data: refreshing them leaves data_version alone.
+        self._run_write(
+            lambda connection: connection.executemany(
+                """
+                INSERT INTO profile_score_state (tracked_profile_id, dirty, scored_at_ms, scoring_mode)
+                VALUES (?, 0, ?, ?)
+                ON CONFLICT(tracked_profile_id) DO UPDATE SET
+                    dirty = 0,
+                    scored_at_ms = excluded.scored_at_ms,
+                    scoring_mode = excluded.scoring_mode
+                """,
+                [(tracked_profile_id, now_ms, self.scoring_mode) for tracked_profile_id in tracked_profile_ids],
+            ),
+            bumps_data_version=False,
+        )
+
+        last_30d_ms, last_7d_ms = self._window_cutoffs_ms()
+        placeholders = ", ".join("?" for _ in tracked_profile_ids)
+        with self._connect() as connection:
+            stats_rows = connection.execute(
+                f"""
+                SELECT
+                    tracked_profile_id,
+                    player_puuid,
+                    total_encounters,
+                    enemy_encounters,
+                    ally_encounters,
+                    last_scan_hit_id,
+                    scan_hit_streak,
+                    recent_encounters,
+                    recent_encounters_at_ms
+                FROM player_encounter_stats
+                WHERE tracked_profile_id IN ({placeholders})
+                  AND total_encounters > 0
+                """,
+                tracked_profile_ids,
+            ).fetchall()
+            latest_scan_rows = connection.execute(
+                f"""
+                SELECT tracked_profile_id, MAX(id) AS latest_scan_id
+                FROM scans
+                WHERE tracked_profile_id IN ({placeholders})
+                GROUP BY tracked_profile_id
+                """,
+                tracked_profile_ids,
+            ).fetchall()
+            window_rows = []
+            if self.scoring_mode == "windowed":
+                window_rows = connection.execute(
+                    f"""
+                    SELECT
+                        tracked_profile_id,
+                        player_puuid,
+                        COUNT(*) AS encounters_last_30d,
+                        COUNT(DISTINCT played_at_ms / {DAY_MS}) AS distinct_days_last_30d,
+                        SUM(played_at_ms >= ?) AS encounters_last_7d
+                    FROM encounters
+                    WHERE tracked_profile_id IN ({placeholders})
+                      AND played_at_ms >= ?
+                    GROUP BY tracked_profile_id, player_puuid
+                    """,
+                    [last_7d_ms, *tracked_profile_ids, last_30d_ms],
+                ).fetchall()
+
+        latest_scan_ids = {row["tracked_profile_id"]: row["latest_scan_id"] for row in latest_scan_rows}
+        windows = {(row["tracked_profile_id"], row["player_puuid"]): row for row in window_rows}
+        risk = score_repeat_players(
+            self._stats_columns(stats_rows, windows, latest_scan_ids, now_ms),
+            self.scoring_mode,
+        )
+        scores = [
+            (score, tier, row["tracked_profile_id"], row["player_puuid"])
+            for score, tier, row in zip(risk["score"], risk["tier"], stats_rows)
+        ]
+        self._run_write(
+            lambda connection: connection.executemany(
+                """
+                UPDATE player_encounter_stats
+                SET score = ?, tier = ?
                 WHERE tracked_profile_id = ? AND player_puuid = ?
                 """,
-                (tracked_profile_id, player_puuid),
-            ).fetchone()
-        return row["note"] if row is not None else None
+                scores,
+            ),
+            bumps_data_version=False,
+        )
+
+    def page_repeat_players(
+        self,
+        tracked_profile_id: int,
+        limit: int = 20,
+        cursor: str | None = None,
+        explain: bool = False,
+    ) -> dict:
+        """Return one page of repeat players ordered by stored score, highest first.
+
+        Reasons are built for the top-ranked players on the first page, or for
+        every player on the page with ``explain``.
+        """
+        self.refresh_repeat_player_scores(tracked_profile_id)
+
+        cursor_filter = ""
+        params: list = [tracked_profile_id]
+        if cursor:
+            score, player_puuid = decode_cursor(cursor, ((int, float), str))
+            cursor_filter = " AND (score < ? OR (score = ? AND player_puuid > ?))"
+            params.extend([score, score, player_puuid])
 
-    def load_recent_scans(self, tracked_profile_id: int, limit: int = 5) -> list[dict]:
         with self._connect() as connection:
             rows = connection.execute(
-                """
-                SELECT
-                    id,
-                    source,
-                    region,
-                    game_id,
-                    queue_type,
-                    status,
-                    duration_seconds,
-                    encounter_count,
-                    created_at
-                FROM scans
+                f"""
+                SELECT player_puuid, score
+                FROM player_encounter_stats
                 WHERE tracked_profile_id = ?
-                ORDER BY id DESC
+                  AND total_encounters > 0{cursor_filter}
+                ORDER BY score DESC, player_puuid
                 LIMIT ?
                 """,
-                (tracked_profile_id, limit),
+                [*params, limit + 1],
             ).fetchall()
 
-        return [
+        page_rows = rows[:limit]
+        players = {
+            player["puuid"]: player
+            for player in self.load_repeat_players(tracked_profile_id, [row["player_puuid"] for row in page_rows])
+        }
+        items = [
             {
-                "id": int(row["id"]),
-                "source": row["source"],
-                "region": row["region"],
-                "gameId": row["game_id"],
-                "queueType": row["queue_type"],
-                "status": row["status"],
-                "durationSeconds": row["duration_seconds"],
-                "encounterCount": row["encounter_count"],
-                "createdAt": row["created_at"],
+                **_summarize_repeat_player(players[row["player_puuid"]], self.scoring_mode),
+                "wins": players[row["player_puuid"]]["wins"],
+                "latestPlayedAt": players[row["player_puuid"]]["latestPlayedAt"],
             }
-            for row in rows
+            for row in page_rows
+            if row["player_puuid"] in players
         ]
+        if explain or not cursor:
+            explain_ranked_players(
+                items,
+                [players[item["puuid"]]["stats"] for item in items],
+                explain,
+                self.scoring_mode,
+            )
+        next_cursor = None
+        if len(rows) > limit:
+            last_row = page_rows[-1]
+            next_cursor = encode_cursor([last_row["score"], last_row["player_puuid"]])
+        return {"items": items, "nextCursor": next_cursor}
+
+    def load_player_groups(self, tracked_profile_id: int, limit: int = 10) -> dict:
+        """Return the pairs and triads of players who most often share a side, with combined risk.
+
+        Groups come ranked by shared matches from the trigger-maintained
+        co-occurrence tables, so the cost depends on ``limit``, not on how many
+        players the profile has met.
+        """
+        self.refresh_repeat_player_scores(tracked_profile_id)
+
+        with self._connect() as connection:
+            group_rows = {
+                "pairs": connection.execute(
+                    """
+                    SELECT player_a, player_b, shared_matches, enemy_matches, last_played_at_ms
+                    FROM player_pair_stats
+                    WHERE tracked_profile_id = ? AND shared_matches >= ?
+                    ORDER BY shared_matches DESC, last_played_at_ms DESC
+                    LIMIT ?
+                    """,
+                    (tracked_profile_id, MIN_GROUP_SHARED_MATCHES, limit),
+                ).fetchall(),
+                "triads": connection.execute(
+                    """
+                    SELECT player_a, player_b, player_c, shared_matches, enemy_matches, last_played_at_ms
+                    FROM player_triad_stats
+                    WHERE tracked_profile_id = ? AND shared_matches >= ?
+                    ORDER BY shared_matches DESC, last_played_at_ms DESC
+                    LIMIT ?
+                    """,
+                    (tracked_profile_id, MIN_GROUP_SHARED_MATCHES, limit),
+                ).fetchall(),
+            }
+            member_puuids = {
+                row[column]
+                for rows in group_rows.values()
+                for row in rows
+                for column in row.keys()
+                if column.startswith("player_")
+            }
+            if not member_puuids:
+                return {"pairs": [], "triads": []}
+
+            player_filter, player_params = self._player_filter(sorted(member_puuids))
+            members = {
+                row["player_puuid"]: {
+                    "puuid": row["player_puuid"],
+                    "gameName": row["game_name"],
+                    "tagLine": row["tag_line"],
+                    "score": int(row["score"] or 0),
+                }
+                for row in connection.execute(
+                    f"""
+                    SELECT st.player_puuid, st.score, p.game_name, p.tag_line
+                    FROM player_encounter_stats st
+                    JOIN players p ON p.puuid = st.player_puuid
+                    WHERE st.tracked_profile_id = ?{player_filter.format(column="st.player_puuid")}
+                    """,
+                    [tracked_profile_id, *player_params],
+                )
+            }
+
+        groups = {}
+        for kind, rows in group_rows.items():
+            groups[kind] = []
+            for row in rows:
+                players = [members[row[column]] for column in row.keys() if column.startswith("player_")]
+                groups[kind].append({
+                    "players": players,
+                    "sharedMatches": int(row["shared_matches"]),
+                    "enemyMatches": int(row["enemy_matches"]),
+                    "lastPlayedAt": datetime.fromtimestamp(
+                        (row["last_played_at_ms"] or 0) / 1000,
+                        tz=timezone.utc,
+                    ).isoformat(),
+                    "risk": score_player_group(
+                        [player["score"] for player in players],
+                        row["shared_matches"],
+                        row["enemy_matches"],
+                    ),
+                })
+        return groups
+
+    def explain_repeat_player(self, tracked_profile_id: int, player_puuid: str) -> dict | None:
+        """Return one repeat player's score with its reasons and scoring inputs."""
+        players = self.load_repeat_players(tracked_profile_id, [player_puuid])
+        if not players:
+            return None
+        player = players[0]
+        return {
+            **_summarize_repeat_player(player, self.scoring_mode),
+            "risk": score_repeat_player(player["stats"], mode=self.scoring_mode),
+            "scoringMode": self.scoring_mode,
+            "stats": player["stats"],
+            "wins": player["wins"],
+            "latestPlayedAt": player["latestPlayedAt"],
+        }
+
+    def load_repeat_players(self, tracked_profile_id, player_puuids=None, limit=None) -> list[dict]:
+        """Load repeat players for a profile, most encounters first.
 
-    def load_repeat_players(self, tracked_profile_id, player_puuids=None) -> list[dict]:
+        With ``limit`` only the top rows are selected in SQL, and the window
+        and note lookups are restricted to those players.
+        """
         if player_puuids is not None and not player_puuids:
             return []
 
-        encounter_filter = ""
-        params = [tracked_profile_id]
-        if player_puuids:
-            placeholders = ", ".join("?" for _ in player_puuids)
-            encounter_filter = f" AND e.player_puuid IN ({placeholders})"
-            params.extend(player_puuids)
+        player_filter, player_params = self._player_filter(player_puuids)
+        limit_clause = ""
+        if limit is not None:
+            limit_clause = f"""
+                ORDER BY st.total_encounters DESC, lower(p.game_name), lower(p.tag_line)
+                LIMIT {int(limit)}"""
+
+        last_30d_ms, last_7d_ms = self._window_cutoffs_ms()
 
         with self._connect() as connection:
-            encounter_rows = connection.execute(
+            stats_rows = connection.execute(
                 f"""
                 SELECT
-                    e.player_puuid,
-                    e.match_id,
-                    e.played_at,
-                    e.relation,
-                    e.champion_id,
-                    e.queue_id,
-                    e.won,
+                    st.player_puuid,
+                    st.total_encounters,
+                    st.enemy_encounters,
+                    st.ally_encounters,
+                    st.wins,
+                    st.last_played_at,
+                    st.last_scan_hit_id,
+                    st.scan_hit_streak,
+                    st.recent_encounters,
+                    st.recent_encounters_at_ms,
                     p.game_name,
                     p.tag_line,
                     p.region,
                     p.resolution_status
-                FROM encounters e
-                JOIN players p ON p.puuid = e.player_puuid
-                WHERE e.tracked_profile_id = ?{encounter_filter}
-                ORDER BY e.player_puuid, e.played_at DESC, e.id DESC
+                FROM player_encounter_stats st
+                JOIN players p ON p.puuid = st.player_puuid
+                WHERE st.tracked_profile_id = ?
+                  AND st.total_encounters > 0{player_filter.format(column="st.player_puuid")}{limit_clause}
                 """,
-                params,
+                [tracked_profile_id, *player_params],
             ).fetchall()
 
-            if not encounter_rows:
+            if not stats_rows:
                 return []
+            if limit is not None:
+                player_filter, player_params = self._player_filter([row["player_puuid"] for row in stats_rows])
 
-            scan_rows = connection.execute(
+            latest_scan_row = connection.execute(
                 """
-                SELECT id
+                SELECT MAX(id) AS latest_scan_id
                 FROM scans
                 WHERE tracked_profile_id = ?
-                ORDER BY id DESC
                 """,
                 (tracked_profile_id,),
-            ).fetchall()
-            ordered_scan_ids = [int(row["id"]) for row in scan_rows]
-
-            scan_hit_filter = ""
-            scan_hit_params = [tracked_profile_id]
-            if player_puuids:
-                placeholders = ", ".join("?" for _ in player_puuids)
-                scan_hit_filter = f" AND sp.player_puuid IN ({placeholders})"
-                scan_hit_params.extend(player_puuids)
-
-            hit_rows = connection.execute(
-                f"""
-                SELECT DISTINCT sp.player_puuid, sp.scan_id
-                FROM scan_participants sp
-                JOIN scans s ON s.id = sp.scan_id
-                WHERE s.tracked_profile_id = ?{scan_hit_filter}
-                ORDER BY sp.scan_id DESC
-                """,
-                scan_hit_params,
-            ).fetchall()
+            ).fetchone()
 
-            note_filter = ""
-            note_params = [tracked_profile_id]
-            if player_puuids:
-                placeholders = ", ".join("?" for _ in player_puuids)
-                note_filter = f" AND player_puuid IN ({placeholders})"
-                note_params.extend(player_puuids)
+            window_rows = []
+            if self.scoring_mode == "windowed":
+                window_rows = connection.execute(
+                    f"""
+                    SELECT
+                        player_puuid,
+                        COUNT(*) AS encounters_last_30d,
+                        COUNT(DISTINCT played_at_ms / {DAY_MS}) AS distinct_days_last_30d,
+                        SUM(played_at_ms >= ?) AS encounters_last_7d
+                    FROM encounters
+                    WHERE tracked_profile_id = ?
+                      AND played_at_ms >= ?{player_filter.format(column="player_puuid")}
+                    GROUP BY player_puuid
+                    """,
+                    [last_7d_ms, tracked_profile_id, last_30d_ms, *player_params],
+                ).fetchall()
 
             note_rows = connection.execute(
                 f"""
                 SELECT player_puuid, note
                 FROM watch_notes
-                WHERE tracked_profile_id = ?{note_filter}
+                WHERE tracked_profile_id = ?{player_filter.format(column="player_puuid")}
                 """,
-                note_params,
+                [tracked_profile_id, *player_params],
             ).fetchall()
 
-        players: dict[str, dict] = {}
-        for row in encounter_rows:
-            player = players.setdefault(
-                row["player_puuid"],
-                {
-                    "puuid": row["player_puuid"],
-                    "gameName": row["game_name"],
-                    "tagLine": row["tag_line"],
-                    "region": row["region"],
-                    "resolutionStatus": row["resolution_status"],
-                    "encounters": [],
-                    "note": None,
-                },
-            )
-            player["encounters"].append(
-                {
-                    "matchId": row["match_id"],
-                    "playedAt": row["played_at"],
-                    "relation": row["relation"],
-                    "championId": row["champion_id"],
-                    "queueId": row["queue_id"],
-                    "won": bool(row["won"]),
-                }
-            )
-
-        scan_hits = defaultdict(set)
-        for row in hit_rows:
-            scan_hits[row["player_puuid"]].add(int(row["scan_id"]))
-
+        windows = {row["player_puuid"]: row for row in window_rows}
         notes = {row["player_puuid"]: row["note"] for row in note_rows}
-        for player in players.values():
-            player["note"] = notes.get(player["puuid"])
-
-        repeat_players = []
-        for player in players.values():
-            player["stats"] = self._build_repeat_player_stats(
-                player["encounters"],
-                ordered_scan_ids,
-                scan_hits.get(player["puuid"], set()),
+        latest_scan_id = latest_scan_row["latest_scan_id"]
+
+        repeat_players = [
+            self._repeat_player_from_row(
+                row,
+                windows.get(row["player_puuid"]),
+                latest_scan_id,
+                notes.get(row["player_puuid"]),
+                windowed=self.scoring_mode == "windowed",
             )
-            repeat_players.append(player)
+            for row in stats_rows
+        ]
 
         repeat_players.sort(
             key=lambda player: (
@@ -672,7 +2443,12 @@ class Storage:
         )
         return repeat_players
 
-    def load_memory_overview(self, tracked_profile_id: int, repeat_player_limit: int = 5) -> dict | None:
+    def load_memory_overview(
+        self,
+        tracked_profile_id: int,
+        repeat_player_limit: int = 5,
+        explain: bool = False,
+    ) -> dict | None:
         tracked_profile = self.get_tracked_profile(tracked_profile_id)
         if tracked_profile is None:
             return None
@@ -698,15 +2474,21 @@ class Storage:
                 (tracked_profile_id,),
             ).fetchone()
 
-        repeat_players = self.load_repeat_players(tracked_profile_id)[:repeat_player_limit]
+        repeat_players = self.load_repeat_players(tracked_profile_id, limit=repeat_player_limit)
 
         top_repeat_players = [
             {
-                **_summarize_repeat_player(player),
-                "latestPlayedAt": player["encounters"][0]["playedAt"] if player["encounters"] else None,
+                **_summarize_repeat_player(player, self.scoring_mode),
+                "latestPlayedAt": player["latestPlayedAt"],
             }
             for player in repeat_players
         ]
+        explain_ranked_players(
+            top_repeat_players,
+            [player["stats"] for player in repeat_players],
+            explain,
+            self.scoring_mode,
+        )
 
         return {
             "trackedProfile": tracked_profile,
@@ -720,15 +2502,23 @@ class Storage:
             "topRepeatPlayers": top_repeat_players,
         }
 
-    def get_memory_summary(self) -> dict:
+    def get_memory_summary(self, top_player_limit: int = 6, explain: bool = False) -> dict:
+        """Summarize encounter memory across every tracked profile.
+
+        Stale profiles are rescored first; after that the top players and the
+        tier counts come from stored scores, so only the top candidates are
+        scored again here.
+        """
+        self.refresh_stale_repeat_player_scores()
+        last_30d_ms, last_7d_ms = self._window_cutoffs_ms()
+
         with self._connect() as connection:
-            tracked_profile_rows = connection.execute(
+            tracked_profile_count_row = connection.execute(
                 """
-                SELECT id, game_name, tag_line
+                SELECT COUNT(*) AS tracked_profile_count
                 FROM tracked_profiles
-                ORDER BY updated_at DESC, id DESC
                 """
-            ).fetchall()
+            ).fetchone()
             aggregate_row = connection.execute(
                 """
                 SELECT
@@ -763,34 +2553,151 @@ class Storage:
                 LIMIT 6
                 """
             ).fetchall()
+            # A plain COUNT in SQLite; nothing is loaded or scored per player.
+            repeat_player_count_row = connection.execute(
+                """
+                SELECT COUNT(*) AS repeat_player_count
+                FROM player_encounter_stats
+                WHERE total_encounters > 0
+                """
+            ).fetchone()
+            high_attention_count_row = connection.execute(
+                """
+                SELECT COUNT(*) AS high_attention_count
+                FROM player_encounter_stats
+                WHERE tier = 'high-attention' AND total_encounters > 0
+                """
+            ).fetchone()
+            # The best stored scores in the final ranking's order, plus a few
+            # spares in case a score moved since it was stored.
+            candidate_rows = connection.execute(
+                """
+                SELECT
+                    tracked_profile_id,
+                    tp.game_name AS tracked_game_name,
+                    tp.tag_line AS tracked_tag_line,
+                    player_puuid,
+                    total_encounters,
+                    enemy_encounters,
+                    ally_encounters,
+                    wins,
+                    last_played_at,
+                    last_scan_hit_id,
+                    scan_hit_streak,
+                    recent_encounters,
+                    recent_encounters_at_ms,
+                    p.game_name,
+                    p.tag_line,
+                    p.region,
+                    p.resolution_status
+                FROM player_encounter_stats
+                JOIN players p ON p.puuid = player_puuid
+                JOIN tracked_profiles tp ON tp.id = tracked_profile_id
+                WHERE total_encounters > 0
+                ORDER BY
+                    score DESC,
+                    total_encounters DESC,
+                    lower(p.game_name),
+                    lower(p.tag_line),
+                    tracked_profile_id
+                LIMIT ?
+                """,
+                (top_player_limit + SUMMARY_CANDIDATE_OVERFETCH if top_player_limit > 0 else 0,),
+            ).fetchall()
 
-        combined_repeat_players = []
-        for row in tracked_profile_rows:
-            tracked_profile_id = int(row["id"])
-            tracked_profile_name = f"{row['game_name']}#{row['tag_line']}"
-            for player in self.load_repeat_players(tracked_profile_id):
-                combined_repeat_players.append(
-                    {
-                        "trackedProfileId": tracked_profile_id,
-                        "trackedProfileName": tracked_profile_name,
-                        **_summarize_repeat_player(player),
-                    }
-                )
+            latest_scan_ids: dict = {}
+            windows: dict = {}
+            if candidate_rows and top_player_limit > 0:
+                profile_ids = sorted({row["tracked_profile_id"] for row in candidate_rows})
+                profile_placeholders = ", ".join("?" for _ in profile_ids)
+                latest_scan_ids = {
+                    row["tracked_profile_id"]: row["latest_scan_id"]
+                    for row in connection.execute(
+                        f"""
+                        SELECT tracked_profile_id, MAX(id) AS latest_scan_id
+                        FROM scans
+                        WHERE tracked_profile_id IN ({profile_placeholders})
+                        GROUP BY tracked_profile_id
+                        """,
+                        profile_ids,
+                    )
+                }
+            if candidate_rows and top_player_limit > 0 and self.scoring_mode == "windowed":
+                pair_placeholders = ", ".join("(?, ?)" for _ in candidate_rows)
+                windows = {
+                    (row["tracked_profile_id"], row["player_puuid"]): row
+                    for row in connection.execute(
+                        f"""
+                        SELECT
+                            tracked_profile_id,
+                            player_puuid,
+                            COUNT(*) AS encounters_last_30d,
+                            COUNT(DISTINCT played_at_ms / {DAY_MS}) AS distinct_days_last_30d,
+                            SUM(played_at_ms >= ?) AS encounters_last_7d
+                        FROM encounters
+                        WHERE (tracked_profile_id, player_puuid) IN (VALUES {pair_placeholders})
+                          AND played_at_ms >= ?
+                        GROUP BY tracked_profile_id, player_puuid
+                        """,
+                        [
+                            last_7d_ms,
+                            *[value for row in candidate_rows for value in (row["tracked_profile_id"], row["player_puuid"])],
+                            last_30d_ms,
+                        ],
+                    )
+                }
 
-        combined_repeat_players.sort(
-            key=lambda player: (-player["risk"]["score"], -player["totalGames"], player["gameName"].lower())
+        candidates = []
+        candidate_stats = {}
+        for row in candidate_rows:
+            tracked_profile_id = int(row["tracked_profile_id"])
+            player = self._repeat_player_from_row(
+                row,
+                windows.get((tracked_profile_id, row["player_puuid"])),
+                latest_scan_ids.get(tracked_profile_id),
+                None,
+                windowed=self.scoring_mode == "windowed",
+            )
+            candidates.append({
+                "trackedProfileId": tracked_profile_id,
+                "trackedProfileName": f"{row['tracked_game_name']}#{row['tracked_tag_line']}",
+                **_summarize_repeat_player(player, self.scoring_mode),
+            })
+            candidate_stats[(tracked_profile_id, player["puuid"])] = player["stats"]
+
+        top_repeat_players = heapq.nsmallest(
+            top_player_limit,
+            candidates,
+            key=lambda player: (
+                -player["risk"]["score"],
+                -player["totalGames"],
+                player["gameName"].lower(),
+                player["tagLine"].lower(),
+                player["trackedProfileId"],
+            ),
+        )
+        explain_ranked_players(
+            top_repeat_players,
+            [candidate_stats[(player["trackedProfileId"], player["puuid"])] for player in top_repeat_players],
+            explain,
+            self.scoring_mode,
         )
+        notes = self._load_watch_notes(
+            (player["trackedProfileId"], player["puuid"]) for player in top_repeat_players
+        )
+        for player in top_repeat_players:
+            player["note"] = player["watchNote"] = notes.get((player["trackedProfileId"], player["puuid"]))
 
         return {
             "stats": {
-                "trackedProfileCount": len(tracked_profile_rows),
+                "trackedProfileCount": int(tracked_profile_count_row["tracked_profile_count"] or 0),
                 "scanCount": int(aggregate_row["scan_count"] or 0),
                 "encounterCount": int(aggregate_row["encounter_count"] or 0),
-                "repeatPlayerCount": len(combined_repeat_players),
-                "highAttentionCount": sum(1 for player in combined_repeat_players if player["risk"]["tier"] == "high-attention"),
+                "repeatPlayerCount": int(repeat_player_count_row["repeat_player_count"] or 0),
+                "highAttentionCount": int(high_attention_count_row["high_attention_count"] or 0),
                 "watchNoteCount": int(note_count_row["note_count"] or 0),
             },
-            "topRepeatPlayers": combined_repeat_players[:6],
+            "topRepeatPlayers": top_repeat_players,
             "recentScans": [
                 {
                     "id": int(row["id"]),
@@ -811,38 +2718,563 @@ class Storage:
             ],
         }
 
+    def _load_watch_notes(self, keys) -> dict:
+        """Fetch notes for specific (tracked_profile_id, player_puuid) pairs."""
+        keys = list(keys)
+        if not keys:
+            return {}
+
+        placeholders = ", ".join("(?, ?)" for _ in keys)
+        with self._connect() as connection:
+            rows = connection.execute(
+                f"""
+                SELECT tracked_profile_id, player_puuid, note
+                FROM watch_notes
+                WHERE (tracked_profile_id, player_puuid) IN (VALUES {placeholders})
+                """,
+                [value for key in keys for value in key],
+            ).fetchall()
+        return {(row["tracked_profile_id"], row["player_puuid"]): row["note"] for row in rows}
+
+    def get_match_details(self, match_id: str) -> dict | None:
+        with self._connect() as connection:
+            row = connection.execute(
+                """
+                SELECT payload
+                FROM match_details
+                WHERE match_id = ?
+                """,
+                (match_id,),
+            ).fetchone()
+        return json.loads(row["payload"]) if row is not None else None
+
+    def indexed_match_ids(self, match_ids) -> set[str]:
+        match_ids = list(match_ids)
+        if not match_ids:
+            return set()
+
+        placeholders = ", ".join("?" for _ in match_ids)
+        with self._connect() as connection:
+            rows = connection.execute(
+                f"""
+                SELECT DISTINCT match_id
+                FROM match_participants
+                WHERE match_id IN ({placeholders})
+                """,
+                match_ids,
+            ).fetchall()
+        return {row["match_id"] for row in rows}
+
+    def find_match_overlaps(self, user_puuid: str, lobby_puuids, match_ids) -> list[dict]:
+        """Return one row per (match, lobby player) among the user's indexed matches."""
+        lobby_puuids = list(lobby_puuids)
+        match_ids = list(match_ids)
+        if not lobby_puuids or not match_ids:
+            return []
+
+        match_placeholders = ", ".join("?" for _ in match_ids)
+        lobby_placeholders = ", ".join("?" for _ in lobby_puuids)
+        with self._connect() as connection:
+            rows = connection.execute(
+                f"""
+                SELECT
+                    me.match_id,
+                    me.game_creation,
+                    me.queue_id,
+                    me.team_id AS user_team_id,
+                    me.win AS user_win,
+                    me.champion_id AS user_champion_id,
+                    other.puuid,
+                    other.team_id,
+                    other.champion_id
+                FROM match_participants me
+                JOIN match_participants other ON other.match_id = me.match_id
+                WHERE me.puuid = ?
+                    AND me.match_id IN ({match_placeholders})
+                    AND other.puuid IN ({lobby_placeholders})
+                """,
+                [user_puuid, *match_ids, *lobby_puuids],
+            ).fetchall()
+
+        return [
+            {
+                "matchId": row["match_id"],
+                "gameCreation": row["game_creation"],
+                "queueId": row["queue_id"],
+                "userTeamId": row["user_team_id"],
+                "userWin": bool(row["user_win"]),
+                "userChampionId": row["user_champion_id"],
+                "puuid": row["puuid"],
+                "teamId": row["team_id"],
+                "championId": row["champion_id"],
+            }
+            for row in rows
+        ]
+
+    def save_match_details(self, match_id: str, payload: dict) -> None:
+        # Serialize on the caller's thread so the writer thread only runs SQL.
+        serialized = json.dumps(payload, separators=(",", ":"))
+        self._run_write(self._save_match_details, match_id, payload, serialized, bumps_data_version=False)
+
+    @classmethod
+    def _save_match_details(cls, connection: sqlite3.Connection, match_id: str, payload: dict, serialized: str) -> None:
+        info = payload.get("info") or {}
+        connection.execute(
+            """
+            INSERT INTO match_details (match_id, game_creation, game_end_timestamp, payload)
+            VALUES (?, ?, ?, ?)
+            ON CONFLICT(match_id) DO UPDATE SET
+                game_creation = excluded.game_creation,
+                game_end_timestamp = excluded.game_end_timestamp,
+                payload = excluded.payload,
+                fetched_at = CURRENT_TIMESTAMP
+            """,
+            (
+                match_id,
+                info.get("gameCreation"),
+                info.get("gameEndTimestamp"),
+                serialized,
+            ),
+        )
+        cls._index_match_participants(connection, match_id, payload)
+
+    def record_match_history(self, puuid: str, match_ids) -> None:
+        """Remember which matches belong to a player's processed history.
+
+        Matches whose payload is not stored yet (the download failed) are kept
+        with NULL timestamps. They never move the history cursor, and
+        load_match_history_ids lists them first so the next scan retries them.
+        """
+        rows = [{"puuid": puuid, "match_id": match_id} for match_id in match_ids]
+        if not rows:
+            return
+
+        self._run_write(
+            lambda connection: connection.executemany(
+                """
+                INSERT INTO player_match_history (puuid, match_id, game_creation, game_end_timestamp)
+                SELECT :puuid, requested.match_id, details.game_creation, details.game_end_timestamp
+                FROM (SELECT :match_id AS match_id) AS requested
+                LEFT JOIN match_details AS details ON details.match_id = requested.match_id
+                WHERE true
+                ON CONFLICT(puuid, match_id) DO UPDATE SET
+                    game_creation = COALESCE(excluded.game_creation, player_match_history.game_creation),
+                    game_end_timestamp = COALESCE(excluded.game_end_timestamp, player_match_history.game_end_timestamp)
+                """,
+                rows,
+            ),
+            bumps_data_version=False,
+        )
+
+    def load_match_history_ids(self, puuid: str, limit: int = 100) -> list[str]:
+        """Return history match IDs newest first, after any whose payload is still missing."""
+        with self._connect() as connection:
+            pending = connection.execute(
+                """
+                SELECT match_id
+                FROM player_match_history
+                WHERE puuid = ? AND game_creation IS NULL
+                ORDER BY match_id DESC
+                LIMIT ?
+                """,
+                (puuid, limit),
+            ).fetchall()
+            fetched = connection.execute(
+                """
+                SELECT match_id
+                FROM player_match_history
+                WHERE puuid = ? AND game_creation IS NOT NULL
+                ORDER BY game_creation DESC, match_id DESC
+                LIMIT ?
+                """,
+                (puuid, limit - len(pending)),
+            ).fetchall()
+        return [row["match_id"] for row in [*pending, *fetched]]
+
+    def get_match_history_cursor(self, puuid: str) -> int | None:
+        """Return the newest processed gameEndTimestamp (epoch ms) for a player."""
+        with self._connect() as connection:
+            row = connection.execute(
+                """
+                SELECT MAX(COALESCE(game_end_timestamp, game_creation)) AS cursor
+                FROM player_match_history
+                WHERE puuid = ?
+                """,
+                (puuid,),
+            ).fetchone()
+        return int(row["cursor"]) if row["cursor"] is not None else None
+
+    def rebuild_score_snapshots(self, tracked_profile_ids=None) -> dict:
+        """Replay stored history into per-scan score snapshots for each profile.
+
+        Every profile is one chronological sweep over its scans, scan
+        participants and encounters (see score_history), so the cost is linear
+        in stored rows rather than one rescore per snapshot. A profile's old
+        snapshots are replaced in the same write. Only history still kept by
+        retention is replayed.
+        """
+        started = time.perf_counter()
+        if tracked_profile_ids is None:
+            with self._connect() as connection:
+                tracked_profile_ids = [row["id"] for row in connection.execute("SELECT id FROM tracked_profiles")]
+
+        scan_count = 0
+        snapshot_count = 0
+        for tracked_profile_id in tracked_profile_ids:
+            with self._connect() as connection:
+                scans = [
+                    (row["id"], self._epoch_ms(self._parse_timestamp(row["created_at"])))
+                    for row in connection.execute(
+                        "SELECT id, created_at FROM scans WHERE tracked_profile_id = ? ORDER BY id",
+                        (tracked_profile_id,),
+                    )
+                ]
+                snapshots = list(
+                    replay_profile_scores(
+                        scans,
+                        connection.execute(
+                            """
+                            SELECT sp.scan_id, sp.player_puuid
+                            FROM scans s
+                            JOIN scan_participants sp ON sp.scan_id = s.id
+                            WHERE s.tracked_profile_id = ?
+                            ORDER BY s.id
+                            """,
+                            (tracked_profile_id,),
+                        ),
+                        connection.execute(
+                            """
+                            SELECT player_puuid, played_at_ms, relation
+                            FROM encounters
+                            WHERE tracked_profile_id = ? AND played_at_ms IS NOT NULL
+                            ORDER BY played_at_ms
+                            """,
+                            (tracked_profile_id,),
+                        ),
+                        self.scoring_mode,
+                    )
+                )
+            self._run_write(
+                self._replace_score_snapshots,
+                tracked_profile_id,
+                [{"tracked_profile_id": tracked_profile_id, **snapshot} for snapshot in snapshots],
+                bumps_data_version=False,
+            )
+            scan_count += len(scans)
+            snapshot_count += len(snapshots)
+
+        return {
+            "trackedProfiles": len(tracked_profile_ids),
+            "scans": scan_count,
+            "snapshots": snapshot_count,
+            "elapsedSeconds": round(time.perf_counter() - started, 3),
+        }
+
+    @staticmethod
+    def _replace_score_snapshots(connection: sqlite3.Connection, tracked_profile_id: int, snapshots) -> None:
+        connection.execute("DELETE FROM score_snapshots WHERE tracked_profile_id = ?", (tracked_profile_id,))
+        connection.executemany(
+            """
+            INSERT INTO score_snapshots (
+                tracked_profile_id,
+                player_puuid,
+                scan_id,
+                scanned_at_ms,
+                total_encounters,
+                score,
+                tier
+            )
+            VALUES (
+                :tracked_profile_id,
+                :player_puuid,
+                :scan_id,
+                :scanned_at_ms,
+                :total_encounters,
+                :score,
+                :tier
+            )
+            """,
+            snapshots,
+        )
+
+    def page_score_timeline(
+        self,
+        tracked_profile_id: int,
+        player_puuid: str,
+        limit: int = 20,
+        cursor: str | None = None,
+    ) -> dict:
+        """Return one page of a player's score snapshots, oldest scan first."""
+        after_scan_id = decode_cursor(cursor, (int,))[0] if cursor else 0
+        with self._connect() as connection:
+            rows = connection.execute(
+                """
+                SELECT scan_id, scanned_at_ms, total_encounters, score, tier
+                FROM score_snapshots
+                WHERE tracked_profile_id = ? AND player_puuid = ? AND scan_id > ?
+                ORDER BY scan_id
+                LIMIT ?
+                """,
+                (tracked_profile_id, player_puuid, after_scan_id, limit + 1),
+            ).fetchall()
+
+        items = [
+            {
+                "scanId": int(row["scan_id"]),
+                "scannedAt": datetime.fromtimestamp(row["scanned_at_ms"] / 1000, tz=timezone.utc).isoformat(),
+                "totalGames": int(row["total_encounters"]),
+                "score": int(row["score"]),
+                "tier": row["tier"],
+            }
+            for row in rows[:limit]
+        ]
+        return {
+            "items": items,
+            "nextCursor": encode_cursor([items[-1]["scanId"]]) if len(rows) > limit else None,
+        }
+
+    def apply_retention(
+        self,
+        retention_days: int,
+        now: datetime | None = None,
+        batch_size: int = RETENTION_BATCH_SIZE,
+    ) -> dict:
+        """Roll up and prune history older than ``retention_days``, then reclaim free pages.
+
+        Old encounters keep their counts in player_encounter_stats and their
+        matches are recorded in archived_matches; scan participants, cached match payloads
+        and stored match-history rows past the cutoff are deleted. Each batch
+        commits on its own so writers are never blocked for long.
+        """
+        retention_days = max(MIN_RETENTION_DAYS, int(retention_days))
+        cutoff = (now or datetime.now(timezone.utc)) - timedelta(days=retention_days)
+        cutoff_ms = self._epoch_ms(cutoff)
+        bytes_before = self._database_size()
+
+        encounters_archived = 0
+        while True:
+            with self._connect() as connection:
+                encounter_ids = [
+                    row["id"]
+                    for row in connection.execute(
+                        "SELECT id FROM encounters WHERE played_at_ms < ? LIMIT ?",
+                        (cutoff_ms, batch_size),
+                    )
+                ]
+            if not encounter_ids:
+                break
+            self._run_write(self._archive_encounters, encounter_ids)
+            encounters_archived += len(encounter_ids)
+
+        with self._connect() as connection:
+            last_old_scan_id = connection.execute(
+                "SELECT MAX(id) FROM scans WHERE created_at < ?",
+                (cutoff.strftime("%Y-%m-%d %H:%M:%S"),),
+            ).fetchone()[0]
+        scan_participants_pruned = 0
+        if last_old_scan_id is not None:
+            scan_participants_pruned = self._prune_in_batches(
+                "scan_participants", "scan_id <= ?", (last_old_scan_id,), batch_size
+            )
+
+        report = {
+            "retentionDays": retention_days,
+            "cutoff": cutoff.isoformat(),
+            "encountersArchived": encounters_archived,
+            "scanParticipantsPruned": scan_participants_pruned,
+            "matchDetailsPruned": self._prune_in_batches(
+                "match_details", "game_creation < ?", (cutoff_ms,), batch_size
+            ),
+            "matchHistoryPruned": self._prune_in_batches(
+                "player_match_history", "game_creation < ?", (cutoff_ms,), batch_size
+            ),
+        }
+        self._reclaim_free_pages()
+        bytes_after = self._database_size()
+        report.update(
+            {
+                "bytesBefore": bytes_before,
+                "bytesAfter": bytes_after,
+                "reclaimedBytes": max(0, bytes_before - bytes_after),
+            }
+        )
+        return report
+
+    @staticmethod
+    def _archive_encounters(connection: sqlite3.Connection, encounter_ids) -> None:
+        placeholders = ", ".join("?" for _ in encounter_ids)
+        rollups = connection.execute(
+            f"""
+            SELECT
+                tracked_profile_id,
+                player_puuid,
+                COUNT(*) AS total_encounters,
+                SUM(relation = 'enemy') AS enemy_encounters,
+                SUM(relation = 'ally') AS ally_encounters,
+                SUM(won != 0) AS wins,
+                MAX(played_at) AS last_played_at,
+                SUM({_decay_sql("st.recent_encounters_at_ms - played_at_ms")}) AS recent_encounters
+            FROM encounters
+            JOIN player_encounter_stats st USING (tracked_profile_id, player_puuid)
+            WHERE id IN ({placeholders})
+            GROUP BY tracked_profile_id, player_puuid
+            """,
+            encounter_ids,
+        ).fetchall()
+        connection.execute(
+            f"""
+            INSERT OR IGNORE INTO archived_matches (tracked_profile_id, match_id)
+            SELECT DISTINCT tracked_profile_id, match_id
+            FROM encounters
+            WHERE id IN ({placeholders})
+            """,
+            encounter_ids,
+        )
+        connection.execute(f"DELETE FROM encounters WHERE id IN ({placeholders})", encounter_ids)
+        # The delete trigger subtracted these rows; add them back so the
+        # aggregates keep counting the player's whole history.
+        connection.executemany(
+            """
+            UPDATE player_encounter_stats
+            SET
+                total_encounters = total_encounters + :total_encounters,
+                enemy_encounters = enemy_encounters + :enemy_encounters,
+                ally_encounters = ally_encounters + :ally_encounters,
+                wins = wins + :wins,
+                last_played_at = MAX(COALESCE(last_played_at, ''), :last_played_at),
+                recent_encounters = recent_encounters + COALESCE(:recent_encounters, 0.0)
+            WHERE tracked_profile_id = :tracked_profile_id
+              AND player_puuid = :player_puuid
+            """,
+            [dict(row) for row in rollups],
+        )
+
+    def _prune_in_batches(self, table: str, where: str, params, batch_size: int) -> int:
+        pruned = 0
+        while True:
+            deleted = self._run_write(
+                lambda connection: connection.execute(
+                    f"""
+                    DELETE FROM {table}
+                    WHERE rowid IN (SELECT rowid FROM {table} WHERE {where} LIMIT ?)
+                    """,
+                    [*params, batch_size],
+                ).rowcount
+            )
+            if deleted <= 0:
+                return pruned
+            pruned += deleted
+
+    def _reclaim_free_pages(self) -> None:
+        self._run_write(self._vacuum, bumps_data_version=False, in_transaction=False)
+
+    @staticmethod
+    def _vacuum(connection: sqlite3.Connection) -> None:
+        if connection.execute("PRAGMA auto_vacuum").fetchone()[0] != 2:
+            # Switching an existing file to incremental mode needs one full VACUUM.
+            connection.execute("PRAGMA auto_vacuum = INCREMENTAL")
+            connection.execute("VACUUM")
+        else:
+            connection.execute("PRAGMA incremental_vacuum").fetchall()
+        connection.execute("PRAGMA wal_checkpoint(TRUNCATE)").fetchall()
+
+    def _database_size(self) -> int:
+        with self._connect() as connection:
+            page_count = connection.execute("PRAGMA page_count").fetchone()[0]
+            page_size = connection.execute("PRAGMA page_size").fetchone()[0]
+        return int(page_count) * int(page_size)
+
+    def count_match_details(self) -> int:
+        with self._connect() as connection:
+            row = connection.execute("SELECT COUNT(*) FROM match_details").fetchone()
+        return int(row[0])
+
     def count_encounters(self) -> int:
         with self._connect() as connection:
             row = connection.execute("SELECT COUNT(*) FROM encounters").fetchone()
         return int(row[0])
 
     @staticmethod
-    def _build_repeat_player_stats(encounters, ordered_scan_ids, hit_scan_ids) -> dict:
-        total_encounters = len(encounters)
-        now = datetime.now(timezone.utc)
-        last_30_days = now - timedelta(days=30)
-        last_7_days = now - timedelta(days=7)
-
-        played_at_values = [
-            Storage._parse_timestamp(encounter["playedAt"])
-            for encounter in encounters
-        ]
+    def _player_filter(player_puuids) -> tuple[str, list]:
+        """Build an ``AND {column} IN (...)`` template and its params, or nothing."""
+        if not player_puuids:
+            return "", []
+        placeholders = ", ".join("?" for _ in player_puuids)
+        return f" AND {{column}} IN ({placeholders})", list(player_puuids)
 
-        encounters_last_30d = [played_at for played_at in played_at_values if played_at >= last_30_days]
-        encounters_last_7d = [played_at for played_at in played_at_values if played_at >= last_7_days]
-        distinct_days_last_30d = {played_at.date().isoformat() for played_at in encounters_last_30d}
+    @staticmethod
+    def _window_cutoffs_ms(now: datetime | None = None) -> tuple[int, int]:
+        """Epoch-ms lower bounds of the 30-day and 7-day scoring windows."""
+        now_ms = Storage._epoch_ms(now or datetime.now(timezone.utc))
+        return now_ms - 30 * DAY_MS, now_ms - 7 * DAY_MS
 
-        enemy_count = sum(1 for encounter in encounters if encounter["relation"] == "enemy")
-        ally_count = sum(1 for encounter in encounters if encounter["relation"] == "ally")
+    @staticmethod
+    def _streak_if_current(row, latest_scan_id) -> int:
+        # A streak only counts while the player was in the profile's newest scan.
+        if latest_scan_id is not None and row["last_scan_hit_id"] == latest_scan_id:
+            return int(row["scan_hit_streak"])
+        return 0
 
+    @staticmethod
+    def _repeat_player_from_row(row, window, latest_scan_id, note, windowed: bool = True) -> dict:
+        consecutive_scan_hits = Storage._streak_if_current(row, latest_scan_id)
         return {
+            "puuid": row["player_puuid"],
+            "gameName": row["game_name"],
+            "tagLine": row["tag_line"],
+            "region": row["region"],
+            "resolutionStatus": row["resolution_status"],
+            "wins": int(row["wins"]),
+            "latestPlayedAt": row["last_played_at"],
+            "note": note,
+            "stats": Storage._build_repeat_player_stats(row, window, consecutive_scan_hits, windowed),
+        }
+
+    @staticmethod
+    def _build_repeat_player_stats(aggregate, window, consecutive_scan_hits, windowed: bool = True) -> dict:
+        """Scoring stats for one player; the window counts only when ``windowed``."""
+        total_encounters = int(aggregate["total_encounters"])
+        now_ms = Storage._epoch_ms(datetime.now(timezone.utc))
+
+        stats = {
             "total_encounters": total_encounters,
-            "encounters_last_30d": len(encounters_last_30d),
-            "distinct_days_last_30d": len(distinct_days_last_30d),
-            "encounters_last_7d": len(encounters_last_7d),
-            "consecutive_scan_hits": Storage._count_consecutive_scan_hits(ordered_scan_ids, hit_scan_ids),
-            "enemy_ratio": enemy_count / total_encounters if total_encounters else 0.0,
-            "ally_ratio": ally_count / total_encounters if total_encounters else 0.0,
+            "recent_encounters": decayed_count(
+                aggregate["recent_encounters"],
+                aggregate["recent_encounters_at_ms"],
+                now_ms,
+            ),
+            "consecutive_scan_hits": consecutive_scan_hits,
+            "enemy_ratio": aggregate["enemy_encounters"] / total_encounters if total_encounters else 0.0,
+            "ally_ratio": aggregate["ally_encounters"] / total_encounters if total_encounters else 0.0,
+        }
+        if windowed:
+            stats["encounters_last_30d"] = int(window["encounters_last_30d"]) if window else 0
+            stats["distinct_days_last_30d"] = int(window["distinct_days_last_30d"]) if window else 0
+            stats["encounters_last_7d"] = int(window["encounters_last_7d"]) if window else 0
+        return stats
+
+    @staticmethod
+    def _stats_columns(stats_rows, windows, latest_scan_ids, now_ms: int) -> dict:
+        """Columnar form of _build_repeat_player_stats for score_repeat_players.
+
+        ``windows`` and ``latest_scan_ids`` are keyed like the rows:
+        (tracked_profile_id, player_puuid) and tracked_profile_id.
+        """
+        totals = [int(row["total_encounters"]) for row in stats_rows]
+        row_windows = [windows.get((row["tracked_profile_id"], row["player_puuid"])) for row in stats_rows]
+        return {
+            "total_encounters": totals,
+            "encounters_last_30d": [int(window["encounters_last_30d"]) if window else 0 for window in row_windows],
+            "distinct_days_last_30d": [int(window["distinct_days_last_30d"]) if window else 0 for window in row_windows],
+            "encounters_last_7d": [int(window["encounters_last_7d"]) if window else 0 for window in row_windows],
+            "recent_encounters": [
+                decayed_count(row["recent_encounters"], row["recent_encounters_at_ms"], now_ms) for row in stats_rows
+            ],
+            "consecutive_scan_hits": [
+                Storage._streak_if_current(row, latest_scan_ids.get(row["tracked_profile_id"])) for row in stats_rows
+            ],
+            "enemy_ratio": [row["enemy_encounters"] / total if total else 0.0 for row, total in zip(stats_rows, totals)],
+            "ally_ratio": [row["ally_encounters"] / total if total else 0.0 for row, total in zip(stats_rows, totals)],
         }
 
     @staticmethod
@@ -857,6 +3289,10 @@ class Storage:
             return 0
         return consecutive
 
+    @staticmethod
+    def _epoch_ms(value: datetime) -> int:
+        return (value - EPOCH) // timedelta(milliseconds=1)
+
     @staticmethod
     def _parse_timestamp(value: str) -> datetime:
         normalized = value.replace("Z", "+00:00")
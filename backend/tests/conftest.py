@@ -1,3 +1,23 @@
 import os
 import sys
 sys.path.insert(0, os.path.dirname(os.path.dirname(__file__)))
+
+import pytest
+
+from storage import Storage
+
+
+@pytest.fixture(autouse=True)
+def close_storages(monkeypatch):
+    """Close every Storage a test opens so writer threads never outlive it."""
+    opened = []
+    original_init = Storage.__init__
+
+    def tracking_init(self, *args, **kwargs):
+        original_init(self, *args, **kwargs)
+        opened.append(self)
+
+    monkeypatch.setattr(Storage, "__init__", tracking_init)
+    yield
+    for storage in opened:
+        storage.close()
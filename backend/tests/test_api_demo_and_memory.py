@@ -1,11 +1,12 @@
+import scoring
 from app_factory import create_app
 from demo_data import DemoLiveClient, DemoRiotClient
 from scan_service import ScanService
-from storage import Storage
+from storage import Storage, encode_cursor
 
 
-def build_app(tmp_path):
-    storage = Storage(tmp_path / "hibs.db")
+def build_app(tmp_path, scoring_mode="windowed"):
+    storage = Storage(tmp_path / "hibs.db", scoring_mode=scoring_mode)
     app = create_app(
         {
             "TESTING": True,
@@ -145,3 +146,170 @@ def test_demo_mode_live_status_disables_auto_scan(tmp_path):
     assert payload["connected"] is True
     assert payload["inGame"] is True
     assert payload["canAutoScan"] is False
+
+
+def test_memory_endpoints_answer_unchanged_polls_with_304_until_a_write(tmp_path, monkeypatch):
+    app, storage = build_app(tmp_path)
+    client = app.test_client()
+    scan_payload = client.post("/api/demo/scan").get_json()
+    tracked_profile_id = scan_payload["trackedProfile"]["id"]
+    player_puuid = scan_payload["repeatPlayers"][0]["puuid"]
+    memory_url = f"/api/tracked-profiles/{tracked_profile_id}/memory"
+
+    first = client.get(memory_url)
+    summary = client.get("/api/memory/summary")
+    assert first.status_code == 200
+    assert first.headers["ETag"]
+
+    def fail_if_queried(*_args, **_kwargs):
+        raise AssertionError("cached poll should not touch storage")
+
+    with monkeypatch.context() as patched:
+        patched.setattr(storage, "load_memory_overview", fail_if_queried)
+        patched.setattr(storage, "get_memory_summary", fail_if_queried)
+        not_modified = client.get(memory_url, headers={"If-None-Match": first.headers["ETag"]})
+        summary_not_modified = client.get("/api/memory/summary", headers={"If-None-Match": summary.headers["ETag"]})
+        repeated = client.get(memory_url)
+
+    assert not_modified.status_code == 304
+    assert summary_not_modified.status_code == 304
+    assert repeated.get_json() == first.get_json()
+
+    client.put(
+        f"/api/tracked-profiles/{tracked_profile_id}/players/{player_puuid}/note",
+        json={"note": "cache buster"},
+    )
+    refreshed = client.get(memory_url, headers={"If-None-Match": first.headers["ETag"]})
+
+    assert refreshed.status_code == 200
+    assert refreshed.headers["ETag"] != first.headers["ETag"]
+    assert refreshed.get_json()["aggregate"]["notedPlayers"] == 1
+
+
+def test_paginated_memory_endpoints_return_items_and_cursors(tmp_path):
+    app, _storage = build_app(tmp_path)
+    client = app.test_client()
+    scan_payload = client.post("/api/demo/scan").get_json()
+    tracked_profile_id = scan_payload["trackedProfile"]["id"]
+    player_puuid = scan_payload["repeatPlayers"][0]["puuid"]
+    base_url = f"/api/tracked-profiles/{tracked_profile_id}"
+
+    first_page = client.get(f"{base_url}/repeat-players?limit=2").get_json()
+    second_page = client.get(f"{base_url}/repeat-players?limit=2&cursor={first_page['nextCursor']}").get_json()
+    encounters = client.get(f"{base_url}/players/{player_puuid}/encounters").get_json()
+    scans = client.get(f"{base_url}/scans").get_json()
+
+    assert len(first_page["items"]) == 2
+    assert first_page["items"][0]["risk"]["score"] >= first_page["items"][1]["risk"]["score"]
+    assert not {item["puuid"] for item in first_page["items"]} & {item["puuid"] for item in second_page["items"]}
+    assert encounters["items"] and encounters["nextCursor"] is None
+    assert [scan["source"] for scan in scans["items"]] == ["demo"]
+    assert client.get(f"{base_url}/scans?cursor=%%%").status_code == 400
+    for cursor in (encode_cursor([{}, "x"]), encode_cursor([10, 5])):
+        assert client.get(f"{base_url}/repeat-players?cursor={cursor}").status_code == 400
+    assert client.get(f"{base_url}/players/{player_puuid}/encounters?cursor={encode_cursor(['x', 1])}").status_code == 400
+    assert client.get(f"{base_url}/scans?cursor={encode_cursor([True])}").status_code == 400
+    assert client.get("/api/tracked-profiles/999/scans").status_code == 404
+
+
+def test_reasons_are_built_for_top_players_unless_explain_is_requested(tmp_path, monkeypatch):
+    monkeypatch.setattr(scoring, "EXPLAINED_PLAYER_LIMIT", 1)
+    app, _storage = build_app(tmp_path)
+    client = app.test_client()
+    scan_payload = client.post("/api/demo/scan").get_json()
+    base_url = f"/api/tracked-profiles/{scan_payload['trackedProfile']['id']}"
+
+    summary = client.get("/api/memory/summary").get_json()["topRepeatPlayers"]
+    explained = client.get("/api/memory/summary?explain=1").get_json()["topRepeatPlayers"]
+    page = client.get(f"{base_url}/repeat-players").get_json()["items"]
+
+    assert len(summary) >= 2
+    assert summary[0]["risk"]["reasons"]
+    assert all(player["risk"]["reasons"] == [] for player in summary[1:])
+    assert all(player["risk"]["reasons"] for player in explained)
+    assert [player["risk"]["score"] for player in explained] == [player["risk"]["score"] for player in summary]
+    assert page[0]["risk"]["reasons"] and page[1]["risk"]["reasons"] == []
+    assert all(player["risk"]["reasons"] for player in scan_payload["repeatPlayers"][:1])
+    assert scan_payload["repeatPlayers"][1]["risk"]["reasons"] == []
+
+
+def test_explain_endpoint_returns_reasons_and_inputs_for_one_player(tmp_path):
+    app, _storage = build_app(tmp_path)
+    client = app.test_client()
+    scan_payload = client.post("/api/demo/scan").get_json()
+    base_url = f"/api/tracked-profiles/{scan_payload['trackedProfile']['id']}"
+    player = scan_payload["repeatPlayers"][-1]
+
+    response = client.get(f"{base_url}/players/{player['puuid']}/explain")
+    payload = response.get_json()
+
+    assert response.status_code == 200
+    assert payload["puuid"] == player["puuid"]
+    assert payload["risk"] == scoring.score_repeat_player(payload["stats"])
+    assert payload["risk"]["score"] == player["risk"]["score"]
+    assert payload["risk"]["reasons"]
+    assert client.get(f"{base_url}/players/unknown/explain").status_code == 404
+    assert client.get("/api/tracked-profiles/999/players/unknown/explain").status_code == 404
+
+
+def test_explain_endpoint_works_in_decayed_scoring_mode(tmp_path):
+    app, _storage = build_app(tmp_path, scoring_mode="decayed")
+    client = app.test_client()
+    scan_payload = client.post("/api/demo/scan").get_json()
+    player = scan_payload["repeatPlayers"][0]
+
+    response = client.get(f"/api/tracked-profiles/{scan_payload['trackedProfile']['id']}/players/{player['puuid']}/explain")
+    payload = response.get_json()
+
+    assert response.status_code == 200
+    assert payload["scoringMode"] == "decayed"
+    assert "encounters_last_30d" not in payload["stats"]
+    assert payload["risk"] == scoring.score_repeat_player(payload["stats"], mode="decayed")
+
+
+def test_score_timeline_endpoint_serves_rebuilt_snapshots(tmp_path):
+    app, _storage = build_app(tmp_path)
+    client = app.test_client()
+    scan_payload = client.post("/api/demo/scan").get_json()
+    profile_id = scan_payload["trackedProfile"]["id"]
+    base_url = f"/api/tracked-profiles/{profile_id}"
+    player = scan_payload["repeatPlayers"][0]
+
+    rebuilt = client.post("/api/score-snapshots/rebuild", json={"trackedProfileId": profile_id})
+    timeline = client.get(f"{base_url}/players/{player['puuid']}/timeline").get_json()
+
+    assert rebuilt.status_code == 200
+    assert rebuilt.get_json()["trackedProfiles"] == 1
+    assert timeline["items"][-1]["score"] == player["risk"]["score"]
+    assert timeline["nextCursor"] is None
+    assert client.post("/api/score-snapshots/rebuild").get_json()["snapshots"] == rebuilt.get_json()["snapshots"]
+    assert client.post("/api/score-snapshots/rebuild", json={"trackedProfileId": "1"}).status_code == 400
+    assert client.post("/api/score-snapshots/rebuild", json={"trackedProfileId": 999}).status_code == 404
+    assert client.get(f"/api/tracked-profiles/999/players/{player['puuid']}/timeline").status_code == 404
+
+
+def test_player_groups_endpoint_reports_recurring_groups(tmp_path):
+    app, storage = build_app(tmp_path)
+    client = app.test_client()
+    scan_payload = client.post("/api/demo/scan").get_json()
+    profile_id = scan_payload["trackedProfile"]["id"]
+    scan_id = scan_payload["scan"]["id"]
+    for puuid in ("duo-a", "duo-b"):
+        storage.upsert_player(puuid, puuid, "DUO", "NA1", "resolved")
+        for match_id in ("DUO-1", "DUO-2"):
+            storage.insert_encounter(profile_id, puuid, scan_id, match_id, "2026-03-16T00:00:00Z", "enemy", 81, 420, 0)
+
+    response = client.get(f"/api/tracked-profiles/{profile_id}/groups?limit=3")
+    payload = response.get_json()
+
+    assert response.status_code == 200
+    assert payload["triads"] == []
+    assert [[player["puuid"] for player in pair["players"]] for pair in payload["pairs"]] == [["duo-a", "duo-b"]]
+    pair = payload["pairs"][0]
+    assert pair["sharedMatches"] == 2 and pair["enemyMatches"] == 2
+    assert pair["risk"] == scoring.score_player_group(
+        [player["score"] for player in pair["players"]],
+        pair["sharedMatches"],
+        pair["enemyMatches"],
+    )
+    assert client.get("/api/tracked-profiles/999/groups").status_code == 404
@@ -2,7 +2,7 @@ from app_factory import create_app
 
 
 class FakeScanService:
-    def run_manual_scan(self, game_name, tag_line, region):
+    def run_manual_scan(self, game_name, tag_line, region, explain=False):
         return {
             "trackedProfile": {
                 "id": 1,
@@ -62,7 +62,7 @@ def test_scan_endpoint_validates_required_fields(tmp_path):
 
 def test_scan_endpoint_returns_not_found_for_value_errors(tmp_path):
     class MissingPlayerScanService:
-        def run_manual_scan(self, game_name, tag_line, region):
+        def run_manual_scan(self, game_name, tag_line, region, explain=False):
             raise ValueError("Player not found")
 
     client = build_app(tmp_path, MissingPlayerScanService()).test_client()
@@ -78,7 +78,7 @@ def test_scan_endpoint_returns_not_found_for_value_errors(tmp_path):
 
 def test_scan_endpoint_returns_internal_server_error_on_unexpected_errors(tmp_path):
     class BrokenScanService:
-        def run_manual_scan(self, game_name, tag_line, region):
+        def run_manual_scan(self, game_name, tag_line, region, explain=False):
             raise RuntimeError("boom")
 
     client = build_app(tmp_path, BrokenScanService()).test_client()
@@ -108,3 +108,54 @@ def test_scan_endpoint_requires_configured_riot_client(tmp_path):
 
     assert response.status_code == 503
     assert "Riot API is not configured" in response.get_json()["error"]
+
+
+def test_stream_scan_endpoint_emits_server_sent_events(tmp_path):
+    class StreamingScanService(FakeScanService):
+        def stream_manual_scan(self, game_name, tag_line, region, explain=False):
+            yield "lobby", {"currentGame": {"gameId": 101}}
+            yield "result", self.run_manual_scan(game_name, tag_line, region)
+
+    client = build_app(tmp_path, StreamingScanService()).test_client()
+    response = client.post("/api/scan/stream", json={
+        "gameName": "Streamer",
+        "tagLine": "NA1",
+        "region": "NA1",
+    })
+
+    body = response.get_data(as_text=True)
+    assert response.status_code == 200
+    assert response.mimetype == "text/event-stream"
+    assert body.startswith('event: lobby\ndata: {"currentGame":{"gameId":101}}\n\n')
+    assert "event: result\ndata: " in body
+
+
+def test_stream_scan_endpoint_validates_required_fields(tmp_path):
+    client = build_app(tmp_path, FakeScanService()).test_client()
+    response = client.post("/api/scan/stream", json={"gameName": "Streamer"})
+
+    assert response.status_code == 400
+
+
+def test_async_scan_returns_job_and_exposes_status(tmp_path):
+    class KeywordScanService(FakeScanService):
+        def run_manual_scan(self, game_name, tag_line, region, **kwargs):
+            return super().run_manual_scan(game_name, tag_line, region)
+
+    app = build_app(tmp_path, KeywordScanService())
+    client = app.test_client()
+
+    response = client.post("/api/scan?async=1", json={
+        "gameName": "Streamer",
+        "tagLine": "NA1",
+        "region": "NA1",
+    })
+    payload = response.get_json()
+    app.extensions["scan_jobs"].shutdown(wait=True)
+    status = client.get(payload["statusUrl"]).get_json()
+
+    assert response.status_code == 202
+    assert response.headers["Location"] == payload["statusUrl"]
+    assert status["status"] == "succeeded"
+    assert status["result"]["trackedProfile"]["puuid"] == "self"
+    assert client.get("/api/scans/jobs/missing").status_code == 404
@@ -1,4 +1,4 @@
-from app_factory import create_app
+from app_factory import close_app, create_app
 from storage import Storage
 
 
@@ -37,3 +37,13 @@ def test_task_2_routes_are_not_registered(tmp_path):
 
     assert client.post("/api/check-game", json={}).status_code == 404
     assert client.post("/api/analyze-snipes", json={}).status_code == 404
+
+
+def test_close_app_releases_storage_connections(tmp_path):
+    app = build_app(tmp_path)
+    storage = app.extensions["storage"]
+    app.test_client().get("/api/memory/summary")
+
+    close_app(app)
+
+    assert storage._pool.empty()
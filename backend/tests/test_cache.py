@@ -0,0 +1,43 @@
+from cache import TTLCache
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+def test_entries_expire_after_their_ttl():
+    clock = FakeClock()
+    cache = TTLCache(max_entries=4, default_ttl=10, clock=clock)
+    cache.set("account", "puuid")
+    cache.set("spectator", {"gameId": 1}, ttl=1)
+
+    clock.now = 5
+    assert cache.get("account") == "puuid"
+    assert cache.get("spectator") is None
+
+    clock.now = 11
+    assert cache.get("account") is None
+    assert len(cache) == 0
+
+
+def test_least_recently_used_entry_is_evicted_at_capacity():
+    cache = TTLCache(max_entries=2, default_ttl=10, clock=FakeClock())
+    cache.set("a", 1)
+    cache.set("b", 2)
+    cache.get("a")
+    cache.set("c", 3)
+
+    assert cache.get("b") is None
+    assert cache.get("a") == 1
+    assert cache.get("c") == 3
+    assert cache.stats() == {
+        "size": 2,
+        "maxEntries": 2,
+        "hits": 3,
+        "misses": 1,
+        "evictions": 1,
+    }
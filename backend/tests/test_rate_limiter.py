@@ -0,0 +1,81 @@
+from rate_limiter import RateLimiter, parse_rate_limit_header
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+        self.sleeps = []
+
+    def __call__(self):
+        return self.now
+
+    def sleep(self, seconds):
+        self.sleeps.append(seconds)
+        self.now += seconds
+
+
+def build_limiter(app_limits):
+    clock = FakeClock()
+    return RateLimiter(app_limits, clock=clock, sleep=clock.sleep), clock
+
+
+def test_parse_rate_limit_header_reads_count_and_window_pairs():
+    assert parse_rate_limit_header("20:1,100:120") == [(20, 1), (100, 120)]
+    assert parse_rate_limit_header(None) == []
+    assert parse_rate_limit_header("bogus,5:10") == [(5, 10)]
+
+
+def test_acquire_waits_only_until_the_window_resets():
+    limiter, clock = build_limiter(((2, 1), (100, 120)))
+
+    for _ in range(3):
+        limiter.acquire("americas", "match-v5.match")
+
+    assert clock.sleeps == [1.0]
+
+
+def test_routing_values_have_independent_budgets():
+    limiter, clock = build_limiter(((1, 1),))
+
+    limiter.acquire("americas", "match-v5.match")
+    limiter.acquire("europe", "match-v5.match")
+
+    assert clock.sleeps == []
+
+
+def test_limits_and_counts_are_learned_from_response_headers():
+    limiter, clock = build_limiter(((20, 1), (100, 120)))
+
+    limiter.acquire("americas", "match-v5.match")
+    limiter.update("americas", "match-v5.match", {
+        "X-App-Rate-Limit": "20:1,100:120",
+        "X-App-Rate-Limit-Count": "1:1,100:120",
+        "X-Method-Rate-Limit": "2000:10",
+        "X-Method-Rate-Limit-Count": "1:10",
+    })
+    limiter.acquire("americas", "match-v5.match")
+
+    assert clock.sleeps == [120.0]
+
+
+def test_method_windows_only_throttle_their_method():
+    limiter, clock = build_limiter(((100, 1),))
+    limiter.update("na1", "spectator-v5.active-games", {
+        "X-Method-Rate-Limit": "1:10",
+        "X-Method-Rate-Limit-Count": "1:10",
+    })
+
+    limiter.acquire("na1", "match-v5.match")
+    assert clock.sleeps == []
+
+    limiter.acquire("na1", "spectator-v5.active-games")
+    assert clock.sleeps == [10.0]
+
+
+def test_penalize_blocks_routing_value_for_retry_after():
+    limiter, clock = build_limiter(((100, 1),))
+
+    limiter.penalize("americas", "match-v5.match", 3, "application")
+    limiter.acquire("americas", "account-v1.by-riot-id")
+
+    assert clock.sleeps == [3.0]
@@ -0,0 +1,37 @@
+from retention import RetentionJob
+
+
+class FakeStorage:
+    def __init__(self):
+        self.calls = []
+
+    def apply_retention(self, retention_days):
+        self.calls.append(retention_days)
+        return {
+            "encountersArchived": 3,
+            "scanParticipantsPruned": 2,
+            "matchDetailsPruned": 1,
+            "reclaimedBytes": 4096,
+        }
+
+
+def test_run_once_applies_retention_and_keeps_the_report():
+    storage = FakeStorage()
+    job = RetentionJob(storage, retention_days=45)
+
+    report = job.run_once()
+
+    assert storage.calls == [45]
+    assert job.last_report == report
+
+
+def test_background_loop_runs_immediately_and_stops_on_shutdown():
+    storage = FakeStorage()
+    job = RetentionJob(storage, retention_days=30, interval_seconds=3600)
+
+    job.start()
+    job.shutdown()
+    job._thread.join(timeout=2)
+
+    assert storage.calls == [30]
+    assert not job._thread.is_alive()
@@ -0,0 +1,240 @@
+import threading
+import time
+
+from rate_limiter import RateLimiter
+from riot_client import RiotAPIClient
+from storage import Storage
+
+
+class FakeResponse:
+    def __init__(self, status_code, payload=None, headers=None):
+        self.status_code = status_code
+        self._payload = payload
+        self.headers = headers or {}
+        self.text = ""
+
+    def json(self):
+        return self._payload
+
+
+class FakeSession:
+    def __init__(self, routes):
+        self.routes = routes
+        self.calls = []
+        self.params = []
+
+    def get(self, url, params=None, timeout=None):
+        self.calls.append(url)
+        self.params.append(params)
+        for suffix, payload in self.routes.items():
+            if url.endswith(suffix):
+                return FakeResponse(200, payload)
+        return FakeResponse(404)
+
+
+def build_match(match_id, game_creation, participants):
+    return {
+        "metadata": {"matchId": match_id},
+        "info": {
+            "gameCreation": game_creation,
+            "gameEndTimestamp": game_creation + 1_800_000,
+            "queueId": 420,
+            "participants": participants,
+        },
+    }
+
+
+def participant(puuid, team_id, win, champion_id):
+    return {"puuid": puuid, "teamId": team_id, "win": win, "championId": champion_id}
+
+
+MATCH_ROUTES = {
+    "/ids": ["NA1_2", "NA1_1"],
+    "/matches/NA1_2": build_match("NA1_2", 1710000000000, [
+        participant("self", 100, True, 81),
+        participant("enemy", 200, False, 157),
+    ]),
+    "/matches/NA1_1": build_match("NA1_1", 1709000000000, [
+        participant("self", 100, False, 81),
+        participant("ally", 100, False, 412),
+    ]),
+}
+
+
+def build_client(routes, match_store=None, **kwargs):
+    client = RiotAPIClient("test-key", match_store=match_store, **kwargs)
+    client.session = FakeSession(dict(routes))
+    return client
+
+
+def test_analyze_match_history_reports_overlaps():
+    client = build_client(MATCH_ROUTES)
+
+    history = client.analyze_match_history("self", ["self", "enemy", "ally", "other"], "NA1")
+
+    assert set(history) == {"enemy", "ally"}
+    assert history["enemy"]["matches"][0]["team"] == "against"
+    assert history["enemy"]["wins"] == 1
+    assert history["ally"]["matches"][0]["team"] == "with"
+    assert history["ally"]["losses"] == 1
+
+
+def test_match_store_serves_repeat_scans_without_refetching_details(tmp_path):
+    storage = Storage(tmp_path / "hibs.db")
+    client = build_client(MATCH_ROUTES, match_store=storage)
+
+    first = client.analyze_match_history("self", ["self", "enemy", "ally"], "NA1")
+    first_calls = list(client.session.calls)
+    client.session.calls.clear()
+    second = client.analyze_match_history("self", ["self", "enemy", "ally"], "NA1")
+
+    assert second == first
+    assert len(first_calls) == 3
+    assert [url for url in client.session.calls if "/matches/NA1_" in url] == []
+    assert storage.count_match_details() == 2
+    assert client.get_match_details("NA1_1", "NA1")["metadata"]["matchId"] == "NA1_1"
+
+
+def test_concurrent_fetch_matches_serial_results():
+    serial = build_client(MATCH_ROUTES).analyze_match_history("self", ["enemy", "ally"], "NA1")
+    concurrent_client = build_client(MATCH_ROUTES, max_workers=4)
+
+    concurrent = concurrent_client.analyze_match_history("self", ["enemy", "ally"], "NA1")
+
+    assert concurrent == serial
+    assert sorted(concurrent_client.session.calls[1:]) == sorted([
+        "https://americas.api.riotgames.com/lol/match/v5/matches/NA1_2",
+        "https://americas.api.riotgames.com/lol/match/v5/matches/NA1_1",
+    ])
+
+
+def test_worker_pool_is_capped_by_rate_limit():
+    client = RiotAPIClient("test-key", max_workers=32, rate_limit_per_second=19)
+
+    assert client.max_workers == 19
+
+
+def test_rate_limited_response_waits_on_limiter_and_retries():
+    sleeps = []
+    limiter = RateLimiter(((20, 1),), clock=lambda: sum(sleeps), sleep=sleeps.append)
+    client = RiotAPIClient("test-key", rate_limiter=limiter)
+    responses = [
+        FakeResponse(429, headers={"Retry-After": "2", "X-Rate-Limit-Type": "application"}),
+        FakeResponse(200, {"puuid": "self"}),
+    ]
+
+    class SequenceSession:
+        def get(self, url, params=None, timeout=None):
+            return responses.pop(0)
+
+    client.session = SequenceSession()
+
+    assert client.get_puuid_by_riot_id("Streamer", "NA1", "NA1") == "self"
+    assert sleeps == [2.0]
+
+
+def test_incremental_scan_only_fetches_matches_since_last_cursor(tmp_path):
+    storage = Storage(tmp_path / "hibs.db")
+    client = build_client(MATCH_ROUTES, match_store=storage, incremental=True)
+    client.analyze_match_history("self", ["enemy", "ally"], "NA1")
+
+    new_match = build_match("NA1_3", 1711000000000, [
+        participant("self", 100, True, 81),
+        participant("enemy", 100, True, 157),
+    ])
+    client.session = FakeSession({"/ids": ["NA1_3"], "/matches/NA1_3": new_match})
+
+    history = client.analyze_match_history("self", ["enemy", "ally"], "NA1")
+
+    assert client.session.params[0]["startTime"] == (1710000000000 + 1_800_000) // 1000
+    assert [url for url in client.session.calls if "/matches/NA1_" in url] == [
+        "https://americas.api.riotgames.com/lol/match/v5/matches/NA1_3",
+    ]
+    assert [match["matchId"] for match in history["enemy"]["matches"]] == ["NA1_3", "NA1_2"]
+    assert history["ally"]["totalGames"] == 1
+    assert storage.load_match_history_ids("self") == ["NA1_3", "NA1_2", "NA1_1"]
+
+
+def test_incremental_scan_retries_matches_whose_download_failed(tmp_path):
+    storage = Storage(tmp_path / "hibs.db")
+    routes = {**MATCH_ROUTES, "/ids": ["NA1_3", "NA1_2", "NA1_1"]}
+    routes["/matches/NA1_3"] = build_match("NA1_3", 1711000000000, [
+        participant("self", 100, True, 81),
+        participant("enemy", 100, True, 157),
+    ])
+    failing_routes = {suffix: payload for suffix, payload in routes.items() if suffix != "/matches/NA1_2"}
+    client = build_client(failing_routes, match_store=storage, incremental=True)
+    client.analyze_match_history("self", ["enemy", "ally"], "NA1")
+
+    client.session = FakeSession({**routes, "/ids": []})
+    history = client.analyze_match_history("self", ["enemy", "ally"], "NA1")
+
+    assert "https://americas.api.riotgames.com/lol/match/v5/matches/NA1_2" in client.session.calls
+    assert [match["matchId"] for match in history["enemy"]["matches"]] == ["NA1_3", "NA1_2"]
+    assert storage.load_match_history_ids("self") == ["NA1_3", "NA1_2", "NA1_1"]
+
+
+def test_concurrent_callers_share_one_in_flight_request():
+    release = threading.Event()
+    calls = []
+
+    class BlockingSession:
+        def get(self, url, params=None, timeout=None):
+            calls.append(url)
+            release.wait(timeout=5)
+            return FakeResponse(200, {"puuid": "self"})
+
+    client = RiotAPIClient("test-key")
+    client.session = BlockingSession()
+    results = []
+    threads = [
+        threading.Thread(
+            target=lambda: results.append(client.get_puuid_by_riot_id("Streamer", "NA1", "NA1"))
+        )
+        for _ in range(3)
+    ]
+
+    for thread in threads:
+        thread.start()
+    time.sleep(0.2)
+    release.set()
+    for thread in threads:
+        thread.join(timeout=5)
+
+    assert results == ["self", "self", "self"]
+    assert len(calls) == 1
+
+
+def test_account_lookups_are_served_from_cache():
+    client = build_client({"/by-riot-id/Streamer/NA1": {"puuid": "self"}})
+
+    assert client.get_puuid_by_riot_id("Streamer", "NA1", "NA1") == "self"
+    assert client.get_puuid_by_riot_id("Streamer", "NA1", "NA1") == "self"
+
+    assert len(client.session.calls) == 1
+    assert client.cache_stats()["hits"] == 1
+
+
+def test_disabled_cache_always_hits_the_network():
+    client = build_client({"/by-riot-id/Streamer/NA1": {"puuid": "self"}}, cache_enabled=False)
+
+    client.get_puuid_by_riot_id("Streamer", "NA1", "NA1")
+    client.get_puuid_by_riot_id("Streamer", "NA1", "NA1")
+
+    assert len(client.session.calls) == 2
+    assert client.cache_stats() is None
+
+
+def test_progress_callback_reports_partial_history_per_match(tmp_path):
+    client = build_client(MATCH_ROUTES, match_store=Storage(tmp_path / "hibs.db"))
+    progress = []
+
+    history = client.analyze_match_history(
+        "self",
+        ["enemy", "ally"],
+        "NA1",
+        progress_callback=lambda completed, total, partial: progress.append((completed, total, set(partial))),
+    )
+
+    assert progress == [(0, 2, set()), (1, 2, {"enemy"}), (2, 2, {"enemy", "ally"})]
+    assert set(history) == {"enemy", "ally"}
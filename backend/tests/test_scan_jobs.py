@@ -0,0 +1,54 @@
+import threading
+
+import pytest
+
+from scan_jobs import ScanJobManager, ScanQueueFullError
+
+
+class RecordingScanService:
+    def __init__(self, release=None):
+        self.release = release
+
+    def run_manual_scan(self, game_name, tag_line, region, *, source="manual", on_event=None, explain=False):
+        if self.release is not None:
+            self.release.wait(timeout=5)
+        if game_name == "Missing":
+            raise ValueError("Player not found")
+        on_event("progress", {"completedMatches": 2, "totalMatches": 2, "repeatPlayers": [{"puuid": "enemy"}]})
+        return {"trackedProfile": {"gameName": game_name}, "repeatPlayers": []}
+
+
+def test_job_runs_in_background_and_reports_progress_and_result():
+    manager = ScanJobManager(RecordingScanService(), max_workers=1)
+
+    job = manager.submit("Streamer", "NA1", "NA1")
+    manager.shutdown(wait=True)
+    finished = manager.get(job["id"])
+
+    assert job["status"] == "queued"
+    assert finished["status"] == "succeeded"
+    assert finished["progress"] == {"completedMatches": 2, "totalMatches": 2, "repeatPlayersFound": 1}
+    assert finished["result"]["trackedProfile"]["gameName"] == "Streamer"
+    assert finished["startedAt"] and finished["finishedAt"]
+
+
+def test_failed_job_records_error_status():
+    manager = ScanJobManager(RecordingScanService(), max_workers=1)
+
+    job = manager.submit("Missing", "NA1", "NA1")
+    manager.shutdown(wait=True)
+
+    assert manager.get(job["id"])["error"] == {"message": "Player not found", "status": 404}
+    assert manager.get("unknown") is None
+
+
+def test_queue_rejects_scans_beyond_pending_limit():
+    release = threading.Event()
+    manager = ScanJobManager(RecordingScanService(release), max_workers=1, max_pending=1)
+
+    manager.submit("Streamer", "NA1", "NA1")
+    with pytest.raises(ScanQueueFullError):
+        manager.submit("Streamer", "NA1", "NA1")
+
+    release.set()
+    manager.shutdown(wait=True)
@@ -127,3 +127,38 @@ def test_normalize_riot_id_fields_prefers_riot_id_over_legacy_summoner_name():
         "riot_id": "Enemy#TAG",
     }
 
+
+
+def test_stream_manual_scan_emits_lobby_progress_and_result(tmp_path):
+    class ProgressRiotClient(FakeRiotClient):
+        def analyze_match_history(self, user_puuid, lobby_puuids, region, match_count=100, progress_callback=None):
+            history = super().analyze_match_history(user_puuid, lobby_puuids, region, match_count)
+            progress_callback(0, 1, {})
+            progress_callback(1, 1, history)
+            return history
+
+    storage = Storage(tmp_path / "hibs.db")
+    service = ScanService(storage=storage, riot_client=ProgressRiotClient())
+
+    events = list(service.stream_manual_scan("Streamer", "NA1", "NA1"))
+
+    assert [name for name, _data in events] == ["lobby", "progress", "progress", "result"]
+    assert events[0][1]["currentGame"]["gameId"] == 101
+    assert events[1][1]["repeatPlayers"] == []
+    assert events[2][1]["completedMatches"] == 1
+    assert events[2][1]["repeatPlayers"][0]["puuid"] == "enemy-puuid"
+    assert events[2][1]["repeatPlayers"][0]["relation"] == "enemy"
+    assert events[3][1]["repeatPlayers"][0]["risk"]["tier"]
+    assert storage.count_encounters() == 1
+
+
+def test_stream_manual_scan_reports_missing_player_as_error_event(tmp_path):
+    class MissingPlayerClient(FakeRiotClient):
+        def get_puuid_by_riot_id(self, game_name, tag_line, region):
+            return None
+
+    service = ScanService(storage=Storage(tmp_path / "hibs.db"), riot_client=MissingPlayerClient())
+
+    events = list(service.stream_manual_scan("Streamer", "NA1", "NA1"))
+
+    assert events == [("error", {"error": "Player not found", "status": 404})]
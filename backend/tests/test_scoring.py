@@ -1,4 +1,14 @@
-from scoring import score_repeat_player
+import random
+
+from scoring import (
+    DECAYED_STATS_COLUMNS,
+    STATS_COLUMNS,
+    decayed_count,
+    explain_ranked_players,
+    score_player_group,
+    score_repeat_player,
+    score_repeat_players,
+)
 
 
 def test_one_off_encounter_stays_low():
@@ -44,3 +54,93 @@ def test_ally_heavy_pattern_gets_penalized():
     })
 
     assert result["score"] < 50
+
+
+def test_batch_scoring_matches_the_scalar_function_row_for_row():
+    rng = random.Random(7)
+    rows = []
+    for _ in range(2000):
+        total = rng.randint(1, 12)
+        enemy = rng.randint(0, total)
+        ally = rng.randint(0, total - enemy)
+        rows.append({
+            "total_encounters": total,
+            "encounters_last_30d": rng.randint(0, total),
+            "distinct_days_last_30d": rng.randint(0, 6),
+            "encounters_last_7d": rng.randint(0, 5),
+            "consecutive_scan_hits": rng.randint(0, 4),
+            "enemy_ratio": enemy / total,
+            "ally_ratio": ally / total,
+        })
+    # Ratios that land exactly on a rounding boundary.
+    rows.append({**rows[0], "enemy_ratio": 0.6, "ally_ratio": 0.4})
+    rows.append({**rows[0], "enemy_ratio": 0.0, "ally_ratio": 0.75})
+
+    batch = score_repeat_players({name: [row[name] for row in rows] for name in STATS_COLUMNS})
+
+    expected = [score_repeat_player(row) for row in rows]
+    assert batch["score"] == [result["score"] for result in expected]
+    assert batch["tier"] == [result["tier"] for result in expected]
+
+
+def test_reasons_are_only_built_when_asked_for():
+    stats = {
+        "total_encounters": 4,
+        "encounters_last_30d": 4,
+        "distinct_days_last_30d": 3,
+        "encounters_last_7d": 3,
+        "consecutive_scan_hits": 2,
+        "enemy_ratio": 0.75,
+        "ally_ratio": 0.25,
+    }
+    players = [{"risk": score_repeat_player(stats, include_reasons=False)} for _ in range(7)]
+
+    explain_ranked_players(players, [stats] * 7)
+
+    assert players[0]["risk"]["score"] == score_repeat_player(stats)["score"]
+    assert [bool(player["risk"]["reasons"]) for player in players] == [True] * 5 + [False] * 2
+    explain_ranked_players(players, [stats] * 7, explain=True)
+    assert all(player["risk"]["reasons"] == score_repeat_player(stats)["reasons"] for player in players)
+
+
+def test_decayed_counter_halves_every_half_life():
+    week_ms = 7 * 86_400_000
+
+    assert decayed_count(4.0, 0, week_ms) == 2.0
+    assert decayed_count(4.0, 0, 2 * week_ms) == 1.0
+    assert decayed_count(4.0, None, week_ms) == 0.0
+
+
+def test_decayed_mode_rewards_recent_bursts_and_batches_exactly():
+    base = {"total_encounters": 4, "consecutive_scan_hits": 0, "enemy_ratio": 0.75, "ally_ratio": 0.25}
+    burst = score_repeat_player({**base, "recent_encounters": 3.2}, mode="decayed")
+    stale = score_repeat_player({**base, "recent_encounters": 0.1}, mode="decayed")
+
+    assert burst["score"] > stale["score"]
+    assert any("after decay" in reason for reason in burst["reasons"])
+
+    rng = random.Random(11)
+    rows = [
+        {
+            "total_encounters": rng.randint(1, 12),
+            "recent_encounters": rng.uniform(0, 6),
+            "consecutive_scan_hits": rng.randint(0, 4),
+            "enemy_ratio": rng.random(),
+            "ally_ratio": rng.random(),
+        }
+        for _ in range(500)
+    ]
+    batch = score_repeat_players({name: [row[name] for row in rows] for name in DECAYED_STATS_COLUMNS}, mode="decayed")
+
+    assert batch["score"] == [score_repeat_player(row, mode="decayed")["score"] for row in rows]
+
+
+def test_group_risk_builds_on_the_riskiest_member():
+    once = score_player_group([40, 10], shared_matches=1, enemy_matches=0)
+    recurring = score_player_group([40, 10], shared_matches=4, enemy_matches=3)
+
+    assert once["score"] == 40
+    assert recurring["score"] == 40 + 15 + 10
+    assert recurring["tier"] == "watch"
+    assert "shared a side in 4 matches" in recurring["reasons"]
+    assert score_player_group([95, 90, 80], shared_matches=9, enemy_matches=9)["score"] == 100
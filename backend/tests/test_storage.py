@@ -1,5 +1,15 @@
+import re
 import sqlite3
+import threading
+import time
+from collections import Counter
+from itertools import combinations
+from datetime import datetime, timedelta, timezone
 
+import pytest
+
+import storage as storage_module
+from scoring import decay_factor, score_repeat_player
 from storage import Storage
 
 
@@ -15,6 +25,14 @@ def test_initialize_creates_core_tables(tmp_path):
     assert "watch_notes" in tables
 
 
+def test_new_databases_start_in_incremental_auto_vacuum_mode(tmp_path):
+    Storage(tmp_path / "hibs.db").close()
+
+    with sqlite3.connect(tmp_path / "hibs.db") as connection:
+        assert connection.execute("PRAGMA auto_vacuum").fetchone()[0] == 2
+        assert connection.execute("PRAGMA journal_mode").fetchone()[0] == "wal"
+
+
 def test_upsert_tracked_profile_is_idempotent(tmp_path):
     storage = Storage(tmp_path / "hibs.db")
 
@@ -141,3 +159,924 @@ def test_watch_note_round_trip_and_summary(tmp_path):
     overview = storage.load_memory_overview(profile_id)
     assert overview["topRepeatPlayers"][0]["risk"]["tier"] in {"background", "repeat", "watch", "high-attention"}
     assert overview["topRepeatPlayers"][0]["watchNote"] == "keep an eye on this account"
+
+
+def test_match_details_round_trip(tmp_path):
+    storage = Storage(tmp_path / "hibs.db")
+    payload = {"metadata": {"matchId": "NA1_1"}, "info": {"gameCreation": 1, "participants": []}}
+
+    assert storage.get_match_details("NA1_1") is None
+
+    storage.save_match_details("NA1_1", payload)
+
+    assert storage.get_match_details("NA1_1") == payload
+    assert storage.indexed_match_ids(["NA1_1", "NA1_2"]) == set()
+
+
+def test_match_participants_index_answers_lobby_overlap(tmp_path):
+    storage = Storage(tmp_path / "hibs.db")
+    storage.save_match_details("NA1_1", {
+        "info": {
+            "gameCreation": 1710000000000,
+            "queueId": 420,
+            "participants": [
+                {"puuid": "self", "teamId": 100, "win": True, "championId": 81},
+                {"puuid": "enemy", "teamId": 200, "win": False, "championId": 157},
+                {"puuid": "stranger", "teamId": 200, "win": False, "championId": 3},
+            ],
+        },
+    })
+
+    overlaps = storage.find_match_overlaps("self", ["enemy", "absent"], ["NA1_1", "NA1_2"])
+
+    assert storage.indexed_match_ids(["NA1_1", "NA1_2"]) == {"NA1_1"}
+    assert overlaps == [{
+        "matchId": "NA1_1",
+        "gameCreation": 1710000000000,
+        "queueId": 420,
+        "userTeamId": 100,
+        "userWin": True,
+        "userChampionId": 81,
+        "puuid": "enemy",
+        "teamId": 200,
+        "championId": 157,
+    }]
+
+
+def test_record_scan_persists_rows_in_a_single_commit(tmp_path):
+    storage = Storage(tmp_path / "hibs.db")
+    profile_id = storage.upsert_tracked_profile("self", "Streamer", "NA1", "NA1")
+    commits = []
+    connection = storage._writer_connection
+    connection.set_trace_callback(
+        lambda statement: commits.append(statement) if statement == "COMMIT" else None
+    )
+
+    scan_id = storage.record_scan(
+        profile_id,
+        "manual",
+        "NA1",
+        123,
+        "CLASSIC",
+        "ok",
+        0.0,
+        2,
+        players=[
+            {"puuid": "self", "game_name": "Streamer", "tag_line": "NA1", "region": "NA1", "resolution_status": "tracked"},
+            {"puuid": "target", "game_name": "Enemy", "tag_line": "TAG", "region": "NA1", "resolution_status": "resolved"},
+        ],
+        participants=[
+            {"player_puuid": "self", "relation": "self", "champion_id": 81, "team_id": 100},
+            {"player_puuid": "target", "relation": "enemy", "champion_id": 157, "team_id": 200},
+        ],
+        encounters=[
+            {"player_puuid": "target", "match_id": "MATCH-1", "played_at": "2026-03-16T00:00:00Z", "relation": "enemy", "champion_id": 157, "queue_id": 420, "won": 1},
+            {"player_puuid": "target", "match_id": "MATCH-2", "played_at": "2026-03-17T00:00:00Z", "relation": "enemy", "champion_id": 157, "queue_id": 420, "won": 0},
+        ],
+    )
+    connection.set_trace_callback(None)
+
+    assert commits == ["COMMIT"]
+    assert storage.count_encounters() == 2
+    assert storage.tracked_profile_has_player(profile_id, "target") is True
+    assert storage.load_recent_scans(profile_id)[0]["id"] == scan_id
+
+
+def test_connections_are_pooled_and_use_wal(tmp_path):
+    storage = Storage(tmp_path / "hibs.db")
+
+    with storage._connect() as first:
+        assert first.execute("PRAGMA journal_mode").fetchone()[0] == "wal"
+        assert first.execute("PRAGMA synchronous").fetchone()[0] == 1
+    with storage._connect() as second:
+        pass
+
+    assert first is second
+
+    storage.close()
+    assert storage._pool.empty()
+    assert storage.list_tables()
+
+
+def test_reads_are_not_blocked_by_an_open_write_transaction(tmp_path):
+    storage = Storage(tmp_path / "hibs.db")
+    profile_id = storage.upsert_tracked_profile("self", "Streamer", "NA1", "NA1")
+
+    writer = sqlite3.connect(tmp_path / "hibs.db")
+    writer.execute("BEGIN IMMEDIATE")
+    writer.execute("UPDATE tracked_profiles SET game_name = 'Renamed' WHERE id = ?", (profile_id,))
+
+    assert storage.get_tracked_profile(profile_id)["gameName"] == "Streamer"
+
+    writer.commit()
+    writer.close()
+    assert storage.get_tracked_profile(profile_id)["gameName"] == "Renamed"
+
+
+def test_read_connections_refuse_writes(tmp_path):
+    storage = Storage(tmp_path / "hibs.db")
+
+    with pytest.raises(sqlite3.OperationalError):
+        with storage._connect() as connection:
+            connection.execute("INSERT INTO players (puuid, game_name, tag_line, region, resolution_status) VALUES ('p', 'P', 'T', 'NA1', 'resolved')")
+
+
+def start_writer_hold(storage, queued_count):
+    """Occupy the writer thread until ``queued_count`` requests wait behind it (or 5s pass)."""
+    started = threading.Event()
+
+    def hold(connection):
+        started.set()
+        deadline = time.monotonic() + 5
+        while storage._write_queue.qsize() < queued_count and time.monotonic() < deadline:
+            time.sleep(0.005)
+
+    holder = threading.Thread(target=storage._run_write, args=(hold,))
+    holder.start()
+    assert started.wait(5)
+    return holder
+
+
+def join_all(threads):
+    for thread in threads:
+        thread.join(5)
+        assert not thread.is_alive()
+
+
+def test_concurrent_writes_are_group_committed_on_one_thread(tmp_path):
+    storage = Storage(tmp_path / "hibs.db")
+    storage.upsert_tracked_profile("self", "Streamer", "NA1", "NA1")
+    commits = []
+    storage._writer_connection.set_trace_callback(
+        lambda statement: commits.append(statement) if statement == "COMMIT" else None
+    )
+
+    holder = start_writer_hold(storage, 20)
+    threads = [
+        threading.Thread(target=storage.upsert_player, args=(f"p{index}", f"P{index}", "NA1", "NA1", "resolved"))
+        for index in range(20)
+    ]
+    for thread in threads:
+        thread.start()
+    join_all([holder, *threads])
+
+    assert all(storage.get_player(f"p{index}") is not None for index in range(20))
+    # One commit for the held write, one for everything queued behind it.
+    assert commits == ["COMMIT", "COMMIT"]
+
+
+def test_a_failing_write_only_rolls_back_itself(tmp_path):
+    storage = Storage(tmp_path / "hibs.db")
+    errors = []
+
+    def failing_write():
+        try:
+            storage._run_write(lambda connection: connection.execute("INSERT INTO missing_table VALUES (1)"))
+        except sqlite3.OperationalError as error:
+            errors.append(error)
+
+    holder = start_writer_hold(storage, 3)
+    threads = [
+        threading.Thread(target=storage.upsert_tracked_profile, args=("a", "A", "NA1", "NA1")),
+        threading.Thread(target=failing_write),
+        threading.Thread(target=storage.upsert_tracked_profile, args=("b", "B", "NA1", "NA1")),
+    ]
+    for thread in threads:
+        thread.start()
+    join_all([holder, *threads])
+
+    assert len(errors) == 1
+    assert storage.get_tracked_profile_by_riot_id("A", "NA1") is not None
+    assert storage.get_tracked_profile_by_riot_id("B", "NA1") is not None
+
+
+def test_writes_fail_fast_when_the_writer_cannot_start(tmp_path, monkeypatch):
+    storage = Storage(tmp_path / "hibs.db")
+    open_connection = Storage._open_connection
+
+    def broken_writer_connection(self, read_only=True):
+        if not read_only:
+            raise sqlite3.OperationalError("unable to open database file")
+        return open_connection(self, read_only)
+
+    monkeypatch.setattr(Storage, "_open_connection", broken_writer_connection)
+    with pytest.raises(sqlite3.OperationalError):
+        storage.upsert_tracked_profile("self", "Streamer", "NA1", "NA1")
+
+    monkeypatch.setattr(Storage, "_open_connection", open_connection)
+    assert storage.upsert_tracked_profile("self", "Streamer", "NA1", "NA1") == 1
+
+
+def seed_read_path_fixture(storage):
+    profile_id = storage.upsert_tracked_profile("self", "Streamer", "NA1", "NA1")
+    storage.upsert_player("target", "Enemy", "TAG", "NA1", "resolved")
+    scan_id = storage.insert_scan(profile_id, "manual", "NA1", 123, "CLASSIC", "ok", 1.0, 1)
+    storage.insert_scan_participant(scan_id, "target", "enemy", 81, 200)
+    storage.insert_encounter(profile_id, "target", scan_id, "MATCH-1", "2026-03-16T00:00:00Z", "enemy", 81, 157, 1)
+    storage.upsert_watch_note(profile_id, "target", "note")
+    return profile_id
+
+
+def capture_select_statements(storage, read_calls):
+    statements = []
+    storage.close()
+    open_connection = storage._open_connection
+
+    def traced_connection(read_only=True):
+        connection = open_connection(read_only)
+        connection.set_trace_callback(statements.append)
+        return connection
+
+    storage._open_connection = traced_connection
+    for read_call in read_calls:
+        read_call()
+    storage.close()
+    storage._open_connection = open_connection
+    return [statement for statement in statements if statement.lstrip().upper().startswith("SELECT")]
+
+
+def rowid_ordered_aliases(statement, plan):
+    """Aliases a statement reads newest-first by rowid and cuts off with LIMIT."""
+    normalized = " ".join(statement.split())
+    if " LIMIT " not in normalized.upper() or any("TEMP B-TREE" in step for step in plan):
+        return set()
+    return {
+        match.group(1) or match.group(2)
+        for match in re.finditer(r"ORDER BY (?:(\w+)\.id|(\w+)\.rowid) DESC", normalized)
+    }
+
+
+def test_read_methods_never_fall_back_to_table_scans(tmp_path):
+    storage = Storage(tmp_path / "hibs.db")
+    profile_id = seed_read_path_fixture(storage)
+    statements = capture_select_statements(storage, [
+        lambda: storage.get_tracked_profile(profile_id),
+        lambda: storage.get_tracked_profile_by_riot_id("streamer", "na1"),
+        lambda: storage.get_player("target"),
+        lambda: storage.tracked_profile_has_player(profile_id, "target"),
+        lambda: storage.get_watch_note(profile_id, "target"),
+        lambda: storage.load_recent_scans(profile_id),
+        lambda: storage.load_repeat_players(profile_id),
+        lambda: storage.load_repeat_players(profile_id, ["target"]),
+        lambda: storage.load_memory_overview(profile_id),
+        lambda: storage.get_memory_summary(),
+        lambda: storage.count_encounters(),
+        lambda: storage.find_match_overlaps("self", ["target"], ["MATCH-1"]),
+        lambda: storage.indexed_match_ids(["MATCH-1"]),
+        lambda: storage.load_match_history_ids("self"),
+        lambda: storage.get_match_history_cursor("self"),
+        lambda: storage.page_repeat_players(profile_id, limit=1),
+        lambda: storage.page_player_encounters(profile_id, "target", limit=1),
+        lambda: storage.page_scans(profile_id, limit=1),
+        lambda: storage.page_score_timeline(profile_id, "target", limit=1),
+        lambda: storage.load_player_groups(profile_id),
+    ])
+
+    assert statements
+    with sqlite3.connect(tmp_path / "hibs.db") as connection:
+        for statement in statements:
+            plan = [row[3] for row in connection.execute(f"EXPLAIN QUERY PLAN {statement}")]
+            # A bare SCAN is only acceptable when it walks a table in rowid order
+            # to satisfy ORDER BY ... id DESC LIMIT (newest scans first).
+            rowid_walks = {f"SCAN {alias}" for alias in rowid_ordered_aliases(statement, plan)}
+            table_scans = [
+                step for step in plan
+                if step.startswith("SCAN ")
+                and " USING " not in step
+                and step not in ("SCAN CONSTANT ROW", *rowid_walks)
+            ]
+            assert not table_scans, (statement, plan)
+
+
+def test_only_rowid_ordered_limits_are_exempt_from_the_scan_check():
+    assert rowid_ordered_aliases(
+        "SELECT s.id FROM scans s ORDER BY s.id DESC LIMIT ?", ["SCAN s"]
+    ) == {"s"}
+    assert rowid_ordered_aliases(
+        "SELECT id FROM encounters WHERE played_at_ms < ? LIMIT ?", ["SCAN encounters"]
+    ) == set()
+    assert rowid_ordered_aliases(
+        "SELECT id FROM encounters ORDER BY won DESC LIMIT ?", ["SCAN encounters", "USE TEMP B-TREE FOR ORDER BY"]
+    ) == set()
+
+
+def test_read_path_indexes_are_applied_once_through_user_version(tmp_path):
+    database_path = tmp_path / "hibs.db"
+    Storage(database_path).close()
+    storage = Storage(database_path)
+    storage.close()
+
+    with sqlite3.connect(database_path) as connection:
+        user_version = connection.execute("PRAGMA user_version").fetchone()[0]
+        indexes = {row[0] for row in connection.execute("SELECT name FROM sqlite_master WHERE type = 'index'")}
+
+    assert user_version == storage._migrations()[-1][0]
+    assert {
+        "idx_encounters_profile_player_played_ms",
+        "idx_scans_profile",
+        "idx_tracked_profiles_riot_id",
+        "idx_player_match_history_recent",
+    } <= indexes
+
+
+def seed_stats_fixture(storage):
+    now = datetime.now(timezone.utc)
+    profile_id = storage.upsert_tracked_profile("self", "Streamer", "NA1", "NA1")
+    storage.upsert_player("target", "Enemy", "TAG", "NA1", "resolved")
+    storage.upsert_player("friend", "Friend", "TAG", "NA1", "resolved")
+    scan_ids = [
+        storage.insert_scan(profile_id, "manual", "NA1", 100 + index, "CLASSIC", "ok", 1.0, 0)
+        for index in range(3)
+    ]
+    for scan_id in scan_ids:
+        storage.insert_scan_participant(scan_id, "target", "enemy", 81, 200)
+    storage.insert_scan_participant(scan_ids[0], "friend", "ally", 12, 100)
+
+    storage.insert_encounters([
+        {
+            "tracked_profile_id": profile_id,
+            "player_puuid": "target",
+            "scan_id": scan_ids[-1],
+            "match_id": f"MATCH-{days_ago}",
+            "played_at": (now - timedelta(days=days_ago)).isoformat(),
+            "relation": "enemy",
+            "champion_id": 81,
+            "queue_id": 420,
+            "won": days_ago % 2,
+        }
+        for days_ago in (1, 2, 3, 12, 45)
+    ])
+    storage.insert_encounter(profile_id, "friend", scan_ids[0], "MATCH-1", (now - timedelta(days=1)).isoformat(), "ally", 12, 420, 1)
+    # An upsert that flips sides must move the counters, not add to them.
+    storage.insert_encounter(profile_id, "target", scan_ids[-1], "MATCH-45", (now - timedelta(days=45)).isoformat(), "ally", 81, 420, 0)
+    return profile_id
+
+
+def test_player_encounter_stats_track_encounter_writes(tmp_path):
+    storage = Storage(tmp_path / "hibs.db")
+    profile_id = seed_stats_fixture(storage)
+
+    players = {player["puuid"]: player for player in storage.load_repeat_players(profile_id)}
+
+    assert players["target"]["stats"] == {
+        "total_encounters": 5,
+        "recent_encounters": pytest.approx(sum(0.5 ** (days_ago / 7) for days_ago in (1, 2, 3, 12, 45))),
+        "encounters_last_30d": 4,
+        "distinct_days_last_30d": 4,
+        "encounters_last_7d": 3,
+        "consecutive_scan_hits": 3,
+        "enemy_ratio": 0.8,
+        "ally_ratio": 0.2,
+    }
+    assert players["target"]["wins"] == 2
+    assert players["friend"]["stats"]["consecutive_scan_hits"] == 0
+    assert players["friend"]["stats"]["ally_ratio"] == 1.0
+    assert [player["puuid"] for player in storage.load_repeat_players(profile_id, ["friend"])] == ["friend"]
+
+
+def test_player_encounter_stats_migration_backfills_existing_encounters(tmp_path):
+    database_path = tmp_path / "hibs.db"
+    storage = Storage(database_path)
+    profile_id = seed_stats_fixture(storage)
+    expected = storage.load_repeat_players(profile_id)
+    storage.close()
+
+    with sqlite3.connect(database_path) as connection:
+        for trigger in ("insert", "update", "delete"):
+            connection.execute(f"DROP TRIGGER trg_encounters_stats_{trigger}")
+        connection.execute("DROP TRIGGER trg_scan_participants_stats_insert")
+        connection.execute("DROP TABLE player_encounter_stats")
+        connection.execute("PRAGMA user_version = 1")
+
+    # The decayed counter is evaluated at read time, so it drifts between reads.
+    assert Storage(database_path).load_repeat_players(profile_id) == [
+        {**player, "stats": pytest.approx(player["stats"])} for player in expected
+    ]
+
+
+def test_decayed_encounter_counter_follows_out_of_order_updates_and_deletes(tmp_path):
+    database_path = tmp_path / "hibs.db"
+    storage = Storage(database_path)
+    profile_id = seed_stats_fixture(storage)
+    # An older match arriving late, a match moved in time, and a match removed.
+    storage.insert_encounter(profile_id, "target", 3, "MATCH-20", "2026-01-01T00:00:00Z", "enemy", 81, 420, 0)
+    with sqlite3.connect(database_path) as connection:
+        connection.execute("UPDATE encounters SET played_at_ms = played_at_ms - 86400000 WHERE match_id = 'MATCH-2'")
+        connection.execute("DELETE FROM encounters WHERE match_id = 'MATCH-12'")
+        rows = connection.execute(
+            "SELECT played_at_ms FROM encounters WHERE player_puuid = 'target'"
+        ).fetchall()
+        value, updated_at_ms = connection.execute(
+            "SELECT recent_encounters, recent_encounters_at_ms FROM player_encounter_stats WHERE player_puuid = 'target'"
+        ).fetchone()
+
+    assert updated_at_ms == max(played_at_ms for (played_at_ms,) in rows)
+    assert value == pytest.approx(sum(decay_factor(updated_at_ms - played_at_ms) for (played_at_ms,) in rows))
+
+
+def test_decayed_scoring_mode_never_reads_encounter_rows(tmp_path):
+    storage = Storage(tmp_path / "hibs.db", scoring_mode="decayed")
+    profile_id = seed_stats_fixture(storage)
+
+    statements = capture_select_statements(
+        storage,
+        [
+            lambda: storage.page_repeat_players(profile_id),
+            lambda: storage.load_repeat_players(profile_id),
+            storage.get_memory_summary,
+        ],
+    )
+    target = storage.load_repeat_players(profile_id, ["target"])[0]
+
+    assert statements
+    assert not [statement for statement in statements if re.search(r"\bFROM encounters\b", statement)]
+    assert "encounters_last_30d" not in target["stats"]
+    assert storage.page_repeat_players(profile_id)["items"][0]["risk"]["score"] == (
+        score_repeat_player(target["stats"], mode="decayed")["score"]
+    )
+
+
+def test_switching_scoring_mode_rescores_stored_scores(tmp_path):
+    database_path = tmp_path / "hibs.db"
+    storage = Storage(database_path)
+    profile_id = seed_stats_fixture(storage)
+    storage.get_memory_summary()
+    storage.close()
+
+    storage = Storage(database_path, scoring_mode="decayed")
+    summary = storage.get_memory_summary()
+    stats = {player["puuid"]: player["stats"] for player in storage.load_repeat_players(profile_id)}
+
+    assert {player["puuid"]: player["risk"]["score"] for player in summary["topRepeatPlayers"]} == {
+        puuid: score_repeat_player(player_stats, mode="decayed")["score"] for puuid, player_stats in stats.items()
+    }
+    with pytest.raises(ValueError):
+        Storage(database_path, scoring_mode="hourly")
+
+
+def test_rebuilt_score_snapshots_replay_scores_as_of_each_scan(tmp_path):
+    storage = Storage(tmp_path / "hibs.db")
+    profile_id = seed_stats_fixture(storage)
+    now = datetime.now(timezone.utc)
+    scan_ids = [scan["id"] for scan in reversed(storage.load_recent_scans(profile_id))]
+    with sqlite3.connect(tmp_path / "hibs.db") as connection:
+        for scan_id, days_ago in zip(scan_ids, (20, 2.5)):
+            created_at = (now - timedelta(days=days_ago)).strftime("%Y-%m-%d %H:%M:%S")
+            connection.execute("UPDATE scans SET created_at = ? WHERE id = ?", (created_at, scan_id))
+
+    report = storage.rebuild_score_snapshots()
+    timeline = storage.page_score_timeline(profile_id, "target")["items"]
+    live = storage.load_repeat_players(profile_id, ["target"])[0]
+
+    assert report["trackedProfiles"] == 1 and report["scans"] == 3 and report["snapshots"] == 3
+    # Only the 45-day-old encounter existed at the first scan, the 12- and
+    # 3-day-old ones joined by the second, and the friend's came later still.
+    assert [item["scanId"] for item in timeline] == scan_ids
+    assert [item["totalGames"] for item in timeline] == [1, 3, 5]
+    assert timeline[-1]["score"] == score_repeat_player(live["stats"])["score"]
+    assert storage.page_score_timeline(profile_id, "friend")["items"] == []
+
+    first_page = storage.page_score_timeline(profile_id, "target", limit=2)
+    second_page = storage.page_score_timeline(profile_id, "target", limit=2, cursor=first_page["nextCursor"])
+    assert first_page["items"] + second_page["items"] == timeline
+    assert second_page["nextCursor"] is None
+
+    # Rebuilding replaces a profile's snapshots instead of adding to them.
+    assert storage.rebuild_score_snapshots([profile_id])["snapshots"] == 3
+    assert storage.page_score_timeline(profile_id, "target")["items"] == timeline
+
+
+def test_rebuilt_score_snapshots_follow_the_scoring_mode(tmp_path):
+    storage = Storage(tmp_path / "hibs.db", scoring_mode="decayed")
+    profile_id = seed_stats_fixture(storage)
+
+    storage.rebuild_score_snapshots()
+    latest = storage.page_score_timeline(profile_id, "target")["items"][-1]
+    live = storage.load_repeat_players(profile_id, ["target"])[0]
+
+    assert latest["score"] == score_repeat_player(live["stats"], mode="decayed")["score"]
+
+
+def seed_group_fixture(storage):
+    profile_id = storage.upsert_tracked_profile("self", "Streamer", "NA1", "NA1")
+    for puuid in "abcde":
+        storage.upsert_player(puuid, puuid.upper(), "TAG", "NA1", "resolved")
+    scan_id = storage.insert_scan(profile_id, "manual", "NA1", 100, "CLASSIC", "ok", 1.0, 0)
+    lobbies = {
+        "MATCH-1": {"a": "enemy", "b": "enemy", "c": "enemy", "d": "ally"},
+        "MATCH-2": {"a": "enemy", "b": "enemy", "c": "enemy", "e": "enemy"},
+        "MATCH-3": {"a": "ally", "b": "ally", "d": "enemy"},
+    }
+    storage.insert_encounters([
+        {
+            "tracked_profile_id": profile_id,
+            "player_puuid": puuid,
+            "scan_id": scan_id,
+            "match_id": match_id,
+            "played_at": f"2026-03-1{index}T00:00:00Z",
+            "relation": relation,
+            "champion_id": 81,
+            "queue_id": 420,
+            "won": 0,
+        }
+        for index, (match_id, lobby) in enumerate(lobbies.items(), start=1)
+        for puuid, relation in lobby.items()
+    ])
+    return profile_id
+
+
+def count_groups_by_brute_force(database_path, size):
+    """Count same-side groups of ``size`` straight from encounter rows."""
+    sides = {}
+    with sqlite3.connect(database_path) as connection:
+        for profile_id, match_id, relation, puuid in connection.execute(
+            "SELECT tracked_profile_id, match_id, relation, player_puuid FROM encounters"
+        ):
+            sides.setdefault((profile_id, match_id, relation), []).append(puuid)
+    counts = Counter()
+    for (profile_id, _match_id, _relation), puuids in sides.items():
+        for group in combinations(sorted(puuids), size):
+            counts[(profile_id, *group)] += 1
+    return dict(counts)
+
+
+def stored_group_counts(database_path, table):
+    with sqlite3.connect(database_path) as connection:
+        rows = connection.execute(f"SELECT * FROM {table}").fetchall()
+    return {row[:-3]: row[-3] for row in rows}
+
+
+def test_player_groups_are_counted_incrementally_and_follow_side_flips(tmp_path):
+    database_path = tmp_path / "hibs.db"
+    storage = Storage(database_path)
+    profile_id = seed_group_fixture(storage)
+
+    assert stored_group_counts(database_path, "player_pair_stats") == count_groups_by_brute_force(database_path, 2)
+    assert stored_group_counts(database_path, "player_triad_stats") == count_groups_by_brute_force(database_path, 3)
+    assert stored_group_counts(database_path, "player_pair_stats")[(profile_id, "a", "b")] == 3
+
+    # "b" moves to the enemy side of MATCH-3: it leaves its pair with "a" there.
+    storage.insert_encounter(profile_id, "b", 1, "MATCH-3", "2026-03-13T00:00:00Z", "enemy", 81, 420, 0)
+
+    assert stored_group_counts(database_path, "player_pair_stats") == count_groups_by_brute_force(database_path, 2)
+    assert stored_group_counts(database_path, "player_triad_stats") == count_groups_by_brute_force(database_path, 3)
+
+    groups = storage.load_player_groups(profile_id)
+    # Pairs that met once (such as "b" and "d" after the flip) do not recur.
+    assert sorted([player["puuid"] for player in pair["players"]] for pair in groups["pairs"]) == [
+        ["a", "b"],
+        ["a", "c"],
+        ["b", "c"],
+    ]
+    assert [[player["puuid"] for player in triad["players"]] for triad in groups["triads"]] == [["a", "b", "c"]]
+    triad = groups["triads"][0]
+    assert triad["sharedMatches"] == 2 and triad["enemyMatches"] == 2
+    assert triad["risk"]["score"] >= max(player["score"] for player in triad["players"])
+    assert len(storage.load_player_groups(profile_id, limit=1)["pairs"]) == 1
+
+
+def test_player_groups_migration_backfills_existing_encounters(tmp_path):
+    database_path = tmp_path / "hibs.db"
+    storage = Storage(database_path)
+    seed_group_fixture(storage)
+    storage.close()
+
+    with sqlite3.connect(database_path) as connection:
+        connection.execute("DROP TRIGGER trg_encounters_groups_insert")
+        connection.execute("DROP TRIGGER trg_encounters_groups_update")
+        connection.execute("DELETE FROM player_pair_stats")
+        connection.execute("DROP TABLE player_triad_stats")
+        connection.execute("PRAGMA user_version = 10")
+
+    Storage(database_path).close()
+
+    assert stored_group_counts(database_path, "player_pair_stats") == count_groups_by_brute_force(database_path, 2)
+    assert stored_group_counts(database_path, "player_triad_stats") == count_groups_by_brute_force(database_path, 3)
+
+
+def test_memory_summary_query_count_does_not_grow_with_tracked_profiles(tmp_path):
+    storage = Storage(tmp_path / "hibs.db")
+    seed_stats_fixture(storage)
+    # The one-off look for scores left by another scoring mode is not per request.
+    storage._invalidate_other_mode_scores()
+    single_profile_statements = capture_select_statements(storage, [storage.get_memory_summary])
+
+    for index in range(3):
+        profile_id = storage.upsert_tracked_profile(f"self-{index}", f"Streamer{index}", "NA1", "NA1")
+        scan_id = storage.insert_scan(profile_id, "manual", "NA1", 200 + index, "CLASSIC", "ok", 1.0, 1)
+        storage.insert_encounter(profile_id, "friend", scan_id, f"OTHER-{index}", "2026-03-16T00:00:00Z", "enemy", 12, 420, 0)
+    summary_statements = capture_select_statements(storage, [storage.get_memory_summary])
+    summary = storage.get_memory_summary()
+
+    assert len(summary_statements) == len(single_profile_statements)
+    assert summary["stats"]["trackedProfileCount"] == 4
+    assert summary["stats"]["repeatPlayerCount"] == 5
+    assert summary["topRepeatPlayers"][0]["puuid"] == "target"
+    assert summary["topRepeatPlayers"][0]["trackedProfileName"] == "Streamer#NA1"
+    assert len(summary["topRepeatPlayers"]) == 5
+
+
+def test_memory_summary_only_rescores_top_candidates_once_scores_are_fresh(tmp_path, monkeypatch):
+    storage = Storage(tmp_path / "hibs.db")
+    profile_id, _scan_ids = seed_many_players(storage, 8)
+    storage.get_memory_summary()
+    scored = []
+    monkeypatch.setattr(storage_module, "score_repeat_player", lambda stats, **kwargs: scored.append(stats) or score_repeat_player(stats, **kwargs))
+
+    summary = storage.get_memory_summary(top_player_limit=1)
+
+    # Only the top candidate and the fixed spares are scored again.
+    assert len(scored) == 1 + storage_module.SUMMARY_CANDIDATE_OVERFETCH
+    assert summary["stats"]["repeatPlayerCount"] == 8
+    assert [player["puuid"] for player in summary["topRepeatPlayers"]] == [
+        storage.page_repeat_players(profile_id, limit=1)["items"][0]["puuid"]
+    ]
+
+
+def test_memory_summary_breaks_ties_in_sql_instead_of_rescoring_them(tmp_path, monkeypatch):
+    storage = Storage(tmp_path / "hibs.db")
+    profile_id = storage.upsert_tracked_profile("self", "Streamer", "NA1", "NA1")
+    scan_id = storage.insert_scan(profile_id, "manual", "NA1", 100, "CLASSIC", "ok", 1.0, 0)
+    played_at = (datetime.now(timezone.utc) - timedelta(days=1)).isoformat()
+    storage.upsert_players([
+        {"puuid": f"p{index:03d}", "game_name": f"Player{index:03d}", "tag_line": "TAG", "region": "NA1", "resolution_status": "resolved"}
+        for index in range(200)
+    ])
+    # Every recent one-off enemy encounter lands on the same stored score.
+    storage.insert_encounters([
+        {
+            "tracked_profile_id": profile_id,
+            "player_puuid": f"p{index:03d}",
+            "scan_id": scan_id,
+            "match_id": f"MATCH-{index}",
+            "played_at": played_at,
+            "relation": "enemy",
+            "champion_id": 1,
+            "queue_id": 420,
+            "won": 0,
+        }
+        for index in range(200)
+    ])
+    storage.get_memory_summary()
+    scored = []
+    monkeypatch.setattr(storage_module, "score_repeat_player", lambda stats, **kwargs: scored.append(stats) or score_repeat_player(stats, **kwargs))
+
+    summary = storage.get_memory_summary(top_player_limit=3)
+
+    assert len(scored) == 3 + storage_module.SUMMARY_CANDIDATE_OVERFETCH
+    assert [player["puuid"] for player in summary["topRepeatPlayers"]] == ["p000", "p001", "p002"]
+
+
+def test_encounter_epoch_ms_is_written_and_backfilled_by_migration(tmp_path):
+    database_path = tmp_path / "hibs.db"
+    storage = Storage(database_path)
+    profile_id = seed_read_path_fixture(storage)
+    storage.insert_encounter(profile_id, "target", 1, "MATCH-2", "2026-03-16T02:00:00+02:00", "enemy", 81, 157, 0)
+    storage.close()
+    expected_ms = int(datetime(2026, 3, 16, tzinfo=timezone.utc).timestamp() * 1000)
+
+    with sqlite3.connect(database_path) as connection:
+        assert {row[0] for row in connection.execute("SELECT played_at_ms FROM encounters")} == {expected_ms}
+        connection.execute("UPDATE encounters SET played_at_ms = NULL")
+        connection.execute("PRAGMA user_version = 3")
+
+    Storage(database_path).close()
+
+    with sqlite3.connect(database_path) as connection:
+        assert [row[0] for row in connection.execute("SELECT played_at_ms FROM encounters")] == [expected_ms, expected_ms]
+
+
+def test_current_schema_startup_only_reads_user_version(tmp_path, monkeypatch):
+    database_path = tmp_path / "hibs.db"
+    Storage(database_path).close()
+    statements = []
+    open_connection = Storage._open_connection
+
+    def traced_connection(storage, read_only=True):
+        connection = open_connection(storage, read_only)
+        connection.set_trace_callback(statements.append)
+        return connection
+
+    monkeypatch.setattr(Storage, "_open_connection", traced_connection)
+    Storage(database_path).close()
+
+    assert statements == ["PRAGMA user_version"]
+
+
+def create_legacy_scans_database(database_path, scan_count):
+    with sqlite3.connect(database_path) as connection:
+        connection.execute(
+            """
+            CREATE TABLE tracked_profiles (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                puuid TEXT NOT NULL UNIQUE,
+                game_name TEXT NOT NULL,
+                tag_line TEXT NOT NULL,
+                region TEXT NOT NULL,
+                created_at TEXT NOT NULL DEFAULT CURRENT_TIMESTAMP,
+                updated_at TEXT NOT NULL DEFAULT CURRENT_TIMESTAMP
+            )
+            """
+        )
+        connection.execute(
+            """
+            CREATE TABLE scans (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                tracked_profile_id INTEGER NOT NULL,
+                source TEXT NOT NULL,
+                region TEXT NOT NULL,
+                game_id INTEGER NOT NULL,
+                queue_type TEXT NOT NULL,
+                status TEXT NOT NULL,
+                duration_seconds REAL NOT NULL,
+                encounter_count INTEGER NOT NULL DEFAULT 0,
+                created_at TEXT NOT NULL DEFAULT CURRENT_TIMESTAMP
+            )
+            """
+        )
+        connection.execute(
+            "INSERT INTO tracked_profiles (puuid, game_name, tag_line, region) VALUES ('self', 'Streamer', 'NA1', 'NA1')"
+        )
+        connection.executemany(
+            """
+            INSERT INTO scans (tracked_profile_id, source, region, game_id, queue_type, status, duration_seconds)
+            VALUES (1, 'manual', 'NA1', ?, 'CLASSIC', 'ok', 0.5)
+            """,
+            [(index,) for index in range(scan_count)],
+        )
+
+
+def test_scans_table_rebuild_runs_in_batches_and_resumes_after_interruption(tmp_path):
+    database_path = tmp_path / "hibs.db"
+    create_legacy_scans_database(database_path, scan_count=5)
+    progress = []
+
+    def interrupt_after_first_batch(step, done, total):
+        progress.append((step, done, total))
+        raise KeyboardInterrupt
+
+    try:
+        Storage(database_path, migration_batch_size=2, on_migration_progress=interrupt_after_first_batch)
+    except KeyboardInterrupt:
+        pass
+
+    storage = Storage(
+        database_path,
+        migration_batch_size=2,
+        on_migration_progress=lambda *event: progress.append(event),
+    )
+    storage.insert_scan(1, "manual", "NA1", None, None, "not_in_game", 0.0, 0)
+
+    assert progress == [("scans", 2, 5), ("scans", 4, 5), ("scans", 5, 5)]
+    with sqlite3.connect(database_path) as connection:
+        game_ids = [row[0] for row in connection.execute("SELECT game_id FROM scans ORDER BY id")]
+        user_version = connection.execute("PRAGMA user_version").fetchone()[0]
+    assert game_ids == [0, 1, 2, 3, 4, None]
+    assert user_version == storage.schema_version
+
+
+def seed_many_players(storage, player_count):
+    profile_id = storage.upsert_tracked_profile("self", "Streamer", "NA1", "NA1")
+    scan_ids = [
+        storage.insert_scan(profile_id, "manual", "NA1", 100 + index, "CLASSIC", "ok", 1.0, 0)
+        for index in range(3)
+    ]
+    storage.upsert_players([
+        {"puuid": f"p{index}", "game_name": f"Player{index}", "tag_line": "TAG", "region": "NA1", "resolution_status": "resolved"}
+        for index in range(player_count)
+    ])
+    storage.insert_encounters([
+        {
+            "tracked_profile_id": profile_id,
+            "player_puuid": f"p{index}",
+            "scan_id": scan_ids[match % 3],
+            "match_id": f"MATCH-{index}-{match}",
+            "played_at": f"2026-03-{10 + match:02d}T00:00:00Z",
+            "relation": "enemy" if index % 2 else "ally",
+            "champion_id": 1,
+            "queue_id": 420,
+            "won": match % 2,
+        }
+        for index in range(player_count)
+        for match in range(1 + index % 4)
+    ])
+    return profile_id, scan_ids
+
+
+def collect_pages(load_page, limit):
+    items, cursor, pages = [], None, 0
+    while True:
+        page = load_page(limit, cursor)
+        items.extend(page["items"])
+        pages += 1
+        cursor = page["nextCursor"]
+        if cursor is None:
+            return items, pages
+
+
+def test_repeat_player_pages_follow_stored_score_order(tmp_path):
+    storage = Storage(tmp_path / "hibs.db")
+    profile_id, _scan_ids = seed_many_players(storage, 7)
+
+    items, pages = collect_pages(lambda limit, cursor: storage.page_repeat_players(profile_id, limit, cursor), 3)
+    scores = [(item["risk"]["score"], item["puuid"]) for item in items]
+
+    assert pages == 3
+    assert sorted(scores, key=lambda entry: (-entry[0], entry[1])) == scores
+    assert {item["puuid"] for item in items} == {f"p{index}" for index in range(7)}
+    with pytest.raises(ValueError):
+        storage.page_repeat_players(profile_id, 3, "not-a-cursor")
+
+
+def test_stored_scores_refresh_only_after_writes_mark_the_profile_dirty(tmp_path):
+    storage = Storage(tmp_path / "hibs.db")
+    profile_id, scan_ids = seed_many_players(storage, 3)
+
+    assert storage.refresh_repeat_player_scores(profile_id) is True
+    assert storage.refresh_repeat_player_scores(profile_id) is False
+
+    storage.insert_encounter(profile_id, "p0", scan_ids[0], "MATCH-new", "2026-03-20T00:00:00Z", "enemy", 1, 420, 0)
+
+    assert storage.refresh_repeat_player_scores(profile_id) is True
+
+
+def test_encounter_and_scan_pages_walk_newest_first(tmp_path):
+    storage = Storage(tmp_path / "hibs.db")
+    profile_id, scan_ids = seed_many_players(storage, 4)
+
+    encounters, _pages = collect_pages(
+        lambda limit, cursor: storage.page_player_encounters(profile_id, "p3", limit, cursor), 2
+    )
+    scans, _pages = collect_pages(lambda limit, cursor: storage.page_scans(profile_id, limit, cursor), 2)
+
+    assert [encounter["matchId"] for encounter in encounters] == [f"MATCH-3-{match}" for match in (3, 2, 1, 0)]
+    assert [scan["id"] for scan in scans] == sorted(scan_ids, reverse=True)
+
+
+def test_retention_rolls_old_encounters_into_lifetime_stats(tmp_path):
+    database_path = tmp_path / "hibs.db"
+    storage = Storage(database_path)
+    profile_id = seed_stats_fixture(storage)
+    storage.save_match_details("OLD-MATCH", {"info": {"gameCreation": 1_000, "participants": []}})
+    with sqlite3.connect(database_path) as connection:
+        connection.execute("UPDATE scans SET created_at = '2020-01-01 00:00:00' WHERE id = 1")
+    before = {player["puuid"]: player["stats"] for player in storage.load_repeat_players(profile_id)}
+
+    report = storage.apply_retention(10)
+    # Re-scanning a match that retention already rolled up must not count it twice.
+    storage.insert_encounter(profile_id, "target", 3, "MATCH-45", "2026-01-01T00:00:00Z", "ally", 81, 420, 0)
+    after = {player["puuid"]: player["stats"] for player in storage.load_repeat_players(profile_id)}
+
+    assert report["retentionDays"] == 30
+    assert report["encountersArchived"] == 1
+    assert report["scanParticipantsPruned"] == 2
+    assert report["matchDetailsPruned"] == 1
+    assert report["reclaimedBytes"] == max(0, report["bytesBefore"] - report["bytesAfter"])
+    assert after == {puuid: pytest.approx(stats) for puuid, stats in before.items()}
+    assert storage.count_encounters() == 5
+    with sqlite3.connect(database_path) as connection:
+        assert connection.execute("PRAGMA auto_vacuum").fetchone()[0] == 2
+        assert connection.execute("SELECT tracked_profile_id, match_id FROM archived_matches").fetchall() == [
+            (profile_id, "MATCH-45")
+        ]
+
+
+def test_retention_still_stores_old_matches_for_players_never_counted(tmp_path):
+    storage = Storage(tmp_path / "hibs.db")
+    profile_id = seed_stats_fixture(storage)
+    storage.apply_retention(30)
+    long_ago = (datetime.now(timezone.utc) - timedelta(days=45)).isoformat()
+    for puuid in ("newcomer", "late-find"):
+        storage.upsert_player(puuid, puuid, "TAG", "NA1", "resolved")
+
+    # A match older than the cutoff that retention never saw, and a player
+    # first met in a match retention already rolled up.
+    storage.record_scan(
+        profile_id,
+        "manual",
+        "NA1",
+        200,
+        "CLASSIC",
+        "ok",
+        1.0,
+        2,
+        encounters=[
+            {
+                "player_puuid": puuid,
+                "match_id": match_id,
+                "played_at": long_ago,
+                "relation": "enemy",
+                "champion_id": 81,
+                "queue_id": 420,
+                "won": 0,
+            }
+            for puuid, match_id in (("newcomer", "MATCH-OLD-UNSEEN"), ("late-find", "MATCH-45"))
+        ],
+    )
+
+    players = storage.load_repeat_players(profile_id, ["newcomer", "late-find"])
+    assert {player["puuid"]: player["stats"]["total_encounters"] for player in players} == {
+        "newcomer": 1,
+        "late-find": 1,
+    }
+    assert storage.load_repeat_players(profile_id, ["target"])[0]["stats"]["total_encounters"] == 5
@@ -7,6 +7,8 @@ from pathlib import Path
 
 import yaml
 
+from retention import MIN_RETENTION_DAYS
+
 
 DEFAULT_RUNTIME_CONFIG = {
     "PORT": 5000,
@@ -25,7 +27,16 @@ DEFAULT_RUNTIME_CONFIG = {
     "DATABASE_PATH": "data/haveibeensniped.db",
     "CACHE_ENABLED": True,
     "CACHE_TTL": 300,
+    "CACHE_MAX_ENTRIES": 2048,
+    "MEMORY_CACHE_TTL": 60,
     "RATE_LIMIT_PER_SECOND": 19,
+    "MATCH_FETCH_WORKERS": 8,
+    "INCREMENTAL_MATCH_HISTORY": True,
+    "SCAN_JOB_WORKERS": 2,
+    "SCAN_JOB_QUEUE_SIZE": 16,
+    "RETENTION_DAYS": 0,
+    "RETENTION_INTERVAL_HOURS": 24,
+    "SCORING_MODE": "windowed",
     "DEMO_MODE": False,
 }
 
@@ -57,6 +68,14 @@ def _env_flag(name: str) -> bool | None:
     return value.strip().lower() in {'1', 'true', 'yes', 'on'}
 
 
+def _retention_days(value) -> int:
+    """0 disables retention; anything else is raised to the 30-day scoring window."""
+    days = int(value or 0)
+    if days <= 0:
+        return 0
+    return max(MIN_RETENTION_DAYS, days)
+
+
 def load_runtime_config(config_path: str | Path | None = None) -> dict:
     """Load validated runtime configuration from config.yaml."""
     resolved_config_path = Path(config_path or Path(__file__).with_name("config.yaml"))
@@ -97,10 +116,43 @@ def load_runtime_config(config_path: str | Path | None = None) -> dict:
             "cache_enabled", DEFAULT_RUNTIME_CONFIG["CACHE_ENABLED"]
         ),
         "CACHE_TTL": file_config.get("cache_ttl", DEFAULT_RUNTIME_CONFIG["CACHE_TTL"]),
+        "CACHE_MAX_ENTRIES": file_config.get(
+            "cache_max_entries",
+            DEFAULT_RUNTIME_CONFIG["CACHE_MAX_ENTRIES"],
+        ),
+        "MEMORY_CACHE_TTL": file_config.get(
+            "memory_cache_ttl",
+            DEFAULT_RUNTIME_CONFIG["MEMORY_CACHE_TTL"],
+        ),
         "RATE_LIMIT_PER_SECOND": file_config.get(
             "rate_limit_per_second",
             DEFAULT_RUNTIME_CONFIG["RATE_LIMIT_PER_SECOND"],
         ),
+        "MATCH_FETCH_WORKERS": file_config.get(
+            "match_fetch_workers",
+            DEFAULT_RUNTIME_CONFIG["MATCH_FETCH_WORKERS"],
+        ),
+        "INCREMENTAL_MATCH_HISTORY": bool(file_config.get(
+            "incremental_match_history",
+            DEFAULT_RUNTIME_CONFIG["INCREMENTAL_MATCH_HISTORY"],
+        )),
+        "SCAN_JOB_WORKERS": file_config.get(
+            "scan_job_workers",
+            DEFAULT_RUNTIME_CONFIG["SCAN_JOB_WORKERS"],
+        ),
+        "SCAN_JOB_QUEUE_SIZE": file_config.get(
+            "scan_job_queue_size",
+            DEFAULT_RUNTIME_CONFIG["SCAN_JOB_QUEUE_SIZE"],
+        ),
+        "RETENTION_DAYS": _retention_days(file_config.get(
+            "retention_days",
+            DEFAULT_RUNTIME_CONFIG["RETENTION_DAYS"],
+        )),
+        "RETENTION_INTERVAL_HOURS": file_config.get(
+            "retention_interval_hours",
+            DEFAULT_RUNTIME_CONFIG["RETENTION_INTERVAL_HOURS"],
+        ),
+        "SCORING_MODE": file_config.get("scoring_mode", DEFAULT_RUNTIME_CONFIG["SCORING_MODE"]),
         "DEMO_MODE": bool(demo_mode),
         "API_CONFIGURED": api_configured,
     }